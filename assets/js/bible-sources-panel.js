@@ -11,9 +11,6 @@ const BibleSourcesPanel = (function() {
       bibleVersion: 'KJV'
     };
     
-    // Cache for transcript data
-    const transcriptCache = {};
-    
     // DOM Elements - will be initialized in init function
     let elements = {};
     
@@ -650,12 +647,12 @@ const BibleSourcesPanel = (function() {
      * Fetch transcript data
      */
     async function fetchTranscript(videoId, startTime = 0) {
-      // Check cache first
-      if (transcriptCache[videoId]) {
-        return transcriptCache[videoId];
-      }
-      
       try {
+        // Static snapshot first, API fallback, cached across pages (sermon-data.js).
+        if (window.SermonData) {
+          return await window.SermonData.transcript(videoId);
+        }
+        
         const url = `${config.apiBaseUrl}/transcript/${videoId}`;
         
         const response = await fetch(url, {
@@ -671,12 +668,7 @@ const BibleSourcesPanel = (function() {
           throw new Error(`Failed to fetch transcript: ${response.status} ${response.statusText}`);
         }
         
-        const data = await response.json();
-        
-        // Cache the result
-        transcriptCache[videoId] = data;
-        
-        return data;
+        return await response.json();
       } catch (error) {
         console.error('Error fetching transcript:', error);
         throw error;
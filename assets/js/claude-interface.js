@@ -1449,6 +1449,11 @@ function initClaudeInterface() {
             transcriptContainer.innerHTML = `<div class="claude-transcript-loading">${translate('loading-transcript') || 'Loading transcript...'}</div>`;
           }
           
+          // English transcripts come from the static snapshots (sermon-data.js).
+          if (window.SermonData) {
+            return await window.SermonData.transcript(videoId, { language: currentLanguage });
+          }
+          
           const response = await fetch(`${API_URL}/transcript/${videoId}?language=${currentLanguage}`, {
             method: 'GET',
             headers: {
@@ -15,11 +15,21 @@
 
   var STATS_URL = '/assets/data/bible/bible_stats.json';
   var BOOK_URL = function (slug) { return '/assets/data/bible/books/' + slug + '.json'; };
+  // Per-chapter shards written by fetch_bible_data.py --shards. The index
+  // carries chapter counts for the grid; each shard holds one chapter's rows.
+  // When a book hasn't been sharded yet we fall back to the whole book file.
+  var BOOK_INDEX_URL = function (slug) { return '/assets/data/bible/books/' + slug + '/index.json'; };
+  var CHAPTER_URL = function (slug, chapter) { return '/assets/data/bible/books/' + slug + '/' + chapter + '.json'; };
+  // Per-book rollup from aggregate_bible_data.py: per-chapter reference and
+  // distinct-sermon counts, precomputed so the grid needs no row scanning.
+  var ROLLUP_URL = function (slug) { return '/assets/data/bible/rollups/' + slug + '.json'; };
+  // Per-book "preached together with" lists from build_related_passages.py:
+  // for each chapter, the chapters most often cited in the same sermons.
+  var RELATED_URL = function (slug) { return '/assets/data/bible/related/' + slug + '.json'; };
   var KJV_URL = function (slug) { return '/assets/data/Bible-kjv-master/' + slug + '.json'; };
   var HEADINGS_URL = function (slug) { return '/assets/data/bible-headings/' + slug + '.json'; };
   var RED_LETTER_URL = function (slug) { return '/assets/data/bible-red-letter/' + slug + '.json'; };
   var API_BASE = 'https://sermon-search-api-8fok.onrender.com';
-  var TRANSCRIPT_URL = function (videoId) { return API_BASE + '/transcript/' + encodeURIComponent(videoId); };
   var SERMONS_URL = API_BASE + '/sermons?limit=8';
 
   // Canonical book order (KJV, 66 books). Mirrors the data filenames.
@@ -199,10 +209,12 @@
   var state = {
     stats: null,
     bookCache: {},
+    bookIndexCache: {},
+    chapterCache: {},
     kjvCache: {},
-    transcriptCache: {},
     headingsCache: {},
     redLetterCache: {},
+    relatedCache: {},
     bodyLockCount: 0,
     bodyLockScrollY: 0
   };
@@ -422,56 +434,65 @@
 
   function renderRecentSermons() {
     if (!els.recentList) return;
-    fetch(SERMONS_URL)
-      .then(function (r) { if (!r.ok) throw new Error('HTTP ' + r.status); return r.json(); })
-      .then(function (data) {
-        var sermons = (data && data.sermons) || [];
-        if (!sermons.length) return;
-        var html = sermons.map(function (s) {
-          var date = formatPublishDate(s.publish_date);
-          var passageGuess = extractPassageFromTitle(s.title);
-          var ytUrl = s.url || ('https://www.youtube.com/watch?v=' + s.video_id);
-          var readBtn = passageGuess
-            ? '<a class="refv-recent-btn refv-recent-btn-read" href="#' +
-                encodeURIComponent(passageGuess.book.slug) + '/' +
-                passageGuess.chapter + '">Read ' + escapeHtml(passageGuess.label) + '</a>'
-            : '';
-          return '<li class="refv-recent-item">' +
-            '<div class="refv-recent-meta">' +
-              (date ? '<span class="refv-recent-date">' + date + '</span>' : '') +
-            '</div>' +
-            '<div class="refv-recent-title">' + escapeHtml(s.title || 'Sermon') + '</div>' +
-            '<div class="refv-recent-actions">' +
-              readBtn +
-              '<button type="button" class="refv-recent-btn" data-action="transcript" ' +
-                'data-video="' + escapeAttr(s.video_id) + '" data-ts="0" ' +
-                'data-title="' + escapeAttr(s.title || 'Sermon') + '">Read transcript</button>' +
-              '<a class="refv-recent-btn" href="' + escapeAttr(ytUrl) +
-                '" target="_blank" rel="noopener">YouTube ↗</a>' +
-            '</div>' +
-          '</li>';
-        }).join('');
-        els.recentList.innerHTML = html;
-        els.recentSection.hidden = false;
-        // Wire transcript buttons (same handler shape as occurrence cards).
-        Array.prototype.forEach.call(
-          els.recentList.querySelectorAll('[data-action="transcript"]'),
-          function (btn) {
-            btn.addEventListener('click', function () {
-              openTranscriptModal(
-                btn.getAttribute('data-video'),
-                parseFloat(btn.getAttribute('data-ts')) || 0,
-                btn.getAttribute('data-title')
-              );
-            });
-          }
-        );
-      })
+    var load = function () {
+      return fetch(SERMONS_URL)
+        .then(function (r) { if (!r.ok) throw new Error('HTTP ' + r.status); return r.json(); });
+    };
+    // The stored list (sermon-data.js) paints straight away; if it's stale the
+    // background refresh repaints once a newer list arrives.
+    var p = window.SermonData
+      ? window.SermonData.cached('sermons', { limit: 8 }, load, { onUpdate: paintRecentSermons })
+      : load();
+    p.then(paintRecentSermons)
       .catch(function () {
         // API down or hasn't redeployed yet — just leave section hidden.
       });
   }
 
+  function paintRecentSermons(data) {
+    var sermons = (data && data.sermons) || [];
+    if (!sermons.length) return;
+    var html = sermons.map(function (s) {
+      var date = formatPublishDate(s.publish_date);
+      var passageGuess = extractPassageFromTitle(s.title);
+      var ytUrl = s.url || ('https://www.youtube.com/watch?v=' + s.video_id);
+      var readBtn = passageGuess
+        ? '<a class="refv-recent-btn refv-recent-btn-read" href="#' +
+            encodeURIComponent(passageGuess.book.slug) + '/' +
+            passageGuess.chapter + '">Read ' + escapeHtml(passageGuess.label) + '</a>'
+        : '';
+      return '<li class="refv-recent-item">' +
+        '<div class="refv-recent-meta">' +
+          (date ? '<span class="refv-recent-date">' + date + '</span>' : '') +
+        '</div>' +
+        '<div class="refv-recent-title">' + escapeHtml(s.title || 'Sermon') + '</div>' +
+        '<div class="refv-recent-actions">' +
+          readBtn +
+          '<button type="button" class="refv-recent-btn" data-action="transcript" ' +
+            'data-video="' + escapeAttr(s.video_id) + '" data-ts="0" ' +
+            'data-title="' + escapeAttr(s.title || 'Sermon') + '">Read transcript</button>' +
+          '<a class="refv-recent-btn" href="' + escapeAttr(ytUrl) +
+            '" target="_blank" rel="noopener">YouTube ↗</a>' +
+        '</div>' +
+      '</li>';
+    }).join('');
+    els.recentList.innerHTML = html;
+    els.recentSection.hidden = false;
+    // Wire transcript buttons (same handler shape as occurrence cards).
+    Array.prototype.forEach.call(
+      els.recentList.querySelectorAll('[data-action="transcript"]'),
+      function (btn) {
+        btn.addEventListener('click', function () {
+          openTranscriptModal(
+            btn.getAttribute('data-video'),
+            parseFloat(btn.getAttribute('data-ts')) || 0,
+            btn.getAttribute('data-title')
+          );
+        });
+      }
+    );
+  }
+
   // Try to pull a passage citation out of a sermon title. Pastor's titles
   // typically end with the passage, e.g.  '"To Save Sinners" 1 Timothy 1:12-17'
   // → returns {book, chapter, label}. Returns null on no match.
@@ -559,13 +580,14 @@
       ? ''
       : 'Pick a chapter to begin reading.';
 
-    loadBook(book).then(function (data) {
-      if (!chapter) {
-        renderChapterGrid(book, data);
-      } else {
-        renderChapterOccurrences(book, chapter, verse, data);
-      }
-    }).catch(function () {
+    var loaded = chapter
+      ? loadChapterRefs(book, chapter).then(function (refs) {
+          renderChapterOccurrences(book, chapter, verse, refs);
+        })
+      : loadBookIndex(book).then(function (index) {
+          renderChapterGrid(book, index);
+        });
+    loaded.catch(function () {
       els.occurrences.innerHTML = '<div class="refv-empty">Could not load references for ' + book.display + '.</div>';
     });
 
@@ -579,14 +601,128 @@
     }
     return fetch(BOOK_URL(slug))
       .then(function (r) { if (!r.ok) throw new Error('not ok'); return r.json(); })
+      .then(decodeRefsPayload)
       .then(function (d) { state.bookCache[slug] = d; return d; });
   }
 
-  function renderChapterGrid(book, data) {
-    var chapters = data.chapters || {};
+  // Resolves to { chapters: {chapter: refs}, sermons: {chapter: n} | null,
+  // complete }. `complete` means a chapter missing from `chapters` has no
+  // references at all (true for the rollup and shard index, which cover the
+  // whole book file). Tries the rollup, then the shard index, then the book.
+  function loadBookIndex(book) {
+    var slug = dataSlugFor(book);
+    if (state.bookIndexCache[slug]) {
+      return Promise.resolve(state.bookIndexCache[slug]);
+    }
+    return fetch(ROLLUP_URL(slug))
+      .then(function (r) { if (!r.ok) throw new Error('not ok'); return r.json(); })
+      .then(function (d) {
+        var counts = {};
+        var sermons = {};
+        var chapters = d.chapters || {};
+        Object.keys(chapters).forEach(function (k) {
+          counts[k] = chapters[k].refs;
+          sermons[k] = chapters[k].sermons;
+        });
+        return { chapters: counts, sermons: sermons, complete: true };
+      })
+      .catch(function () {
+        return fetch(BOOK_INDEX_URL(slug))
+          .then(function (r) { if (!r.ok) throw new Error('not ok'); return r.json(); })
+          .then(function (d) { return { chapters: d.chapters || {}, sermons: null, complete: true }; });
+      })
+      .catch(function () {
+        return loadBook(book).then(function (data) {
+          var counts = {};
+          var chapters = data.chapters || {};
+          Object.keys(chapters).forEach(function (k) { counts[k] = chapters[k].length; });
+          return { chapters: counts, sermons: null, complete: false };
+        });
+      })
+      .then(function (index) { state.bookIndexCache[slug] = index; return index; });
+  }
+
+  // Resolves to the reference rows for one chapter. The shard is requested in
+  // parallel with the index so a deep link costs one round trip, not two.
+  function loadChapterRefs(book, chapter) {
+    var slug = dataSlugFor(book);
+    var key = slug + '/' + chapter;
+    if (state.chapterCache[key]) {
+      return Promise.resolve(state.chapterCache[key]);
+    }
+    var shardP = fetch(CHAPTER_URL(slug, chapter))
+      .then(function (r) { return r.ok ? r.json() : null; })
+      .then(decodeRefsPayload)
+      .catch(function () { return null; });
+    return Promise.all([loadBookIndex(book), shardP]).then(function (results) {
+      var index = results[0];
+      var shard = results[1];
+      if (shard && Array.isArray(shard.references)) return shard.references;
+      if (index.complete && !index.chapters[String(chapter)]) return [];
+      return loadBook(book).then(function (data) {
+        return (data.chapters && data.chapters[String(chapter)]) || [];
+      });
+    }).then(function (refs) { state.chapterCache[key] = refs; return refs; });
+  }
+
+  // ---- Compact reference decoder ----
+  // Mirrors scripts/reference_format.py. Book files and shards written with
+  // fetch_bible_data.py --compact store each sermon once and keep a chapter's
+  // rows as parallel column arrays; this rebuilds the API's row objects so the
+  // renderers never see the difference. Legacy payloads pass through as-is.
+  var REFS_SCHEMA = 'fdm-refs';
+  var REFS_SCHEMA_VERSION = 1;
+
+  function decodeCompactChapter(d, key) {
+    var cols = d.chapters[key];
+    var sermons = d.sermons || [];
+    var models = d.models || [];
+    var chapter = /^\d+$/.test(key) ? parseInt(key, 10) : null;
+    var rows = new Array(cols.s.length);
+    for (var n = 0; n < cols.s.length; n++) {
+      var sermon = sermons[cols.s[n]] || ['', ''];
+      var start = cols.t[n] / 100;
+      rows[n] = {
+        book: cols.b ? cols.b[n] : d.ref_book,
+        chapter: chapter,
+        verse: cols.v[n],
+        reference_text: cols.r[n],
+        context: cols.c[n],
+        is_implicit: !!cols.i[n],
+        video_id: sermon[0],
+        start_time: start,
+        end_time: cols.d[n] == null ? null : (cols.t[n] + cols.d[n]) / 100,
+        point_summary: cols.p[n],
+        point_summary_model: cols.m[n] >= 0 ? models[cols.m[n]] : null,
+        sermon_title: sermon[1],
+        url: (cols.u && cols.u[n]) ||
+          ('https://www.youtube.com/watch?v=' + sermon[0] + '&t=' + Math.floor(start))
+      };
+    }
+    return rows;
+  }
+
+  function decodeRefsPayload(d) {
+    if (!d || d.schema !== REFS_SCHEMA) return d;
+    if (d.version !== REFS_SCHEMA_VERSION) throw new Error('unsupported reference schema ' + d.version);
+    var chapters = {};
+    Object.keys(d.chapters || {}).forEach(function (key) {
+      chapters[key] = decodeCompactChapter(d, key);
+    });
+    var out = { book: d.book, total_references: d.total_references, chapters: chapters };
+    if (d.chapter != null) {
+      out.chapter = d.chapter;
+      out.references = chapters[String(d.chapter)] || [];
+    }
+    return out;
+  }
+
+  function renderChapterGrid(book, index) {
+    var chapters = index.chapters || {};
+    var sermons = index.sermons || {};
     var entries = Object.keys(chapters)
       .filter(function (k) { return k !== 'None' && k !== 'unknown' && !isNaN(parseInt(k, 10)); })
-      .map(function (k) { return { chapter: parseInt(k, 10), count: chapters[k].length }; })
+      .map(function (k) { return { chapter: parseInt(k, 10), count: chapters[k], sermons: sermons[k] }; })
       .sort(function (a, b) { return a.chapter - b.chapter; });
 
     if (!entries.length) {
@@ -594,7 +730,11 @@
       return;
     }
     var html = '<ul class="refv-chapter-grid">' + entries.map(function (e) {
-      return '<li><button class="refv-chapter-chip" data-chapter="' + e.chapter + '" type="button">' +
+      var title = e.sermons
+        ? ' title="' + e.count + (e.count === 1 ? ' reference' : ' references') + ' in ' +
+          e.sermons + (e.sermons === 1 ? ' sermon' : ' sermons') + '"'
+        : '';
+      return '<li><button class="refv-chapter-chip" data-chapter="' + e.chapter + '" type="button"' + title + '>' +
         '<span class="refv-chapter-chip-num">' + e.chapter + '</span>' +
         '<span class="refv-chapter-chip-count">' + e.count + '</span>' +
         '</button></li>';
@@ -608,8 +748,8 @@
     });
   }
 
-  function renderChapterOccurrences(book, chapter, verse, data) {
-    var refs = (data.chapters && data.chapters[String(chapter)]) || [];
+  function renderChapterOccurrences(book, chapter, verse, refs) {
+    refs = refs || [];
 
     if (verse) {
       // Single-verse view: KJV text on top, sermons for just that verse below.
@@ -712,8 +852,9 @@
     // (async, since the prev book's chapter count may need a fetch).
     var topNavHtml = '<div class="refv-chapter-nav refv-chapter-nav-top" id="chapter-nav-top"></div>';
     var bottomNavHtml = '<div class="refv-chapter-nav refv-chapter-nav-bottom" id="chapter-nav-bottom"></div>';
+    var relatedHtml = '<div class="refv-related" id="chapter-related" hidden></div>';
 
-    els.occurrences.innerHTML = topNavHtml + bibleHtml + emptyNote + bottomNavHtml;
+    els.occurrences.innerHTML = topNavHtml + bibleHtml + emptyNote + relatedHtml + bottomNavHtml;
 
     // Wire verse-number clicks → open modal for that verse.
     Array.prototype.forEach.call(els.occurrences.querySelectorAll('.refv-vnum.has-refs'), function (el) {
@@ -729,6 +870,48 @@
 
     // Render chapter pagination once neighbors resolve.
     renderChapterNav(book, chapter);
+    renderRelated(book, chapter);
+  }
+
+  function loadRelated(book) {
+    var slug = dataSlugFor(book);
+    if (state.relatedCache[slug]) return Promise.resolve(state.relatedCache[slug]);
+    return fetch(RELATED_URL(slug))
+      .then(function (r) { return r.ok ? r.json() : {}; })
+      .catch(function () { return {}; })
+      .then(function (d) { state.relatedCache[slug] = d || {}; return state.relatedCache[slug]; });
+  }
+
+  // "Often preached with": chips for the chapters that share the most
+  // sermons with this one. Precomputed per book, so it's one small fetch;
+  // the section stays hidden when there's nothing to show.
+  function renderRelated(book, chapter) {
+    loadRelated(book).then(function (data) {
+      var el = document.getElementById('chapter-related');
+      if (!el) return; // user navigated away
+      var rows = ((data.chapters || {})[String(chapter)] || []).filter(function (row) {
+        return BOOK_INDEX[String(row[0]).toLowerCase().replace(/\s+/g, '')];
+      });
+      if (!rows.length) return;
+      el.innerHTML =
+        '<h2 class="refv-related-title">Often preached with</h2>' +
+        '<ul class="refv-related-list">' + rows.map(function (row) {
+          var target = BOOK_INDEX[String(row[0]).toLowerCase().replace(/\s+/g, '')];
+          var label = target.display + ' ' + row[1];
+          return '<li><a class="refv-related-chip" href="#' + target.slug + '/' + row[1] + '"' +
+            ' data-nav-slug="' + target.slug + '" data-nav-chapter="' + row[1] + '"' +
+            ' title="' + escapeAttr(row[2] + ' sermons cite both') + '">' +
+            escapeHtml(label) + ' <span class="refv-related-count">' + row[2] + '</span></a></li>';
+        }).join('') + '</ul>';
+      el.hidden = false;
+      Array.prototype.forEach.call(el.querySelectorAll('[data-nav-slug]'), function (a) {
+        a.addEventListener('click', function (e) {
+          e.preventDefault();
+          setHash([a.getAttribute('data-nav-slug'), a.getAttribute('data-nav-chapter')]);
+          applyRoute();
+        });
+      });
+    });
   }
 
   function renderChapterNav(book, chapter) {
@@ -816,7 +999,7 @@
   }
 
   // Walk verses inserting (a) section headings at their `before_verse`
-  // anchors, (b) red-letter spans around Jesus's spoken-word substrings,
+  // anchors, (b) red-letter spans over Jesus's spoken words (by offset),
   // and (c) paragraph breaks every ~5 verses within a heading-section.
   // Headings always start a new paragraph block (printed-Bible feel).
   function renderVersesAsParagraphs(verses, byVerse, headings, redLetter) {
@@ -824,7 +1007,12 @@
     var headingAt = {};
     (headings || []).forEach(function (h) { headingAt[h.before_verse] = h.title; });
     var redAt = {};
-    (redLetter || []).forEach(function (r) { redAt[r.verse] = r.segments; });
+    // Chapter entries are [verse, start, end] triples, several per verse
+    // when narrative interrupts the speech.
+    (redLetter || []).forEach(function (r) {
+      if (!Array.isArray(r)) return;
+      (redAt[r[0]] = redAt[r[0]] || []).push([r[1], r[2]]);
+    });
 
     var out = [];
     var currentPara = [];
@@ -879,46 +1067,21 @@
     return out.join('');
   }
 
-  // Wrap each speech segment in a red-letter span, leaving narrative intro
-  // text in regular type. Segments are {intro, speech}; we locate `speech`
-  // as a substring of the verse text and split around it.
-  function renderVerseTextWithRedLetter(text, segments) {
-    if (!segments || !segments.length || !text) return escapeHtml(text);
-    var positions = [];
-    segments.forEach(function (seg) {
-      var sp = (seg && seg.speech || '').trim();
-      if (!sp) return;
-      var idx = text.indexOf(sp);
-      if (idx === -1) {
-        // Try whitespace-normalized fallback (model may have collapsed spaces)
-        var spNorm = sp.replace(/\s+/g, ' ');
-        var textNorm = text.replace(/\s+/g, ' ');
-        var normIdx = textNorm.indexOf(spNorm);
-        if (normIdx === -1) return;
-        // Translate normalized index back is tricky; just skip in this case.
-        return;
-      }
-      positions.push({ start: idx, end: idx + sp.length });
-    });
-    if (!positions.length) return escapeHtml(text);
-    positions.sort(function (a, b) { return a.start - b.start; });
-    // Merge any overlapping spans.
-    var merged = [positions[0]];
-    for (var i = 1; i < positions.length; i++) {
-      var prev = merged[merged.length - 1];
-      var cur = positions[i];
-      if (cur.start <= prev.end) {
-        prev.end = Math.max(prev.end, cur.end);
-      } else {
-        merged.push(cur);
-      }
-    }
+  // Wrap each red-letter span in the verse, leaving narrative text in
+  // regular type. Spans are [start, end) character offsets resolved at
+  // generation time, already sorted and non-overlapping, so this is just
+  // slicing.
+  function renderVerseTextWithRedLetter(text, spans) {
+    if (!spans || !spans.length || !text) return escapeHtml(text);
     var out = '';
     var cursor = 0;
-    merged.forEach(function (p) {
-      if (p.start > cursor) out += escapeHtml(text.substring(cursor, p.start));
-      out += '<span class="refv-red">' + escapeHtml(text.substring(p.start, p.end)) + '</span>';
-      cursor = p.end;
+    spans.forEach(function (sp) {
+      var start = Math.max(sp[0], cursor);
+      var end = Math.min(sp[1], text.length);
+      if (end <= start) return;
+      if (start > cursor) out += escapeHtml(text.substring(cursor, start));
+      out += '<span class="refv-red">' + escapeHtml(text.substring(start, end)) + '</span>';
+      cursor = end;
     });
     if (cursor < text.length) out += escapeHtml(text.substring(cursor));
     return out;
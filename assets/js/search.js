@@ -167,6 +167,14 @@ const SermonAPI = {
    * @returns {Promise<Object>} - The API response
    */
   async sendQuery(queryData) {
+    // Same question, language and history: reuse the stored answer (sermon-data.js).
+    if (window.SermonData) {
+      return window.SermonData.cached('answer', queryData, () => this._sendQuery(queryData));
+    }
+    return this._sendQuery(queryData);
+  },
+
+  async _sendQuery(queryData) {
     const url = this.baseUrl.endsWith('/')
       ? `${this.baseUrl.slice(0, -1)}/answer`
       : `${this.baseUrl}/answer`;
@@ -230,6 +238,33 @@ const SermonAPI = {
    * @returns {Promise<void>} - Resolves when stream ends
    */
   async sendQueryStream(queryData, callbacks) {
+    // A stored answer to the same request replays through the callbacks in
+    // one go; a fresh one is saved once the stream completes.
+    const cache = window.SermonData;
+    const cacheParams = { ...queryData, stream: true };
+    const cached = cache ? await cache.get('answer', cacheParams) : null;
+    if (cached) {
+      if (cached.sources && callbacks.onSources) callbacks.onSources(cached.sources);
+      if (callbacks.onToken) callbacks.onToken(cached.answer);
+      if (callbacks.onDone) callbacks.onDone(cached.done);
+      return;
+    }
+    if (cache) {
+      const outer = callbacks;
+      let sources = null;
+      let answer = '';
+      let failed = false;
+      callbacks = {
+        onSources: (data) => { sources = data; if (outer.onSources) outer.onSources(data); },
+        onToken: (text) => { answer += text; if (outer.onToken) outer.onToken(text); },
+        onDone: (data) => {
+          if (!failed && answer) cache.put('answer', cacheParams, { sources, answer, done: data });
+          if (outer.onDone) outer.onDone(data);
+        },
+        onError: (msg) => { failed = true; if (outer.onError) outer.onError(msg); },
+      };
+    }
+
     const url = this.baseUrl.endsWith('/')
       ? `${this.baseUrl.slice(0, -1)}/answer/stream`
       : `${this.baseUrl}/answer/stream`;
@@ -317,13 +352,20 @@ const SermonAPI = {
       ? `${this.baseUrl.slice(0, -1)}/search?${params}`
       : `${this.baseUrl}/search?${params}`;
 
-    const response = await fetch(url, {
-      method: 'GET',
-      headers: { 'Accept': 'application/json' },
-      mode: 'cors',
-    });
-    if (!response.ok) throw new Error(`Search request failed: ${response.status}`);
-    return await response.json();
+    const load = async () => {
+      const response = await fetch(url, {
+        method: 'GET',
+        headers: { 'Accept': 'application/json' },
+        mode: 'cors',
+      });
+      if (!response.ok) throw new Error(`Search request failed: ${response.status}`);
+      return await response.json();
+    };
+    if (!window.SermonData) return load();
+    // Keyed on the parameters actually sent, with the query's spacing folded.
+    const key = Object.fromEntries(params);
+    key.query = query.trim().replace(/\s+/g, ' ');
+    return window.SermonData.cached('search', key, load);
   },
 
   _parseSSEEvent(raw) {
@@ -354,6 +396,11 @@ const SermonAPI = {
     try {
       console.log(`Fetching transcript for video ${videoId} with language ${language}`);
       
+      // Static snapshot first, API fallback (sermon-data.js)
+      if (window.SermonData) {
+        return await window.SermonData.transcript(videoId, { language });
+      }
+      
       // Create the URL
       const url = this.baseUrl.endsWith('/')
         ? `${this.baseUrl.slice(0, -1)}/transcript/${videoId}?language=${language}`
@@ -381,6 +428,211 @@ const SermonAPI = {
   }
 };
 
+/**
+ * Local search over the static inverted index built by
+ * scripts/build_search_index.py (assets/data/search/). Answers exact-phrase
+ * and keyword queries against KJV verses and sermon reference contexts from
+ * a few small shard and chunk fetches, with no API call or embedding.
+ * Tokenization must match the builder: lowercase [a-z0-9]+ runs, minus the
+ * stopwords listed in meta.json.
+ */
+const LocalSearch = {
+  base: '/assets/data/search/',
+  _meta: null,
+  _files: {},
+
+  _get(path) {
+    if (!this._files[path]) {
+      this._files[path] = fetch(this.base + path).then((r) => {
+        if (!r.ok) throw new Error(`Search index ${path}: ${r.status}`);
+        return r.json();
+      });
+      this._files[path].catch(() => { delete this._files[path]; });
+    }
+    return this._files[path];
+  },
+
+  meta() {
+    if (!this._meta) {
+      this._meta = this._get('meta.json').then((meta) => {
+        meta.shardSet = new Set(meta.shards);
+        meta.stopSet = new Set(meta.stopwords);
+        // First doc id of every chapter, for verse id -> (book, chapter, verse).
+        meta.chapterStarts = [];
+        let id = 0;
+        meta.books.forEach(([name, counts], b) => {
+          counts.forEach((n, c) => {
+            meta.chapterStarts.push({ id, book: name, chapter: c + 1, b });
+            id += n;
+          });
+        });
+        return meta;
+      });
+      this._meta.catch(() => { this._meta = null; });
+    }
+    return this._meta;
+  },
+
+  tokenize(text) {
+    return (text || '').toLowerCase().match(/[a-z0-9]+/g) || [];
+  },
+
+  /** Query shape: a phrase when wrapped in quotes, keywords otherwise. */
+  parseQuery(query) {
+    const trimmed = (query || '').trim();
+    const m = trimmed.match(/^["“](.+)["”]$/);
+    return { phrase: !!m, text: m ? m[1] : trimmed };
+  },
+
+  _terms(tokens, meta) {
+    return [...new Set(tokens.filter((t) => !meta.stopSet.has(t) && (t.length > 1 || /\d/.test(t))))];
+  },
+
+  async _postings(term, meta) {
+    for (let k = Math.min(term.length, 4); k >= 1; k--) {
+      const prefix = term.slice(0, k);
+      if (!meta.shardSet.has(prefix)) continue;
+      const shard = await this._get(`shards/${prefix}.json`);
+      const entry = shard[term];
+      if (!entry) break;
+      return entry.map((deltas) => {
+        let prev = 0;
+        return deltas.map((d) => (prev += d));
+      });
+    }
+    return [[], []];
+  },
+
+  _verseRef(id, meta) {
+    const starts = meta.chapterStarts;
+    let lo = 0, hi = starts.length - 1;
+    while (lo < hi) {
+      const mid = (lo + hi + 1) >> 1;
+      if (starts[mid].id <= id) lo = mid; else hi = mid - 1;
+    }
+    const s = starts[lo];
+    return { book: s.book, chapter: s.chapter, verse: id - s.id + 1 };
+  },
+
+  async _doc(kind, id, meta) {
+    const chunk = await this._get(`${kind}/${Math.floor(id / meta.chunk)}.json`);
+    return chunk[id % meta.chunk];
+  },
+
+  _containsPhrase(text, phraseTokens) {
+    const tokens = this.tokenize(text);
+    outer: for (let i = 0; i + phraseTokens.length <= tokens.length; i++) {
+      for (let j = 0; j < phraseTokens.length; j++) {
+        if (tokens[i + j] !== phraseTokens[j]) continue outer;
+      }
+      return true;
+    }
+    return false;
+  },
+
+  /**
+   * Rank doc ids for one doc kind as [id, coverage] pairs. Phrase queries
+   * need every term (then verification against the text), in doc order;
+   * keyword queries rank by the share of the query's summed IDF a doc
+   * covers, so docs matching more (and rarer) terms lead.
+   */
+  _rank(lists, total, phrase) {
+    const scores = new Map();
+    const counts = new Map();
+    let full = 0;
+    lists.forEach((ids) => {
+      const idf = Math.log(1 + total / Math.max(ids.length, 1));
+      full += idf;
+      ids.forEach((id) => {
+        scores.set(id, (scores.get(id) || 0) + idf);
+        counts.set(id, (counts.get(id) || 0) + 1);
+      });
+    });
+    let ranked = [...scores.entries()].map(([id, score]) => [id, score / full]);
+    if (phrase) {
+      return ranked.filter(([id]) => counts.get(id) === lists.length).sort((a, b) => a[0] - b[0]);
+    }
+    return ranked.sort((a, b) => b[1] - a[1] || a[0] - b[0]);
+  },
+
+  /**
+   * @returns {Promise<{phrase, verses: Array, moments: Array}|null>} null when
+   *   the query has no searchable terms (only stopwords / punctuation).
+   */
+  async search(query, opts) {
+    opts = opts || {};
+    const limit = opts.limit || 15;
+    const meta = await this.meta();
+    const { phrase, text } = this.parseQuery(query);
+    const tokens = this.tokenize(text);
+    const terms = this._terms(tokens, meta);
+    if (!terms.length) return null;
+
+    const postings = await Promise.all(terms.map((t) => this._postings(t, meta)));
+
+    const collect = async (kindIndex, kind, total, build) => {
+      const ranked = this._rank(postings.map((p) => p[kindIndex]), total, phrase);
+      const hits = [];
+      // Phrase candidates are checked in order until `limit` verify; keyword
+      // results take the top `limit` as ranked.
+      for (let i = 0; i < ranked.length && hits.length < limit; i += limit) {
+        const batch = ranked.slice(i, i + limit);
+        const docs = await Promise.all(batch.map(([id]) => this._doc(kind, id, meta)));
+        for (let j = 0; j < batch.length && hits.length < limit; j++) {
+          const hit = build(batch[j][0], docs[j], batch[j][1]);
+          if (!phrase || this._containsPhrase(hit.text + ' ' + (hit.summary || ''), tokens)) hits.push(hit);
+        }
+        if (!phrase) break;
+      }
+      return hits;
+    };
+
+    const [verses, contexts] = await Promise.all([
+      collect(0, 'verses', meta.verses, (id, text, coverage) => {
+        const ref = this._verseRef(id, meta);
+        return Object.assign(ref, { text, reference: `${ref.book} ${ref.chapter}:${ref.verse}`, coverage });
+      }),
+      collect(1, 'contexts', meta.contexts, (id, row, coverage) => ({ row, text: row[5], summary: row[6], coverage })),
+    ]);
+
+    let moments = [];
+    if (contexts.length) {
+      const videos = await this._get('videos.json');
+      moments = contexts.map(({ row, coverage }) => {
+        const [vid, start, b, chapter, verse, context, summary] = row;
+        const [videoId, title, date] = videos[vid] || [];
+        const reference = `${meta.books[b][0]} ${chapter}${verse ? ':' + verse : ''}`;
+        return {
+          video_id: videoId,
+          title,
+          publish_date: date,
+          start_time: start,
+          reference,
+          text: summary ? `${context} (${reference}: ${summary})` : context,
+          // Shown through matchStrength(); a phrase match is exact, keyword
+          // matches scale with how much of the query they cover.
+          similarity: phrase ? 1 : 0.55 + 0.45 * coverage,
+          local: true,
+        };
+      });
+    }
+    return { phrase, verses, moments };
+  },
+
+  /** A search() result in the /search SearchResponse shape displaySearchResults expects. */
+  toSearchResponse(query, found) {
+    return {
+      query,
+      results: found.moments,
+      verses: found.verses,
+      total_results: found.moments.length,
+      processing_time: 0,
+      local: true,
+      phrase: found.phrase,
+    };
+  },
+};
+
 // Create a namespace to avoid global pollution
 const SermonSearch = (function() {
   // Configuration
@@ -1370,12 +1622,18 @@ function updateSuggestions() {
     enrichBibleReferencesWithCounts(element);
   }
 
-  // Cache the references_index across multiple message renders
+  // Cache the chapter → sermon-count index across multiple message renders.
+  // chapter_sermons.json is derived from the reference data by
+  // aggregate_bible_data.py; the older analytics index is the fallback.
   let _refsIndexPromise = null;
   function loadReferencesIndex() {
     if (!_refsIndexPromise) {
-      _refsIndexPromise = fetch('/assets/data/analytics/references_index.json')
-        .then(r => r.ok ? r.json() : {})
+      const load = url => fetch(url).then(r => {
+        if (!r.ok) throw new Error(`HTTP ${r.status}`);
+        return r.json();
+      });
+      _refsIndexPromise = load('/assets/data/bible/rollups/chapter_sermons.json')
+        .catch(() => load('/assets/data/analytics/references_index.json'))
         .catch(() => ({}));
     }
     return _refsIndexPromise;
@@ -2430,7 +2688,25 @@ function createSourceElement(source, index, opts) {
       // === Find sermons mode (no AI synthesis) ===
       if (state.currentMode === 'find') {
         const typingId = addTypingIndicator();
-        const searchData = await SermonAPI.searchSermons(query, { top_k: 15, min_score: 0.55 });
+        let searchData;
+        // Quoted phrases are exact lookups: answer them from the static
+        // index without waiting on the backend at all.
+        const found = LocalSearch.parseQuery(query).phrase
+          ? await LocalSearch.search(query).catch(() => null)
+          : null;
+        if (found) {
+          searchData = LocalSearch.toSearchResponse(query, found);
+        } else {
+          try {
+            searchData = await SermonAPI.searchSermons(query, { top_k: 15, min_score: 0.55 });
+          } catch (err) {
+            // Backend cold or down: keyword matches from the static index
+            // beat an error bubble.
+            const fallback = await LocalSearch.search(query).catch(() => null);
+            if (!fallback || (!fallback.moments.length && !fallback.verses.length)) throw err;
+            searchData = LocalSearch.toSearchResponse(query, fallback);
+          }
+        }
         removeMessage(typingId);
         displaySearchResults(searchData, query);
 
@@ -2846,11 +3122,22 @@ function buildExcerpt(text, maxLen) {
  */
 function displaySearchResults(data, query) {
   const results = (data && data.results) || [];
+  const verses = (data && data.verses) || [];
   const messageElement = addMessage('', 'bot');
   messageElement.classList.add('claude-find-results');
   const contentEl = messageElement.querySelector('.claude-message-content');
 
-  if (results.length === 0) {
+  if (results.length === 0 && verses.length === 0 && data && data.phrase) {
+    contentEl.innerHTML = `
+      <div class="find-results-empty">
+        <p>The exact phrase <strong>${escapeHTML(query)}</strong> doesn't appear in the Bible text or the sermon references.</p>
+        <p class="find-results-empty-hint">Remove the quotes to search by meaning instead.</p>
+      </div>
+    `;
+    return messageElement;
+  }
+
+  if (results.length === 0 && verses.length === 0) {
     contentEl.innerHTML = `
       <div class="find-results-empty">
         <p>No sermons matched <strong>${escapeHTML(query)}</strong> closely enough.</p>
@@ -2889,9 +3176,26 @@ function displaySearchResults(data, query) {
 
   const intro = document.createElement('p');
   intro.className = 'find-results-intro';
-  intro.textContent = 'Searches by meaning across sermon transcripts, so a match may not use your exact words. Tap a moment to watch it in context.';
+  intro.textContent = data.local
+    ? (data.phrase
+      ? 'Exact matches in the KJV text and in what sermons said about each passage. Tap a moment to watch it in context.'
+      : 'Keyword matches in the KJV text and in what sermons said about each passage (the search service is unavailable right now). Tap a moment to watch it in context.')
+    : 'Searches by meaning across sermon transcripts, so a match may not use your exact words. Tap a moment to watch it in context.';
   contentEl.appendChild(intro);
 
+  if (verses.length) {
+    const versesEl = document.createElement('div');
+    versesEl.className = 'find-results-verses';
+    versesEl.innerHTML = '<div class="find-results-verses-title">Matching verses</div>' +
+      verses.map((v) => {
+        const href = referenceViewerUrlFor(v.reference) || '#';
+        return `<a class="find-results-verse" href="${escapeHTML(href)}">` +
+          `<span class="find-results-verse-ref">${escapeHTML(v.reference)}</span> ` +
+          `<span class="find-results-verse-text">${escapeHTML(v.text)}</span></a>`;
+      }).join('');
+    contentEl.appendChild(versesEl);
+  }
+
   const list = document.createElement('div');
   list.className = 'find-results-list';
   groups.forEach((g, gi) => {
@@ -0,0 +1,292 @@
+/* Shared sermon data loader and response cache.
+   Transcripts are snapshotted into /assets/data/transcripts/{video_id}.json by
+   scripts/sync_transcripts.py, so opening one is a static file fetch. The Render
+   API is only asked when there's no snapshot yet (a sermon newer than the last
+   sync) or for a non-English transcript. Loaded by the default layout before
+   any page script; exposes window.SermonData.
+
+   Every API response the pages reuse (transcripts, /search, /answer, recent
+   sermons) goes through SermonData.cached(), which keeps it in IndexedDB
+   across navigations:
+   - keyed by endpoint plus the request's parameters (query, language,
+     filters), serialized with sorted keys so parameter order doesn't matter;
+   - each endpoint has a TTL (POLICIES). Within it the stored copy is used
+     as is; past it, stale-while-revalidate endpoints return the stored copy
+     at once and refresh it in the background, the rest refetch;
+   - concurrent calls for the same key share one request;
+   - size-bounded: past MAX_BYTES or MAX_ENTRIES the least recently used
+     entries are evicted;
+   - failures are never stored, and an expired copy is still served when the
+     refetch fails (the backend is often cold);
+   - without IndexedDB (private windows, old browsers) it degrades to
+     per-page coalescing only. */
+
+(function () {
+  'use strict';
+
+  var API_BASE = 'https://sermon-search-api-8fok.onrender.com';
+  var STATIC_URL = function (videoId) { return '/assets/data/transcripts/' + encodeURIComponent(videoId) + '.json'; };
+  var API_URL = function (videoId, language) {
+    return API_BASE + '/transcript/' + encodeURIComponent(videoId) +
+      (language ? '?language=' + encodeURIComponent(language) : '');
+  };
+
+  var DB_NAME = 'sermon-data';
+  var DB_VERSION = 1;
+  var MAX_BYTES = 20 * 1024 * 1024;
+  var MAX_ENTRIES = 400;
+  var HOUR = 60 * 60 * 1000;
+
+  // ttl: how long a stored response is used without asking the network.
+  // swr: past the TTL, answer from the stored copy and refresh behind it.
+  var POLICIES = {
+    transcript: { ttl: 7 * 24 * HOUR, swr: true },
+    search: { ttl: 6 * HOUR, swr: true },
+    sermons: { ttl: HOUR, swr: true },
+    // Regenerating an answer spends the reader's daily quota, so an expired
+    // one is refetched only when it's asked for again.
+    answer: { ttl: 24 * HOUR, swr: false }
+  };
+  var DEFAULT_POLICY = { ttl: HOUR, swr: false };
+
+  // Settled responses read or written on this page, in-flight lookups, and
+  // background refreshes, all by cache key.
+  var memory = {};
+  var inflight = {};
+  var refreshing = {};
+
+  // ---- IndexedDB ----
+  // "responses" holds {key, value, stored}; "meta" holds the small
+  // {key, endpoint, size, used} records eviction scans, so touching an entry
+  // on read never rewrites the (possibly large) value.
+
+  var dbPromise = null;
+
+  function openDb() {
+    if (dbPromise) return dbPromise;
+    dbPromise = new Promise(function (resolve) {
+      var req;
+      try {
+        req = window.indexedDB && window.indexedDB.open(DB_NAME, DB_VERSION);
+      } catch (e) {
+        req = null;
+      }
+      if (!req) { resolve(null); return; }
+      req.onupgradeneeded = function () {
+        var db = req.result;
+        if (!db.objectStoreNames.contains('responses')) db.createObjectStore('responses', { keyPath: 'key' });
+        if (!db.objectStoreNames.contains('meta')) {
+          db.createObjectStore('meta', { keyPath: 'key' }).createIndex('used', 'used');
+        }
+      };
+      req.onsuccess = function () { resolve(req.result); };
+      req.onerror = function () { resolve(null); };
+      req.onblocked = function () { resolve(null); };
+    });
+    return dbPromise;
+  }
+
+  // Run fn(stores) in one transaction; resolves to whatever fn put in
+  // result.value once it commits, or null if anything fails.
+  function withStores(mode, fn) {
+    return openDb().then(function (db) {
+      if (!db) return null;
+      return new Promise(function (resolve) {
+        var result = { value: null };
+        var tx;
+        try {
+          tx = db.transaction(['responses', 'meta'], mode);
+          fn({ responses: tx.objectStore('responses'), meta: tx.objectStore('meta') }, result);
+        } catch (e) {
+          resolve(null);
+          return;
+        }
+        tx.oncomplete = function () { resolve(result.value); };
+        tx.onerror = tx.onabort = function () { resolve(null); };
+      });
+    });
+  }
+
+  function readStored(key) {
+    return withStores('readwrite', function (s, result) {
+      s.responses.get(key).onsuccess = function (e) { result.value = e.target.result || null; };
+      s.meta.get(key).onsuccess = function (e) {
+        var meta = e.target.result;
+        if (!meta) return;
+        meta.used = Date.now();
+        s.meta.put(meta);
+      };
+    });
+  }
+
+  function writeStored(key, endpoint, entry, size) {
+    return withStores('readwrite', function (s) {
+      s.responses.put({ key: key, value: entry.value, stored: entry.stored });
+      s.meta.put({ key: key, endpoint: endpoint, size: size, used: Date.now() });
+    }).then(scheduleEviction);
+  }
+
+  var evictTimer = null;
+
+  function scheduleEviction() {
+    if (evictTimer) return;
+    evictTimer = setTimeout(function () {
+      evictTimer = null;
+      evict();
+    }, 2000);
+  }
+
+  // Walk entries newest-used first and drop everything past the budgets.
+  function evict() {
+    return withStores('readwrite', function (s) {
+      var bytes = 0;
+      var entries = 0;
+      s.meta.index('used').openCursor(null, 'prev').onsuccess = function (e) {
+        var cursor = e.target.result;
+        if (!cursor) return;
+        bytes += cursor.value.size || 0;
+        entries += 1;
+        if (bytes > MAX_BYTES || entries > MAX_ENTRIES) {
+          s.responses.delete(cursor.value.key);
+          cursor.delete();
+          delete memory[cursor.value.key];
+        }
+        cursor.continue();
+      };
+    });
+  }
+
+  // ---- Cache ----
+
+  function canonical(value) {
+    if (Array.isArray(value)) return value.map(canonical);
+    if (value && typeof value === 'object') {
+      var out = {};
+      Object.keys(value).sort().forEach(function (k) {
+        if (value[k] !== undefined) out[k] = canonical(value[k]);
+      });
+      return out;
+    }
+    return value;
+  }
+
+  function cacheKey(endpoint, params) {
+    return endpoint + '|' + JSON.stringify(canonical(params || {}));
+  }
+
+  function policyFor(endpoint) {
+    return POLICIES[endpoint] || DEFAULT_POLICY;
+  }
+
+  function read(key) {
+    if (memory[key]) return Promise.resolve(memory[key]);
+    return readStored(key).then(function (entry) {
+      if (entry) memory[key] = { value: entry.value, stored: entry.stored };
+      return memory[key] || null;
+    });
+  }
+
+  function store(key, endpoint, value) {
+    var entry = { value: value, stored: Date.now() };
+    memory[key] = entry;
+    var json = JSON.stringify(value);
+    // Only JSON responses come through here; the length is close enough to
+    // the stored size for the budget.
+    if (json !== undefined) writeStored(key, endpoint, entry, json.length);
+  }
+
+  function fetchAndStore(key, endpoint, load) {
+    return Promise.resolve().then(load).then(function (value) {
+      store(key, endpoint, value);
+      return value;
+    });
+  }
+
+  function revalidate(key, endpoint, load, previous, onUpdate) {
+    if (refreshing[key]) return;
+    refreshing[key] = fetchAndStore(key, endpoint, load)
+      .then(function (value) {
+        if (onUpdate && JSON.stringify(value) !== JSON.stringify(previous)) onUpdate(value);
+      })
+      .catch(function () {})
+      .then(function () { delete refreshing[key]; });
+  }
+
+  /* Resolve to the response for (endpoint, params), calling load() (which
+     returns a promise of the parsed response) only when there's no usable
+     stored copy. opts.onUpdate(value) is called if a background refresh
+     brings back something different from what was returned. */
+  function cached(endpoint, params, load, opts) {
+    var key = cacheKey(endpoint, params);
+    if (inflight[key]) return inflight[key];
+    var policy = policyFor(endpoint);
+    var onUpdate = opts && opts.onUpdate;
+    var p = read(key).then(function (entry) {
+      if (!entry) return fetchAndStore(key, endpoint, load);
+      if (Date.now() - entry.stored < policy.ttl) return entry.value;
+      if (policy.swr) {
+        revalidate(key, endpoint, load, entry.value, onUpdate);
+        return entry.value;
+      }
+      // Expired: refetch, but an old copy beats an error from a cold backend.
+      return fetchAndStore(key, endpoint, load).catch(function () { return entry.value; });
+    });
+    var clear = function () { if (inflight[key] === p) delete inflight[key]; };
+    inflight[key] = p;
+    p.then(clear, clear);
+    return p;
+  }
+
+  /* The stored response for (endpoint, params) if it's within its TTL, else
+     null. For callers that produce the response themselves (a stream) and
+     save it with put(). */
+  function get(endpoint, params) {
+    return read(cacheKey(endpoint, params)).then(function (entry) {
+      return entry && Date.now() - entry.stored < policyFor(endpoint).ttl ? entry.value : null;
+    });
+  }
+
+  function put(endpoint, params, value) {
+    store(cacheKey(endpoint, params), endpoint, value);
+  }
+
+  // ---- Transcripts ----
+
+  function getJson(url, init) {
+    return fetch(url, init).then(function (r) {
+      if (!r.ok) {
+        var err = new Error('Failed to fetch transcript: ' + r.status + ' ' + r.statusText);
+        err.status = r.status;
+        throw err;
+      }
+      return r.json();
+    });
+  }
+
+  function fromApi(videoId, language) {
+    return getJson(API_URL(videoId, language), {
+      method: 'GET',
+      headers: { 'Accept': 'application/json', 'Accept-Language': language || 'en' },
+      mode: 'cors'
+    });
+  }
+
+  /* Resolve to the transcript payload ({video_id, title, publish_date, segments}).
+     opts.language: snapshots are English; any other language goes to the API. */
+  function transcript(videoId, opts) {
+    var language = (opts && opts.language) || 'en';
+    return cached('transcript', { video_id: videoId, language: language }, function () {
+      return language === 'en'
+        ? getJson(STATIC_URL(videoId)).catch(function () { return fromApi(videoId); })
+        : fromApi(videoId, language);
+    }, opts);
+  }
+
+  window.SermonData = {
+    apiBase: API_BASE,
+    transcript: transcript,
+    cached: cached,
+    get: get,
+    put: put
+  };
+})();
@@ -10,10 +10,13 @@
   var API_BASE = 'https://sermon-search-api-8fok.onrender.com';
   // Static catalog (built by sermon-library/tools/build_sermon_catalog.py).
   // We read the generated study notes for this sermon from here so the card
-  // works without an API call. At full scale, if the catalog grows large, move
-  // notes into the /transcript API response or per-sermon files, this lookup
-  // is keyed by video_id, so that swap is localized to loadNotes().
+  // works without an API call. scripts/build_catalog_shards.py splits it into
+  // one small file per sermon; the whole catalog is only fetched if this
+  // sermon's file is missing (e.g. the shards haven't been rebuilt yet).
   var CATALOG_URL = '/assets/data/sermons_catalog.json';
+  var ENTRY_URL = function (videoId) {
+    return '/assets/data/catalog/' + encodeURIComponent(videoId) + '.json';
+  };
 
   var els = {};
   function $(id) { return document.getElementById(id); }
@@ -224,6 +227,15 @@
   // Fetch this sermon's catalog entry once: it carries both the Overview notes
   // and the section headers the transcript render needs.
   function fetchEntry(videoId) {
+    return fetch(ENTRY_URL(videoId))
+      .then(function (r) {
+        if (!r.ok) throw new Error('HTTP ' + r.status);
+        return r.json();
+      })
+      .catch(function () { return fetchEntryFromCatalog(videoId); });
+  }
+
+  function fetchEntryFromCatalog(videoId) {
     return fetch(CATALOG_URL)
       .then(function (r) { return r.ok ? r.json() : []; })
       .then(function (catalog) {
@@ -292,11 +304,14 @@
     // headers can be interleaved and the contents table matches them.
     var entryP = fetchEntry(videoId);
 
-    var txP = fetch(API_BASE + '/transcript/' + encodeURIComponent(videoId))
-      .then(function (r) {
-        if (!r.ok) throw new Error('HTTP ' + r.status);
-        return r.json();
-      });
+    // Static snapshot first (sermon-data.js), the API only when there isn't one.
+    var txP = window.SermonData
+      ? window.SermonData.transcript(videoId)
+      : fetch(API_BASE + '/transcript/' + encodeURIComponent(videoId))
+        .then(function (r) {
+          if (!r.ok) throw new Error('HTTP ' + r.status);
+          return r.json();
+        });
 
     Promise.all([txP, entryP])
       .then(function (results) {
@@ -1,9 +1,9 @@
 /**
  * Sermons page, static browse of the transcribed sermon library.
  *
- * Reads the prebuilt catalog (assets/data/sermons_catalog.json, generated by
- * sermon-library/tools/build_sermon_catalog.py) and renders a reverse-chron
- * list. Browsing is fully static: no API call, works even if the backend is
+ * Reads the slim listing index (assets/data/catalog/index.json, split out of
+ * sermons_catalog.json by scripts/build_catalog_shards.py) and renders a
+ * reverse-chron list; falls back to the full catalog if the index is missing. Browsing is fully static: no API call, works even if the backend is
  * asleep. Each row links to the styled transcript page (/transcript.html?v=…).
  *
  * The catalog is already sorted newest-first. The AI-generated `description`
@@ -13,6 +13,7 @@
 (function () {
   'use strict';
 
+  var INDEX_URL = '/assets/data/catalog/index.json';
   var CATALOG_URL = '/assets/data/sermons_catalog.json';
   var listEl = document.getElementById('sx-list');
   var filterEl = document.getElementById('sx-filter');
@@ -74,12 +75,13 @@
   function applyFilter() {
     var q = (filterEl && filterEl.value || '').trim().toLowerCase();
     var items = !q ? all : all.filter(function (s) {
+      // Index rows carry `themes` at the top level; full catalog rows under notes.
       var notes = s.notes || {};
       var hay = [
         s.title || '',
         s.description || '',
         (notes.outline || []).join(' '),
-        (notes.themes || []).join(' ')
+        (s.themes || notes.themes || []).join(' ')
       ].join(' ').toLowerCase();
       return hay.indexOf(q) !== -1;
     });
@@ -89,8 +91,15 @@
     render(items);
   }
 
-  fetch(CATALOG_URL)
-    .then(function (r) { if (!r.ok) throw new Error('catalog ' + r.status); return r.json(); })
+  function fetchList(url) {
+    return fetch(url).then(function (r) {
+      if (!r.ok) throw new Error('catalog ' + r.status);
+      return r.json();
+    });
+  }
+
+  fetchList(INDEX_URL)
+    .catch(function () { return fetchList(CATALOG_URL); })
     .then(function (data) {
       all = Array.isArray(data) ? data : [];
       applyFilter();
@@ -0,0 +1,288 @@
+"""
+Adaptive async HTTP fetching for the sermon API scripts.
+
+The API runs on Render's free tier: cold starts answer slowly or with 502s for
+the first minute, and bursts get 429s, while a warm container happily serves
+many requests at once. A fixed semaphore is either too timid for the warm case
+or too aggressive for the cold one, so AdaptiveFetcher sizes its in-flight
+window from what the backend is actually doing:
+
+- AIMD window: +1 per window's worth of fast successes, halved on 429/5xx/
+  network errors, trimmed when time to response headers inflates well past
+  the best observed. Body download and parse time scale with the payload (a
+  large book is slow on a healthy server), so they are recorded but never
+  treated as a congestion signal.
+- Retries use full-jitter exponential backoff and honor Retry-After.
+- A circuit breaker pauses all requests after repeated consecutive failures,
+  then lets traffic back through at the minimum window; after too many trips
+  it stays open and requests fail fast instead of hammering a dead backend.
+- Every attempt is timed (status, latency to headers, body time, bytes,
+  window) for the run summary.
+
+Used by fetch_bible_data.py and process_existing_metadata.py.
+"""
+
+import os
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised when the breaker has tripped too many times to keep trying."""
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def full_jitter(attempt, base, cap):
+    """AWS-style full jitter: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def body_size(response):
+    """Body bytes of a response, whether it was read whole or streamed to a consumer."""
+    if response is None:
+        return 0
+    try:
+        return len(response.content)
+    except httpx.ResponseNotRead:
+        return response.num_bytes_downloaded
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency window gating in-flight requests."""
+
+    def __init__(self, initial=5, min_window=1, max_window=16, latency_tolerance=2.5):
+        self.window = float(initial)
+        self.min_window = min_window
+        self.max_window = max_window
+        self.latency_tolerance = latency_tolerance
+        self.peak_window = self.window
+        self.in_flight = 0
+        self.best_latency = None
+        self.ewma_latency = None
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < max(1, int(self.window)))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, latency):
+        self.ewma_latency = latency if self.ewma_latency is None else 0.8 * self.ewma_latency + 0.2 * latency
+        self.best_latency = latency if self.best_latency is None else min(self.best_latency, latency)
+        if latency > self.best_latency * self.latency_tolerance and self.window > self.min_window:
+            # Queueing on the server side: back off gently before it turns into 5xx.
+            self._decrease(0.9)
+        else:
+            self.window = min(self.max_window, self.window + 1.0 / max(self.window, 1.0))
+            self.peak_window = max(self.peak_window, self.window)
+
+    def on_congestion(self):
+        self._decrease(0.5)
+
+    def reset_to_min(self):
+        self.window = float(self.min_window)
+
+    def _decrease(self, factor):
+        # Concurrent failures from the same burst should only count once, so
+        # decrease at most once per observed round trip.
+        now = time.monotonic()
+        if now - self._last_decrease < (self.ewma_latency or 1.0):
+            return
+        self._last_decrease = now
+        self.window = max(float(self.min_window), self.window * factor)
+
+
+class CircuitBreaker:
+    """Pause all traffic after `threshold` consecutive failures."""
+
+    def __init__(self, threshold=5, cooldown=30.0, max_trips=3):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_trips = max_trips
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+
+    async def before_request(self):
+        if self.trips > self.max_trips:
+            raise CircuitOpenError(f"circuit breaker tripped {self.trips} times")
+        delay = self.open_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record_success(self):
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        """Returns True when this failure trips the breaker."""
+        self.consecutive_failures += 1
+        if self.consecutive_failures < self.threshold:
+            return False
+        self.consecutive_failures = 0
+        self.trips += 1
+        # Each successive trip waits longer; a cold start usually clears in one.
+        self.open_until = time.monotonic() + self.cooldown * self.trips
+        return True
+
+
+class AdaptiveFetcher:
+    """GET with an adaptive in-flight window, jittered retries and a circuit breaker.
+
+    `get()` returns the final httpx.Response for anything that isn't retryable
+    (2xx, 304, 404, ...) or None once retries are exhausted or the breaker has
+    given up. Callers decide what a non-2xx response means for them.
+
+    With `on_body`, a 2xx body isn't buffered: the request is streamed and
+    `await on_body(response)` consumes it (response.aiter_bytes()) while the
+    connection is open. A network error mid-body is retried like any other,
+    so on_body must start over cleanly each time it's called.
+    """
+
+    def __init__(self, client, initial=None, max_window=None, max_retries=None,
+                 base_backoff=None, max_backoff=60.0, timeout=60.0,
+                 breaker_threshold=None, breaker_cooldown=None, on_request=None):
+        env = os.environ.get
+        self.client = client
+        self.timeout = timeout
+        self.max_retries = max_retries if max_retries is not None else int(env("FETCH_MAX_RETRIES", "4"))
+        self.base_backoff = base_backoff if base_backoff is not None else float(env("FETCH_BACKOFF_BASE", "1.0"))
+        self.max_backoff = max_backoff
+        self.limiter = AdaptiveLimiter(
+            initial=initial if initial is not None else int(env("FETCH_CONCURRENCY", "5")),
+            max_window=max_window if max_window is not None else int(env("FETCH_MAX_CONCURRENCY", "16")),
+        )
+        self.breaker = CircuitBreaker(
+            threshold=breaker_threshold if breaker_threshold is not None else int(env("FETCH_BREAKER_THRESHOLD", "5")),
+            cooldown=breaker_cooldown if breaker_cooldown is not None else float(env("FETCH_BREAKER_COOLDOWN", "30")),
+        )
+        # Optional hook called with each timing record (e.g. to feed run metrics).
+        self.on_request = on_request
+        self.records = []
+
+    async def get(self, url, headers=None, on_body=None):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await self.breaker.before_request()
+            except CircuitOpenError as e:
+                print(f"Skipping {url}: {e}")
+                return None
+
+            await self.limiter.acquire()
+            try:
+                response, error, latency, body_time = await self._attempt(url, headers, on_body)
+            finally:
+                await self.limiter.release()
+            status = response.status_code if response is not None else None
+            self._record(url, attempt, status, latency, body_time, response, error)
+
+            retryable = error is not None or status in RETRYABLE_STATUS
+            if retryable:
+                self.limiter.on_congestion()
+                if self.breaker.record_failure():
+                    self.limiter.reset_to_min()
+                    print(f"Circuit breaker open for {self.breaker.cooldown * self.breaker.trips:.0f}s "
+                          f"after repeated failures (trip {self.breaker.trips})")
+            else:
+                self.limiter.on_success(latency)
+                self.breaker.record_success()
+                return response
+
+            detail = status or f"{type(error).__name__}: {error}"
+            if attempt >= self.max_retries:
+                print(f"Giving up on {url} after {self.max_retries} attempts ({detail})")
+                return None
+            wait = full_jitter(attempt, self.base_backoff, self.max_backoff)
+            retry_after = parse_retry_after(response.headers.get("retry-after")) if response is not None else None
+            if retry_after is not None:
+                wait = min(self.max_backoff, retry_after) + random.uniform(0, self.base_backoff)
+            print(f"Attempt {attempt}/{self.max_retries} failed for {url} ({detail}); "
+                  f"retrying in {wait:.1f}s (window {self.limiter.window:.1f})")
+            await asyncio.sleep(wait)
+        return None
+
+    async def _attempt(self, url, headers, on_body=None):
+        """Returns (response, error, latency to headers, body read/parse time)."""
+        started = time.monotonic()
+        latency = None
+        try:
+            async with self.client.stream("GET", url, headers=headers or {}, timeout=self.timeout) as response:
+                latency = time.monotonic() - started
+                if on_body is not None and response.is_success:
+                    await on_body(response)
+                else:
+                    await response.aread()
+            return response, None, latency, time.monotonic() - started - latency
+        except httpx.RequestError as e:
+            if latency is None:
+                return None, e, time.monotonic() - started, 0.0
+            return None, e, latency, time.monotonic() - started - latency
+
+    def _record(self, url, attempt, status, latency, body_time, response, error):
+        record = {
+            "url": url,
+            "attempt": attempt,
+            "status": status,
+            "latency": round(latency, 4),
+            "body": round(body_time, 4),
+            "bytes": body_size(response),
+            "window": round(self.limiter.window, 2),
+            "error": type(error).__name__ if error is not None else None,
+        }
+        self.records.append(record)
+        if self.on_request:
+            self.on_request(record)
+
+    def summary(self):
+        latencies = [r["latency"] for r in self.records if r["status"] and r["status"] < 400]
+        return {
+            "requests": len(self.records),
+            "retries": sum(1 for r in self.records if r["attempt"] > 1),
+            "failures": sum(1 for r in self.records
+                            if r["error"] or (r["status"] in RETRYABLE_STATUS)),
+            "bytes": sum(r["bytes"] for r in self.records),
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "final_window": round(self.limiter.window, 2),
+            "peak_window": round(self.limiter.peak_window, 2),
+            "breaker_trips": self.breaker.trips,
+        }
+
+    def print_summary(self):
+        s = self.summary()
+        p50 = f"{s['latency_p50']:.2f}s" if s["latency_p50"] is not None else "n/a"
+        p95 = f"{s['latency_p95']:.2f}s" if s["latency_p95"] is not None else "n/a"
+        print(f"HTTP: {s['requests']} requests, {s['retries']} retries, {s['failures']} failures, "
+              f"{s['bytes'] / 1e6:.1f} MB, p50 {p50}, p95 {p95}, "
+              f"window {s['final_window']} (peak {s['peak_window']}), breaker trips {s['breaker_trips']}")
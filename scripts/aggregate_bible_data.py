@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Derive every Bible reference summary from the saved book files in one pass.
+
+fetch_bible_data.py used to take bible_stats.json and bible_books.json from
+their own API calls, so a failed or stale call left them disagreeing with the
+book files the viewer actually reads. This stage streams books/*.json once
+(either on-disk format; legacy files a chapter at a time) and writes:
+
+    bible_stats.json                same keys as the API's /bible/stats, plus sermons_count
+    bible_books.json                {"books": [{"book", "count"}]}, most-referenced first
+    rollups/summary.json            per-book refs/sermons/chapters, top chapters and
+                                    verses, testament totals
+    rollups/{Book}.json             per-chapter refs + distinct sermons + per-verse refs
+                                    (what the viewer's chapter grid shows)
+    rollups/chapter_sermons.json    {"Romans 12": distinct sermons}, for the chat chips
+
+Book files are named after the API's book names ("1_Corinthians"); the API
+also files some Psalms references under "Psalm", which the rollups fold into
+Psalms.
+
+A book the current bible_stats.json counts references for but which has no
+book file means a partial checkout or a failed fetch, not a book that lost
+its sermons: the run fails and leaves every summary untouched rather than
+publishing totals without it (build_trends.py applies the same check).
+
+    python scripts/aggregate_bible_data.py
+"""
+
+import os
+import sys
+import json
+import glob
+from collections import Counter, defaultdict
+
+import metrics
+from reference_format import iter_chapter_columns, write_json
+
+OUTPUT_DIR = os.environ.get("OUTPUT_DIR", "assets/data/bible")
+KJV_BOOKS_PATH = os.path.join(os.path.dirname(__file__), "..", "assets", "data", "Bible-kjv-master", "Books.json")
+COMPACT = os.environ.get("BIBLE_DATA_FORMAT") == "compact"
+
+# API book names that are alternate spellings of a canonical book.
+BOOK_ALIASES = {"Psalm": "Psalms"}
+# The API's /bible/stats lists the top 10 books and chapters.
+STATS_TOP_N = 10
+ROLLUP_TOP_N = 20
+UNKNOWN_CHAPTER = "unknown"
+
+
+def canonical_books():
+    """Display names in Bible order (first 39 are the Old Testament)."""
+    with open(KJV_BOOKS_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def api_book_names():
+    """Every book name the API serves: canonical names underscored, plus aliases."""
+    return [name.replace(" ", "_") for name in canonical_books()] + list(BOOK_ALIASES)
+
+
+def display_name(api_name):
+    return BOOK_ALIASES.get(api_name, api_name).replace("_", " ")
+
+
+def chapter_key(key):
+    return key if str(key).isdigit() and int(key) > 0 else UNKNOWN_CHAPTER
+
+
+def top(counter, n):
+    # Ties break on the key so reruns over the same data are byte-identical.
+    return sorted(counter.items(), key=lambda kv: (-kv[1], kv[0]))[:n]
+
+
+def missing_books(output_dir=OUTPUT_DIR):
+    """Books bible_stats.json counts references for that have no book file."""
+    try:
+        with open(os.path.join(output_dir, "bible_stats.json"), encoding="utf-8") as f:
+            counts = json.load(f).get("books_count") or {}
+    except (OSError, ValueError, AttributeError):
+        return []
+    return sorted(name for name, n in counts.items()
+                  if n and not os.path.exists(os.path.join(output_dir, "books", f"{name}.json")))
+
+
+def aggregate(output_dir=OUTPUT_DIR, compact=COMPACT):
+    books_dir = os.path.join(output_dir, "books")
+    paths = sorted(glob.glob(os.path.join(books_dir, "*.json")))
+    if not paths:
+        print(f"No book files in {books_dir}; leaving summaries untouched")
+        return False
+    missing = missing_books(output_dir)
+    if missing:
+        print(f"Book files missing for {', '.join(missing)} (counted in bible_stats.json); "
+              f"leaving summaries untouched")
+        return False
+
+    order = canonical_books()
+    old_testament = set(order[:39])
+
+    total = 0
+    books_count = {}
+    chapters_count = {}
+    book_refs = Counter()
+    book_sermons = defaultdict(set)
+    chapter_refs = defaultdict(Counter)        # display -> chapter -> refs
+    chapter_sermons = defaultdict(lambda: defaultdict(set))
+    verse_refs = defaultdict(lambda: defaultdict(Counter))
+    testament_refs = Counter()
+    testament_sermons = defaultdict(set)
+    # Sermons are counted by small int ids: the (chapter, sermon) sets are the
+    # bulk of what this pass holds, and each row parses its own id string.
+    all_sermons = {}
+
+    for path in paths:
+        api_name = os.path.basename(path)[:-len(".json")]
+        display = display_name(api_name)
+        testament = "old" if display in old_testament else "new"
+        per_chapter = Counter()
+        for key, (video_ids, verses, _) in iter_chapter_columns(path):
+            ch = chapter_key(key)
+            per_chapter[ch] += len(video_ids)
+            for video_id, verse in zip(video_ids, verses):
+                sermon = all_sermons.setdefault(video_id, len(all_sermons))
+                chapter_refs[display][ch] += 1
+                book_sermons[display].add(sermon)
+                chapter_sermons[display][ch].add(sermon)
+                if verse is not None and ch != UNKNOWN_CHAPTER:
+                    verse_refs[display][ch][str(verse)] += 1
+                testament_sermons[testament].add(sermon)
+        count = sum(per_chapter.values())
+        books_count[api_name] = count
+        chapters_count[api_name] = dict(per_chapter)
+        book_refs[display] += count
+        testament_refs[testament] += count
+        total += count
+
+    # bible_stats.json / bible_books.json keep the API's shape and naming.
+    chapter_totals = Counter({(b, ch): n for b, chs in chapters_count.items()
+                              for ch, n in chs.items() if ch != UNKNOWN_CHAPTER})
+    stats = {
+        "total_references": total,
+        "books_count": books_count,
+        "chapters_count": chapters_count,
+        "top_books": [{"book": b, "count": n} for b, n in top(Counter(books_count), STATS_TOP_N)],
+        "top_chapters": [{"book": b, "chapter": ch, "count": n}
+                         for (b, ch), n in top(chapter_totals, STATS_TOP_N)],
+        "old_testament_count": testament_refs["old"],
+        "new_testament_count": testament_refs["new"],
+        "sermons_count": len(all_sermons),
+    }
+    write_json(os.path.join(output_dir, "bible_stats.json"), stats, compact)
+    write_json(os.path.join(output_dir, "bible_books.json"),
+               {"books": [{"book": b, "count": n} for b, n in top(Counter(books_count), len(books_count))]},
+               compact)
+
+    rollups_dir = os.path.join(output_dir, "rollups")
+    os.makedirs(rollups_dir, exist_ok=True)
+    ordered = [b for b in order if b in book_refs] + sorted(b for b in book_refs if b not in order)
+
+    keep = {"summary.json", "chapter_sermons.json"}
+    chip_counts = {}
+    for display in ordered:
+        chapters = {}
+        for ch in sorted(chapter_refs[display], key=lambda c: (c == UNKNOWN_CHAPTER, int(c) if c.isdigit() else 0)):
+            entry = {"refs": chapter_refs[display][ch], "sermons": len(chapter_sermons[display][ch])}
+            if verse_refs[display][ch]:
+                entry["verses"] = dict(sorted(verse_refs[display][ch].items(),
+                                              key=lambda kv: (not kv[0].isdigit(), int(kv[0]) if kv[0].isdigit() else 0, kv[0])))
+            chapters[ch] = entry
+            if ch != UNKNOWN_CHAPTER:
+                chip_counts[f"{display} {ch}"] = entry["sermons"]
+                if display == "Psalms":
+                    chip_counts[f"Psalm {ch}"] = entry["sermons"]
+        name = f"{display.replace(' ', '_')}.json"
+        keep.add(name)
+        write_json(os.path.join(rollups_dir, name), {
+            "book": display,
+            "refs": book_refs[display],
+            "sermons": len(book_sermons[display]),
+            "chapters": chapters,
+        }, compact=True)
+
+    top_chapters = Counter({(b, ch): n for b, chs in chapter_refs.items()
+                            for ch, n in chs.items() if ch != UNKNOWN_CHAPTER})
+    top_verses = Counter({(b, ch, v): n for b, chs in verse_refs.items()
+                          for ch, vs in chs.items() for v, n in vs.items()})
+    summary = {
+        "total_references": total,
+        "sermons": len(all_sermons),
+        "books": [{"book": b, "refs": book_refs[b], "sermons": len(book_sermons[b]),
+                   "chapters": sum(1 for ch in chapter_refs[b] if ch != UNKNOWN_CHAPTER)}
+                  for b in ordered],
+        "top_chapters": [{"book": b, "chapter": int(ch), "refs": n,
+                          "sermons": len(chapter_sermons[b][ch])}
+                         for (b, ch), n in top(top_chapters, ROLLUP_TOP_N)],
+        "top_verses": [{"book": b, "chapter": int(ch), "verse": v, "refs": n}
+                       for (b, ch, v), n in top(top_verses, ROLLUP_TOP_N)],
+        "testaments": {t: {"refs": testament_refs[t], "sermons": len(testament_sermons[t])}
+                       for t in ("old", "new")},
+    }
+    write_json(os.path.join(rollups_dir, "summary.json"), summary, compact=True)
+    write_json(os.path.join(rollups_dir, "chapter_sermons.json"), chip_counts, compact=True)
+
+    for path in glob.glob(os.path.join(rollups_dir, "*.json")):
+        if os.path.basename(path) not in keep:
+            os.remove(path)
+
+    print(f"Aggregated {total} references from {len(paths)} book files "
+          f"({len(all_sermons)} sermons) into bible_stats.json, bible_books.json and rollups/")
+    return True
+
+
+if __name__ == "__main__":
+    with metrics.run("aggregate_bible_data"):
+        if not aggregate():
+            sys.exit(1)
@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the data pipelines.
+
+Starts local stand-ins for the sermon API and for an OpenAI-compatible chat
+endpoint, runs the real scripts against them as subprocesses, and reports wall
+time, requests/sec, retries (repeat requests for the same path, as seen by the
+stub), status codes and the script's peak RSS. Each run is saved as JSON under
+.cache/bench/ so tuning changes (FETCH_CONCURRENCY, FETCH_MAX_RETRIES, the
+backoff base, --max-workers, --batch-tokens, ...) can be compared run to run
+instead of guessed at in production.
+
+    python scripts/benchmark.py                        # every scenario
+    python scripts/benchmark.py fetch-cold overlays    # just these
+    python scripts/benchmark.py fetch-warm --set latency_ms=400 --set capacity=4
+    python scripts/benchmark.py fetch-warm --env FETCH_CONCURRENCY=10 --compare
+    python scripts/benchmark.py --serve --set cold_start=20   # stubs only, Ctrl-C to stop
+
+Stub knobs (--set key=value): cold_start (s before the first response),
+latency_ms / latency_sigma (lognormal per-request latency), capacity
+(requests served at once; the rest queue), max_queue (queued requests beyond
+this get 429 + Retry-After), error_rate (fraction answered 502/503),
+throttle_rate (fraction answered 429), payload (real: serve the repo's book
+files, or synthetic), refs_per_book, sermons, transcript_segments,
+llm_latency_ms, llm_ms_per_token.
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from reference_format import load_book
+from aggregate_bible_data import api_book_names
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+RESULTS_DIR = os.path.join(ROOT, ".cache", "bench")
+BOOKS_DIR = os.path.join(ROOT, "assets", "data", "bible", "books")
+PYTHON = sys.executable
+
+DEFAULTS = {
+    "cold_start": 0.0,
+    "latency_ms": 120.0,
+    "latency_sigma": 0.5,
+    "capacity": 8,
+    "max_queue": 32,
+    "error_rate": 0.0,
+    "throttle_rate": 0.0,
+    "payload": "real",
+    "refs_per_book": 450,
+    "sermons": 700,
+    "transcript_segments": 600,
+    "llm_latency_ms": 300.0,
+    "llm_ms_per_token": 2.0,
+    "seed": 1,
+}
+
+# name -> (stub overrides, how to run it)
+SCENARIOS = {
+    "fetch-warm": ({}, "fetch"),
+    "fetch-cold": ({"cold_start": 8.0, "error_rate": 0.05}, "fetch"),
+    "fetch-throttled": ({"capacity": 3, "max_queue": 6, "throttle_rate": 0.02}, "fetch"),
+    "fetch-incremental": ({}, "fetch-incremental"),
+    "fetch-legacy": ({}, "fetch-legacy"),
+    "metadata": ({"cold_start": 3.0}, "metadata"),
+    "overlays": ({}, "overlays"),
+}
+
+OVERLAY_BOOKS = ["Ruth", "Jude", "Philemon", "Mark", "Psalms"]
+
+
+# ----------------------------------------------------------------------
+# Stub servers
+# ----------------------------------------------------------------------
+
+class StubApp:
+    """Shared state behind both stub servers: config, fault injection, counters."""
+
+    def __init__(self, config):
+        self.config = config
+        self.random = random.Random(config["seed"])
+        self.lock = threading.Lock()
+        self.capacity = threading.BoundedSemaphore(int(config["capacity"]))
+        self.queued = 0
+        self.ready_at = None
+        self.payloads = {}
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.paths = Counter()
+            self.statuses = Counter()
+            self.bytes = 0
+            self.ready_at = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": sum(self.paths.values()),
+                "retries": sum(n - 1 for n in self.paths.values()),
+                "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+                "bytes": self.bytes,
+            }
+
+    def record(self, key, status, size):
+        with self.lock:
+            self.paths[key] += 1
+            self.statuses[status] += 1
+            self.bytes += size
+
+    def sample_latency(self, median_ms):
+        with self.lock:
+            factor = self.random.lognormvariate(0, float(self.config["latency_sigma"]))
+        return median_ms * factor / 1000.0
+
+    def roll(self, rate):
+        with self.lock:
+            return self.random.random() < float(rate)
+
+    def wait_until_ready(self):
+        # Like Render's free tier: the first request boots the container and
+        # every request waits for it.
+        with self.lock:
+            if self.ready_at is None:
+                self.ready_at = time.monotonic() + float(self.config["cold_start"])
+            delay = self.ready_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def admit(self):
+        """Returns False when the queue is full (caller answers 429)."""
+        with self.lock:
+            if self.queued >= int(self.config["max_queue"]):
+                return False
+            self.queued += 1
+        self.capacity.acquire()
+        with self.lock:
+            self.queued -= 1
+        return True
+
+    # -- sermon API payloads ---------------------------------------------
+
+    def book_payload(self, name):
+        if name not in self.payloads:
+            self.payloads[name] = self._build_book(name)
+        return self.payloads[name]
+
+    def _build_book(self, name):
+        if self.config["payload"] == "real":
+            path = os.path.join(BOOKS_DIR, f"{name}.json")
+            if not os.path.exists(path):
+                return None
+            return json.dumps(load_book(path), ensure_ascii=False).encode("utf-8")
+        if name not in api_book_names():
+            return None
+        rng = random.Random(f"{self.config['seed']}:{name}")
+        chapters = {}
+        for i in range(int(self.config["refs_per_book"])):
+            ch = rng.randint(1, 30)
+            start = rng.uniform(0, 3000)
+            video_id = f"vid{rng.randint(0, int(self.config['sermons']) - 1):05d}"
+            chapters.setdefault(str(ch), []).append({
+                "book": name.replace("_", " "), "chapter": ch, "verse": rng.randint(1, 30),
+                "reference_text": f"{name} {ch}", "context": "x" * rng.randint(80, 400),
+                "is_implicit": rng.random() < 0.3, "video_id": video_id,
+                "start_time": start, "end_time": start + rng.uniform(5, 90),
+                "point_summary": "y" * rng.randint(40, 200),
+                "point_summary_model": "stub/model", "sermon_title": f"Sermon {video_id}",
+                "url": f"https://www.youtube.com/watch?v={video_id}&t={int(start)}",
+            })
+        refs = [r for k in sorted(chapters, key=int) for r in chapters[k]]
+        return json.dumps({"book": name, "total_references": len(refs),
+                           "chapters": chapters, "references": refs}).encode("utf-8")
+
+    def sermons_payload(self, limit=None, offset=0):
+        total = int(self.config["sermons"])
+        end = total if limit is None else min(total, offset + limit)
+        sermons = [{
+            "video_id": f"vid{i:05d}", "title": f"Sermon {i}",
+            "publish_date": 20200101 + i, "channel": "Fellowship Church",
+            "url": f"https://www.youtube.com/watch?v=vid{i:05d}",
+        } for i in range(offset, end)]
+        return json.dumps({"sermons": sermons, "total": total}).encode("utf-8")
+
+    def transcript_payload(self, video_id):
+        segments = [{"start_time": i * 6.0, "end_time": i * 6.0 + 6.0,
+                     "text": f"segment {i} of the sermon transcript text " * 3}
+                    for i in range(int(self.config["transcript_segments"]))]
+        return json.dumps({"video_id": video_id, "title": f"Sermon {video_id}",
+                           "publish_date": 20240101, "segments": segments}).encode("utf-8")
+
+    # -- fake LLM --------------------------------------------------------
+
+    def completion(self, body):
+        user = body["messages"][-1]["content"]
+        chapters = re.findall(r"^KJV .+? chapter (\d+):\n\n((?:\d+\. .*\n?)+)", user, re.M)
+        headings = "section headings" in user
+
+        def answer(verse_lines):
+            verses = re.findall(r"^(\d+)\. (.*)$", verse_lines, re.M)
+            if headings:
+                step = max(1, len(verses) // 3)
+                return {"headings": [{"before_verse": int(verses[i][0]), "title": f"Section {n + 1}"}
+                                     for n, i in enumerate(range(0, len(verses), step))][:4]}
+            spoken = [{"verse": int(v), "segments": [{"intro": "", "speech": t[len(t) // 2:]}]}
+                      for v, t in verses if len(t) > 40][:3]
+            return {"verses": spoken}
+
+        if len(chapters) > 1 or "For EACH chapter" in user:
+            result = {"chapters": {ch: answer(lines) for ch, lines in chapters}}
+        else:
+            result = answer(chapters[0][1]) if chapters else {}
+        content = json.dumps(result)
+        completion_tokens = len(content) // 4
+        prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+        time.sleep(self.sample_latency(float(self.config["llm_latency_ms"]))
+                   + completion_tokens * float(self.config["llm_ms_per_token"]) / 1000.0)
+        return json.dumps({
+            "id": "stub", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, body=b"", headers=None, key=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+        self.server.app.record(key or self.path, status, len(body))
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def handle_request(self, method):
+        app = self.server.app
+        url = urlsplit(self.path)
+        path = unquote(url.path).rstrip("/")
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        body = None
+        if method == "POST":
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+
+        app.wait_until_ready()
+        if not app.admit():
+            return self.send(429, b'{"detail":"queue full"}', {"Retry-After": "1"})
+        try:
+            if path.endswith("/chat/completions"):
+                # Retries resend the same prompt; key on it so they count as retries.
+                key = "llm:" + hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest()
+            else:
+                key = self.path
+                time.sleep(app.sample_latency(float(app.config["latency_ms"])))
+            if app.roll(app.config["throttle_rate"]):
+                return self.send(429, b'{"detail":"rate limited"}', {"Retry-After": "1"}, key)
+            if app.roll(app.config["error_rate"]):
+                return self.send(app.random.choice([502, 503]), b"", key=key)
+            payload = self.route(path, query, body)
+            if payload is None:
+                return self.send(404, b'{"detail":"not found"}', key=key)
+            etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                return self.send(304, headers={"ETag": etag}, key=key)
+            self.send(200, payload, {"ETag": etag}, key)
+        finally:
+            app.capacity.release()
+
+    def route(self, path, query, body):
+        app = self.server.app
+        if path.endswith("/chat/completions"):
+            return app.completion(body)
+        if path == "/bible/stats":
+            return json.dumps({"total_references": 0}).encode()
+        if path == "/bible/books":
+            return json.dumps({"books": [{"book": b, "count": 0} for b in api_book_names()]}).encode()
+        if path.startswith("/bible/books/"):
+            return app.book_payload(path[len("/bible/books/"):])
+        if path == "/sermons":
+            limit = int(query["limit"]) if "limit" in query else None
+            return app.sermons_payload(limit, int(query.get("offset", 0)))
+        if path.startswith("/transcript/"):
+            return app.transcript_payload(path[len("/transcript/"):])
+        return None
+
+
+def start_stub(config):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.app = StubApp(config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# ----------------------------------------------------------------------
+# Runs
+# ----------------------------------------------------------------------
+
+# Runs the script as its own child and reports that child's rusage. A process
+# forked straight from the harness would start with the harness's RSS high-water
+# mark (ru_maxrss survives fork and exec), and the harness holds the stub and
+# all its payloads; forked from this near-empty interpreter instead, the
+# inherited mark is smaller than any script's own.
+LAUNCHER = """\
+import os, sys
+pid = os.fork()
+if not pid:
+    os.execv(sys.executable, [sys.executable] + sys.argv[2:])
+_, status, usage = os.wait4(pid, 0)
+with open(sys.argv[1], "w") as f:
+    f.write(f"{usage.ru_maxrss} {os.waitstatus_to_exitcode(status)}")
+"""
+
+
+def run_script(argv, env):
+    """Run a script to completion; returns (exit code, wall seconds, peak RSS MB, output tail)."""
+    fd, rusage_path = tempfile.mkstemp(prefix="bench-rss-")
+    os.close(fd)
+    started = time.monotonic()
+    try:
+        proc = subprocess.run([PYTHON, "-S", "-c", LAUNCHER, rusage_path] + argv, cwd=ROOT, env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        wall = time.monotonic() - started
+        with open(rusage_path, encoding="utf-8") as f:
+            fields = f.read().split()
+    finally:
+        os.remove(rusage_path)
+    # The launcher itself failing leaves the file empty.
+    code, maxrss = (int(fields[1]), int(fields[0])) if len(fields) == 2 else (proc.returncode, 0)
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    rss_mb = maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    tail = proc.stdout.decode("utf-8", "replace").strip().splitlines()[-5:]
+    return code, wall, rss_mb, tail
+
+
+def scenario_runs(kind, base_url, workdir, extra_env):
+    """[(label, argv, env, measured)] for a scenario kind."""
+    env = dict(os.environ, API_URL=base_url, PYTHONUNBUFFERED="1",
+               METRICS_DIR=os.path.join(workdir, "metrics"), **extra_env)
+    if kind in ("fetch", "fetch-incremental", "fetch-legacy"):
+        out = os.path.join(workdir, "bible")
+        env.update(OUTPUT_DIR=out)
+        argv = ["scripts/fetch_bible_data.py", "--shards", "--incremental"]
+        if kind != "fetch-legacy":
+            argv.append("--compact")
+        if kind != "fetch-incremental":
+            return [("fetch", argv, env, True)]
+        return [("prime", argv, env, False), ("refresh", argv, env, True)]
+    if kind == "metadata":
+        env.update(ANALYTICS_OUTPUT_DIR=os.path.join(workdir, "analytics"))
+        return [("metadata", ["scripts/process_existing_metadata.py"], env, True)]
+    if kind == "overlays":
+        env.update(OPENROUTER_API_KEY="stub", OPENROUTER_BASE_URL=base_url + "/v1",
+                   OVERLAY_OUTPUT_DIR=workdir, OVERLAY_CACHE=os.path.join(workdir, "llm.sqlite"),
+                   KJV_PACK=os.path.join(workdir, "kjv.pack"))
+        books = [b for b in OVERLAY_BOOKS if os.path.exists(
+            os.path.join(ROOT, "assets", "data", "Bible-kjv-master", f"{b}.json"))]
+        runs = [("pack", ["scripts/kjv_pack.py"], env, False)]
+        # One run per book keeps the scenario short; the scheduler still sees
+        # every chapter of the book at once.
+        for book in books:
+            runs.append((f"overlays:{book}", ["scripts/generate_bible_overlays.py", "--mode", "both",
+                                              "--force", "--book", book], env, True))
+        return runs
+    raise ValueError(f"unknown scenario kind {kind}")
+
+
+def run_scenario(name, overrides, extra_env, script_args):
+    stub_overrides, kind = SCENARIOS[name]
+    # --set wins over the scenario's own settings.
+    config = {**DEFAULTS, **stub_overrides, **overrides}
+    server, base_url = start_stub(config)
+    workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    result = {
+        "scenario": name,
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_rev": git_rev(),
+        "config": config,
+        "env": extra_env,
+        "runs": [],
+    }
+    try:
+        for label, argv, env, measured in scenario_runs(kind, base_url, workdir, extra_env):
+            argv = argv + (script_args if measured and label != "pack" else [])
+            server.app.reset()
+            metrics_name = label.replace(":", "-")
+            code, wall, rss, tail = run_script(argv, dict(env, METRICS_NAME=metrics_name))
+            stats = server.app.stats()
+            run = {"label": label, "command": " ".join(argv), "exit_code": code,
+                   "wall_time": round(wall, 3), "peak_rss_mb": round(rss, 1),
+                   "requests_per_sec": round(stats["requests"] / wall, 2) if wall else None,
+                   "measured": measured, **stats}
+            # The script's own view (metrics.py): retries, bytes, tokens, JSON costs.
+            try:
+                with open(os.path.join(workdir, "metrics", f"{metrics_name}.json"), encoding="utf-8") as f:
+                    run["client"] = json.load(f)["counters"]
+            except (OSError, ValueError, KeyError):
+                pass
+            if code != 0:
+                run["output_tail"] = tail
+            result["runs"].append(run)
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    measured = [r for r in result["runs"] if r["measured"]]
+    result["totals"] = {
+        "wall_time": round(sum(r["wall_time"] for r in measured), 3),
+        "requests": sum(r["requests"] for r in measured),
+        "retries": sum(r["retries"] for r in measured),
+        "peak_rss_mb": max((r["peak_rss_mb"] for r in measured), default=0),
+        "failed_runs": sum(1 for r in measured if r["exit_code"] != 0),
+    }
+    t = result["totals"]
+    t["requests_per_sec"] = round(t["requests"] / t["wall_time"], 2) if t["wall_time"] else None
+    return result
+
+
+def git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def save_result(result):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = result["started"].replace(":", "").replace("-", "").replace("+0000", "Z")
+    path = os.path.join(RESULTS_DIR, f"{result['scenario']}-{stamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def previous_result(scenario, exclude):
+    paths = sorted(p for p in glob.glob(os.path.join(RESULTS_DIR, f"{scenario}-*.json")) if p != exclude)
+    if not paths:
+        return None
+    with open(paths[-1], encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_result(result, previous=None):
+    t = result["totals"]
+    line = (f"{result['scenario']:<18} {t['wall_time']:>8.2f}s  {t['requests']:>6} req  "
+            f"{t['requests_per_sec'] or 0:>7.1f} req/s  {t['retries']:>4} retries  "
+            f"{t['peak_rss_mb']:>7.1f} MB")
+    if t["failed_runs"]:
+        line += f"  ({t['failed_runs']} run(s) FAILED)"
+    print(line)
+    for run in result["runs"]:
+        if run["exit_code"] != 0:
+            print(f"    {run['label']} exited {run['exit_code']}: " + " | ".join(run.get("output_tail", [])))
+    if previous:
+        p = previous["totals"]
+
+        def delta(key):
+            if not p.get(key):
+                return "n/a"
+            return f"{(t[key] - p[key]) / p[key] * 100:+.0f}%"
+        print(f"    vs {previous['started']} ({previous.get('git_rev')}): wall {delta('wall_time')}, "
+              f"req/s {delta('requests_per_sec')}, retries {t['retries'] - p['retries']:+d}, "
+              f"RSS {delta('peak_rss_mb')}")
+
+
+def parse_pairs(pairs, convert=True):
+    out = {}
+    for pair in pairs or []:
+        key, _, value = pair.partition("=")
+        if convert and key in DEFAULTS and not isinstance(DEFAULTS[key], str):
+            value = type(DEFAULTS[key])(value)
+        out[key] = value
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark the data pipelines against local stub backends")
+    p.add_argument("scenarios", nargs="*", help=f"Any of: {', '.join(SCENARIOS)} (default: all)")
+    p.add_argument("--set", action="append", metavar="KEY=VALUE", help="Override a stub setting")
+    p.add_argument("--env", action="append", metavar="NAME=VALUE",
+                   help="Extra environment for the scripts (e.g. FETCH_CONCURRENCY=10)")
+    p.add_argument("--args", default="", help="Extra arguments for the measured script runs")
+    p.add_argument("--compare", action="store_true", help="Show the change against the previous saved run")
+    p.add_argument("--serve", action="store_true", help="Only start the stubs and print their URL")
+    args = p.parse_args()
+
+    overrides = parse_pairs(args.set)
+    unknown = set(overrides) - set(DEFAULTS)
+    if unknown:
+        sys.exit(f"Unknown stub setting(s): {', '.join(sorted(unknown))}")
+
+    if args.serve:
+        server, base_url = start_stub(dict(DEFAULTS, **overrides))
+        print(f"Sermon API stub: {base_url}\nOpenAI-compatible stub: {base_url}/v1\nCtrl-C to stop")
+        try:
+            while True:
+                time.sleep(5)
+                print(json.dumps(server.app.stats()))
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    names = args.scenarios or list(SCENARIOS)
+    bad = [n for n in names if n not in SCENARIOS]
+    if bad:
+        sys.exit(f"Unknown scenario(s): {', '.join(bad)}")
+
+    extra_env = parse_pairs(args.env, convert=False)
+    for name in names:
+        result = run_scenario(name, overrides, extra_env, args.args.split())
+        path = save_result(result)
+        print_result(result, previous_result(name, path) if args.compare else None)
+        print(f"    saved {os.path.relpath(path, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Incremental parsing of the sermon API's per-book reference payloads.
+
+/bible/books/{book} answers with one JSON document per book,
+
+    {"book": "Acts", "total_references": 2226,
+     "chapters": {"1": [{row}, ...], "2": [...], ...},
+     "references": [{row}, ...]}
+
+and the big books run to several megabytes. BookParser is fed the body in
+whatever chunks the network delivers and reports it as events, one reference
+row at a time, so nothing ever holds the whole document:
+
+    field(key, value)            any other top-level key ("book", ...)
+    open_group(key, kind)        "chapters" ("object") / "references" ("array")
+    open_chapter(key)
+    row(chapter, row, text)      chapter is None for rows of "references";
+                                 text is the row's own JSON from the body
+    close_chapter(key)
+    close_group(key, kind)
+    end()
+
+PrettyWriter is a handler that writes those events back out byte for byte as
+json.dump(..., indent=2, ensure_ascii=False) would have, which is how the
+legacy book files are stored.
+"""
+
+import re
+import json
+import codecs
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Keys whose values are streamed row by row rather than decoded whole.
+CHAPTERS_KEY = "chapters"
+ROWS_KEY = "references"
+# Consumed text is dropped from the buffer once this much has piled up.
+COMPACT_AFTER = 1 << 16
+
+
+class Incomplete(Exception):
+    """The buffer ends before the next token does; wait for more input."""
+
+
+class BookParser:
+    """Push parser for one book payload; call feed() per chunk, then close()."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.final = False
+        self.state = "start"
+        self.group = None
+        self.chapter = None
+
+    def feed(self, data):
+        self.buf += self.decoder.decode(data)
+        self._run()
+        if self.pos > COMPACT_AFTER:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+
+    def close(self):
+        self.buf += self.decoder.decode(b"", final=True)
+        self.final = True
+        self._run()
+        if self.state != "done":
+            raise ValueError("book payload ended before the document did")
+        if self.buf[self._skip():].strip():
+            raise ValueError("unexpected data after the book payload")
+
+    def _run(self):
+        # Each step either completes (and may emit one event) or rewinds to
+        # where it started, so a token split across chunks is simply retried.
+        while self.state != "done":
+            start = self.pos
+            try:
+                getattr(self, "_" + self.state)()
+            except Incomplete:
+                self.pos = start
+                return
+
+    # -- tokens --
+
+    def _skip(self):
+        self.pos = WHITESPACE.match(self.buf, self.pos).end()
+        return self.pos
+
+    def _peek(self):
+        if self._skip() >= len(self.buf):
+            if self.final:
+                raise ValueError("book payload is truncated")
+            raise Incomplete
+        return self.buf[self.pos]
+
+    def _expect(self, char):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"expected {char!r} at offset {self.pos}, found {found!r}")
+        self.pos += 1
+
+    def _value(self):
+        self._skip()
+        try:
+            value, end = self.json.raw_decode(self.buf, self.pos)
+        except json.JSONDecodeError:
+            if self.final:
+                raise
+            raise Incomplete
+        # A number running to the end of the buffer may continue in the next chunk.
+        if end == len(self.buf) and not self.final:
+            raise Incomplete
+        self.pos = end
+        return value
+
+    # -- states --
+
+    def _start(self):
+        self._expect("{")
+        self.state = "key"
+
+    def _key(self):
+        char = self._peek()
+        if char == ",":
+            self.pos += 1
+            return
+        if char == "}":
+            self.pos += 1
+            self.state = "done"
+            self.handler.end()
+            return
+        key = self._value()
+        self._expect(":")
+        char = self._peek()
+        if key == CHAPTERS_KEY and char == "{":
+            self.pos += 1
+            self.group, self.state = key, "chapter"
+            self.handler.open_group(key, "object")
+        elif key == ROWS_KEY and char == "[":
+            self.pos += 1
+            self.group, self.chapter, self.state = key, None, "rows"
+            self.handler.open_group(key, "array")
+        else:
+            self.handler.field(key, self._value())
+
+    def _chapter(self):
+        char = self._peek()
+        if char == ",":
+            self.pos += 1
+            return
+        if char == "}":
+            self.pos += 1
+            self.state = "key"
+            self.handler.close_group(self.group, "object")
+            return
+        key = self._value()
+        self._expect(":")
+        self._expect("[")
+        self.chapter, self.state = key, "rows"
+        self.handler.open_chapter(key)
+
+    def _rows(self):
+        char = self._peek()
+        if char == ",":
+            self.pos += 1
+            return
+        if char == "]":
+            self.pos += 1
+            if self.chapter is None:
+                self.state = "key"
+                self.handler.close_group(self.group, "array")
+            else:
+                self.state = "chapter"
+                self.handler.close_chapter(self.chapter)
+            return
+        start = self._skip()
+        row = self._value()
+        self.handler.row(self.chapter, row, self.buf[start:self.pos])
+
+
+def dump_nested(value, depth):
+    """json.dumps(value, indent=2) as it appears `depth` levels into a document."""
+    # Strings escape their newlines, so every raw newline is structural.
+    return json.dumps(value, ensure_ascii=False, indent=2).replace("\n", "\n" + "  " * depth)
+
+
+class PrettyWriter:
+    """BookParser handler that re-serializes the payload in the repo's indent=2 style."""
+
+    def __init__(self, out):
+        self.out = out
+        self.keys = 0
+        self.items = 0
+        self.rows = 0
+
+    def _key(self, key):
+        self.out.write(("," if self.keys else "{") + "\n  " + json.dumps(key, ensure_ascii=False) + ": ")
+        self.keys += 1
+
+    def field(self, key, value):
+        self._key(key)
+        self.out.write(dump_nested(value, 1))
+
+    def open_group(self, key, kind):
+        self._key(key)
+        self.out.write("{" if kind == "object" else "[")
+        self.items = self.rows = 0
+
+    def open_chapter(self, key):
+        self.out.write(("," if self.items else "") + "\n    " + json.dumps(key, ensure_ascii=False) + ": [")
+        self.items += 1
+        self.rows = 0
+
+    def row(self, chapter, row, text=None):
+        depth = 2 if chapter is None else 3
+        self.out.write(("," if self.rows else "") + "\n" + "  " * depth + dump_nested(row, depth))
+        self.rows += 1
+
+    def close_chapter(self, key):
+        self.out.write("\n    ]" if self.rows else "]")
+
+    def close_group(self, key, kind):
+        if kind == "object":
+            self.out.write("\n  }" if self.items else "}")
+        else:
+            self.out.write("\n  ]" if self.rows else "]")
+
+    def end(self):
+        self.out.write("\n}" if self.keys else "{}")
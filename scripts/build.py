@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+One entry point for the site's generated data.
+
+The pipeline is a DAG of stages, each declaring the scripts it runs, the files
+it reads and the files it writes:
+
+    metadata         process_existing_metadata.py    API -> _data/analytics/sermons.json
+    bible-fetch      fetch_bible_data.py             API -> assets/data/bible/books/*.json
+    bible-shards     fetch_bible_data.py --reshard   books/{Book}.json -> books/{Book}/*.json   (per book)
+    bible-aggregate  aggregate_bible_data.py         books/*.json -> bible_stats/bible_books/rollups
+    catalog-shards   build_catalog_shards.py         sermons_catalog.json -> catalog/*.json
+    transcripts      sync_transcripts.py             API -> assets/data/transcripts/{video_id}.json
+    trends           build_trends.py                 books/*.json + catalog -> trends/*.json, _data/analytics summaries
+    related          build_related_passages.py       books/*.json -> related/{Book}.json
+    search-index     build_search_index.py           KJV text + books/*.json -> assets/data/search/**
+    asset-manifest   build_asset_manifest.py         assets/data/** -> assets/data-manifest.json    (after all of the above)
+    kjv-pack         kjv_pack.py                     Bible-kjv-master/*.json -> .cache/kjv.pack
+    overlays         generate_bible_overlays.py      Bible-kjv-master/{Book}.json -> bible-headings, bible-red-letter (per book)
+
+A stage's key is a hash of its command, its scripts' contents, the contents
+of its inputs and any environment it declares. When the key matches the last
+successful run and its outputs are still the files that run produced, the
+stage is skipped. Per-book stages keep one key per book and rerun only for
+the books whose inputs changed. Stages that talk to the API (metadata,
+bible-fetch, transcripts) always run, and are cheap when nothing changed
+because they sync incrementally. Everything downstream of them is then
+decided by content, so a quiet day skips the rest. Independent stages run in parallel.
+
+State lives in .cache/build_state.json (the workflow keeps it between runs
+with actions/cache). File hashes are reused while a file's size and mtime are
+unchanged.
+
+sermons_catalog.json and the rest of _data/analytics/ come from the
+sermon-library repo and are inputs here, not stages.
+
+    python scripts/build.py                   # everything
+    python scripts/build.py bible-aggregate   # a stage and what it depends on
+    python scripts/build.py --offline         # skip the API stages
+    python scripts/build.py --dry-run         # show what would run
+    python scripts/build.py --force overlays  # ignore the cache for these stages
+    python scripts/build.py --profile         # also run each stage under cProfile
+
+Every stage writes its run metrics (HTTP and LLM timings, retries, bytes,
+JSON read/write costs; see metrics.py) to _data/pipeline_metrics/{stage}.json,
+and the build itself writes build.json with each stage's status and time.
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import metrics
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+STATE_PATH = os.path.join(ROOT, ".cache", "build_state.json")
+LOG_DIR = os.path.join(ROOT, ".cache", "build_logs")
+PYTHON = sys.executable
+
+KJV = "assets/data/Bible-kjv-master"
+BIBLE = "assets/data/bible"
+
+
+def expand(patterns):
+    """Repo-relative paths matching the glob patterns, sorted."""
+    paths = set()
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(ROOT, pattern), recursive=True):
+            if os.path.isfile(path):
+                paths.add(os.path.relpath(path, ROOT))
+    return sorted(paths)
+
+
+class Stage:
+    """One node of the build graph.
+
+    `items`, when given, splits the stage per item: a callable returning
+    {item: [input patterns]}, with `item_outputs(item)` giving that item's
+    output patterns and `command(items)` building one invocation for every
+    dirty item.
+    """
+
+    def __init__(self, name, command, code=(), inputs=(), outputs=(), deps=(), remote=False,
+                 env=(), requires_env=(), items=None, item_outputs=None):
+        self.name = name
+        self.command = command
+        self.code = list(code)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        self.remote = remote
+        self.env = list(env)
+        self.requires_env = list(requires_env)
+        self.items = items
+        self.item_outputs = item_outputs
+
+    def argv(self, items=None):
+        return self.command(items) if self.items else self.command()
+
+
+def kjv_books():
+    names = [os.path.basename(p)[:-len(".json")] for p in glob.glob(os.path.join(ROOT, KJV, "*.json"))]
+    return {b: [f"{KJV}/{b}.json"] for b in sorted(names) if b != "Books"}
+
+
+def bible_books():
+    names = [os.path.basename(p)[:-len(".json")] for p in glob.glob(os.path.join(ROOT, BIBLE, "books", "*.json"))]
+    return {b: [f"{BIBLE}/books/{b}.json"] for b in sorted(names)}
+
+
+def with_books(argv, books):
+    return argv + [arg for book in books for arg in ("--book", book)]
+
+
+STAGES = [
+    Stage("metadata", lambda: [PYTHON, "scripts/process_existing_metadata.py"],
+          code=["scripts/process_existing_metadata.py", "scripts/adaptive_fetch.py"],
+          outputs=["_data/analytics/sermons.json", "_data/analytics/sermons_sync.json"],
+          remote=True),
+    Stage("bible-fetch", lambda: [PYTHON, "scripts/fetch_bible_data.py", "--compact", "--incremental",
+                                  "--skip-aggregate"],
+          code=["scripts/fetch_bible_data.py", "scripts/adaptive_fetch.py", "scripts/reference_format.py",
+                "scripts/book_stream.py"],
+          outputs=[f"{BIBLE}/books/*.json", f"{BIBLE}/fetch_manifest.json"],
+          remote=True),
+    Stage("bible-shards",
+          lambda books: with_books([PYTHON, "scripts/fetch_bible_data.py", "--reshard", "--shards",
+                                    "--compact", "--skip-aggregate"], books),
+          code=["scripts/fetch_bible_data.py", "scripts/reference_format.py"],
+          deps=["bible-fetch"],
+          items=bible_books, item_outputs=lambda b: [f"{BIBLE}/books/{b}/*.json"]),
+    Stage("bible-aggregate", lambda: [PYTHON, "scripts/aggregate_bible_data.py"],
+          code=["scripts/aggregate_bible_data.py", "scripts/reference_format.py", "scripts/book_stream.py"],
+          inputs=[f"{BIBLE}/books/*.json", f"{KJV}/Books.json"],
+          outputs=[f"{BIBLE}/bible_stats.json", f"{BIBLE}/bible_books.json", f"{BIBLE}/rollups/*.json"],
+          # After the shards too: resharding re-encodes the book files it reads.
+          deps=["bible-fetch", "bible-shards"], env=["BIBLE_DATA_FORMAT"]),
+    Stage("catalog-shards", lambda: [PYTHON, "scripts/build_catalog_shards.py"],
+          code=["scripts/build_catalog_shards.py", "scripts/reference_format.py"],
+          inputs=["assets/data/sermons_catalog.json"],
+          outputs=["assets/data/catalog/*.json"]),
+    # Remote so it runs every time: it only requests new or changed ids, and
+    # retries ones the API didn't have yet.
+    Stage("transcripts", lambda: [PYTHON, "scripts/sync_transcripts.py"],
+          code=["scripts/sync_transcripts.py", "scripts/adaptive_fetch.py"],
+          inputs=["assets/data/sermons_catalog.json"],
+          outputs=["assets/data/transcripts/*.json"],
+          remote=True),
+    Stage("trends", lambda: [PYTHON, "scripts/build_trends.py"],
+          code=["scripts/build_trends.py", "scripts/reference_format.py",
+                "scripts/aggregate_bible_data.py", "scripts/kjv_pack.py"],
+          inputs=[f"{KJV}/*.json", f"{BIBLE}/books/*.json", f"{BIBLE}/bible_stats.json",
+                  "assets/data/sermons_catalog.json", "_data/analytics/sermons.json"],
+          outputs=[f"{BIBLE}/trends/*.json"] + [f"_data/analytics/{name}.json" for name in
+                                                ("summary", "timeline", "time_grouping", "testament_counts")],
+          # bible_stats.json is read to check no book file is missing.
+          deps=["metadata", "bible-fetch", "bible-shards", "bible-aggregate", "kjv-pack"]),
+    Stage("related", lambda: [PYTHON, "scripts/build_related_passages.py"],
+          code=["scripts/build_related_passages.py", "scripts/reference_format.py",
+                "scripts/aggregate_bible_data.py", "scripts/kjv_pack.py"],
+          inputs=[f"{KJV}/*.json", f"{BIBLE}/books/*.json"],
+          outputs=[f"{BIBLE}/related/*.json"],
+          deps=["bible-fetch", "bible-shards", "kjv-pack"]),
+    Stage("search-index", lambda: [PYTHON, "scripts/build_search_index.py"],
+          code=["scripts/build_search_index.py", "scripts/reference_format.py",
+                "scripts/aggregate_bible_data.py", "scripts/kjv_pack.py"],
+          inputs=[f"{KJV}/*.json", f"{BIBLE}/books/*.json", "assets/data/sermons_catalog.json"],
+          outputs=["assets/data/search/**/*"],
+          deps=["bible-fetch", "bible-shards", "kjv-pack"]),
+    Stage("asset-manifest", lambda: [PYTHON, "scripts/build_asset_manifest.py"],
+          code=["scripts/build_asset_manifest.py"],
+          inputs=["assets/data/**/*"],
+          outputs=["assets/data-manifest.json"],
+          deps=["bible-fetch", "bible-shards", "bible-aggregate", "catalog-shards", "transcripts",
+                "trends", "related", "search-index", "overlays"]),
+    Stage("kjv-pack", lambda: [PYTHON, "scripts/kjv_pack.py"],
+          code=["scripts/kjv_pack.py"],
+          inputs=[f"{KJV}/*.json"],
+          outputs=[".cache/kjv.pack"]),
+    Stage("overlays",
+          lambda books: with_books([PYTHON, "scripts/generate_bible_overlays.py", "--mode", "both"], books),
+          code=["scripts/generate_bible_overlays.py", "scripts/llm_cache.py", "scripts/kjv_pack.py"],
+          deps=["kjv-pack"], env=["OVERLAY_MODEL"], requires_env=["OPENROUTER_API_KEY"],
+          items=kjv_books,
+          item_outputs=lambda b: [f"assets/data/bible-headings/{b}.json", f"assets/data/bible-red-letter/{b}.json"]),
+]
+STAGES_BY_NAME = {s.name: s for s in STAGES}
+
+
+class BuildState:
+    """Stage keys and output hashes from the last successful runs, plus a stat cache of file hashes."""
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        self.files = data.get("files", {})
+        self.stages = data.get("stages", {})
+
+    def file_hash(self, rel):
+        """sha256 of a repo file, reusing the stored hash while size and mtime are unchanged."""
+        path = os.path.join(ROOT, rel)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        cached = self.files.get(rel)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self.files[rel] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def hashes(self, patterns):
+        return {p: self.file_hash(p) for p in expand(patterns)}
+
+    def save(self):
+        # Forget stat entries for files that no longer exist.
+        self.files = {p: v for p, v in self.files.items() if os.path.exists(os.path.join(ROOT, p))}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files, "stages": self.stages}, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+
+def stage_key(state, stage, argv, input_patterns):
+    h = hashlib.sha256()
+    h.update(json.dumps([os.path.basename(argv[0])] + argv[1:]).encode())
+    for name in stage.env:
+        h.update(f"{name}={os.environ.get(name, '')}".encode())
+    for path, digest in sorted({**state.hashes(stage.code), **state.hashes(input_patterns)}.items()):
+        h.update(f"{path}:{digest}\n".encode())
+    return h.hexdigest()
+
+
+def is_fresh(state, record_name, key, output_patterns):
+    record = state.stages.get(record_name)
+    return bool(record) and record["key"] == key and record["outputs"] == state.hashes(output_patterns)
+
+
+def plan(state, stage, force):
+    """(dirty items or None for a whole stage, {record name: key}) for one stage."""
+    if stage.items:
+        dirty, keys = [], {}
+        for item, patterns in stage.items().items():
+            record = f"{stage.name}:{item}"
+            keys[record] = stage_key(state, stage, stage.argv([item]), patterns)
+            if force or not is_fresh(state, record, keys[record], stage.item_outputs(item)):
+                dirty.append(item)
+        return dirty, keys
+    key = stage_key(state, stage, stage.argv(), stage.inputs)
+    fresh = not force and not stage.remote and is_fresh(state, stage.name, key, stage.outputs)
+    return (None if not fresh else []), {stage.name: key}
+
+
+def run_command(stage, argv, profile=False):
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOG_DIR, f"{stage.name}.log")
+    # Only the kjv-pack stage (which builds it directly) writes .cache/kjv.pack;
+    # a stage finding it missing or stale fails instead of rebuilding it
+    # alongside the others.
+    env = dict(os.environ, PYTHONUNBUFFERED="1", METRICS_NAME=stage.name, KJV_PACK_READONLY="1")
+    if profile:
+        env["METRICS_PROFILE"] = "1"
+    started = time.monotonic()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.run(argv, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT, env=env)
+    return proc.returncode, time.monotonic() - started, log_path
+
+
+def select(names):
+    """The named stages plus everything upstream of them, in declaration order."""
+    wanted = set()
+
+    def visit(name):
+        if name not in wanted:
+            wanted.add(name)
+            for dep in STAGES_BY_NAME[name].deps:
+                visit(dep)
+    for name in names:
+        visit(name)
+    return [s for s in STAGES if s.name in wanted]
+
+
+def build(stages, state, offline=False, force=(), dry_run=False, jobs=4, verbose=False, profile=False):
+    """Run the stages, respecting deps; returns [(name, status, detail, seconds)]."""
+    report = {}
+    pending = {s.name: s for s in stages}
+    running = {}
+
+    def ready(stage):
+        return all(dep not in pending and dep not in running for dep in stage.deps)
+
+    def start(pool, stage):
+        failed_deps = [d for d in stage.deps if report.get(d, ("ok",))[0] in ("failed", "blocked")]
+        if failed_deps:
+            report[stage.name] = ("blocked", f"after {', '.join(failed_deps)} failed", 0.0)
+            return None
+        if stage.remote and offline:
+            report[stage.name] = ("offline", "", 0.0)
+            return None
+        missing = [v for v in stage.requires_env if not os.environ.get(v)]
+        if missing:
+            report[stage.name] = ("skipped", f"needs {', '.join(missing)}", 0.0)
+            return None
+        # Plans are made once deps have finished, so they hash the deps' fresh outputs.
+        dirty, keys = plan(state, stage, stage.name in force)
+        if dirty is not None and not dirty:
+            report[stage.name] = ("cached", f"{len(keys)} items" if stage.items else "", 0.0)
+            return None
+        argv = stage.argv(dirty) if stage.items else stage.argv()
+        detail = f"{len(dirty)}/{len(keys)} items" if stage.items else ""
+        if dry_run:
+            report[stage.name] = ("would run", detail, 0.0)
+            return None
+        print(f"[{stage.name}] {' '.join(os.path.relpath(a, ROOT) if a == PYTHON else a for a in argv[1:])}")
+        return pool.submit(run_command, stage, argv, profile), dirty, keys, detail
+
+    def finish(stage, dirty, keys, detail, result):
+        code, seconds, log_path = result
+        if verbose or code != 0:
+            with open(log_path, encoding="utf-8", errors="replace") as f:
+                lines = f.read().splitlines()
+            for line in lines if verbose else lines[-15:]:
+                print(f"  {stage.name} | {line}")
+        if code != 0:
+            report[stage.name] = ("failed", f"exit {code}, log {os.path.relpath(log_path, ROOT)}", seconds)
+            return
+        # Re-key after the run: a stage may rewrite its own inputs (resharding
+        # re-encodes the book files), and what's on disk now is what it produced.
+        if stage.items:
+            inputs = stage.items()
+            for item in dirty:
+                record = f"{stage.name}:{item}"
+                if item in inputs:
+                    state.stages[record] = {"key": stage_key(state, stage, stage.argv([item]), inputs[item]),
+                                            "outputs": state.hashes(stage.item_outputs(item))}
+        elif not stage.remote:
+            state.stages[stage.name] = {"key": stage_key(state, stage, stage.argv(), stage.inputs),
+                                        "outputs": state.hashes(stage.outputs)}
+        report[stage.name] = ("ran", detail, seconds)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while pending or running:
+            for name in [n for n, s in pending.items() if ready(s)]:
+                stage = pending.pop(name)
+                started = start(pool, stage)
+                if started:
+                    running[name] = (stage,) + started[1:] + (started[0],)
+            if not running:
+                if pending and not any(ready(s) for s in pending.values()):
+                    raise RuntimeError(f"dependency cycle among {', '.join(pending)}")
+                continue
+            done, _ = wait([r[-1] for r in running.values()], return_when=FIRST_COMPLETED)
+            for name in [n for n, r in running.items() if r[-1] in done]:
+                stage, dirty, keys, detail, future = running.pop(name)
+                finish(stage, dirty, keys, detail, future.result())
+            if not dry_run:
+                state.save()
+    for name, (status, _, seconds) in report.items():
+        metrics.count(f"stages.{status.replace(' ', '_')}")
+        if status == "ran":
+            metrics.observe("stage", seconds, key=name)
+    return [(s.name,) + report[s.name] for s in stages]
+
+
+def print_report(rows, wall):
+    print("\nStage            Status      Time    Detail")
+    for name, status, detail, seconds in rows:
+        print(f"{name:<16} {status:<10} {seconds:>6.1f}s  {detail}")
+    counts = {}
+    for _, status, _, _ in rows:
+        counts[status] = counts.get(status, 0) + 1
+    print(f"Total {wall:.1f}s: " + ", ".join(f"{n} {s}" for s, n in counts.items()))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Build the site's generated data (see module docstring)")
+    p.add_argument("stages", nargs="*", help=f"Stages to build with their deps (default: all): "
+                                             f"{', '.join(STAGES_BY_NAME)}")
+    p.add_argument("--offline", action="store_true", help="Skip stages that call the API")
+    p.add_argument("--force", action="store_true", help="Rerun the named stages (or all) regardless of the cache")
+    p.add_argument("--dry-run", action="store_true", help="Only report what would run")
+    p.add_argument("--jobs", type=int, default=int(os.environ.get("BUILD_JOBS", "4")),
+                   help="Stages run in parallel")
+    p.add_argument("-v", "--verbose", action="store_true", help="Print each stage's full output")
+    p.add_argument("--profile", action="store_true",
+                   help="Run stages under cProfile (top functions land in their metrics file, "
+                        "full stats in .cache/profiles/)")
+    args = p.parse_args()
+
+    unknown = [n for n in args.stages if n not in STAGES_BY_NAME]
+    if unknown:
+        sys.exit(f"Unknown stage(s): {', '.join(unknown)}")
+    stages = select(args.stages) if args.stages else STAGES
+    force = set(args.stages or STAGES_BY_NAME) if args.force else set()
+
+    started = time.monotonic()
+    state = BuildState()
+    rows = build(stages, state, offline=args.offline, force=force, dry_run=args.dry_run,
+                 jobs=args.jobs, verbose=args.verbose, profile=args.profile)
+    print_report(rows, time.monotonic() - started)
+    if any(status in ("failed", "blocked") for _, status, _, _ in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    with metrics.run("build"):
+        main()
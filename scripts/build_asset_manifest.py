@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Write assets/data-manifest.json: every static data file under assets/data/
+mapped to a short hash of its contents.
+
+    {"version": 1, "hash": "<hash of the whole listing>",
+     "files": {"bible/books/Romans.json": "3f2a9c01d4e7", ...}}
+
+The service worker (/sw.js) serves data files cache-first under their hash
+and re-downloads a file only when its hash here changes, so returning readers
+load books, chapters, the KJV text and the overlays with no network round
+trips, and a daily refresh costs exactly the files it changed. Run it last,
+after everything else that writes to assets/data/ (build.py orders it so).
+"""
+
+import os
+import hashlib
+
+import metrics
+from reference_format import write_json
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.path.join(ROOT, "assets", "data")
+MANIFEST_PATH = os.path.join(ROOT, "assets", "data-manifest.json")
+HASH_LENGTH = 12
+# Work files the pipeline leaves behind that the site never serves.
+SKIP_SUFFIXES = (".tmp", ".journal.jsonl")
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:HASH_LENGTH]
+
+
+def served_files(data_dir=DATA_DIR):
+    """Repo files Jekyll copies into the site: no dot/underscore names, no work files."""
+    for dirpath, dirnames, filenames in os.walk(data_dir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith((".", "_")))
+        for name in sorted(filenames):
+            if name.startswith((".", "_")) or name.endswith(SKIP_SUFFIXES):
+                continue
+            yield os.path.join(dirpath, name)
+
+
+def build_manifest(data_dir=DATA_DIR, manifest_path=MANIFEST_PATH):
+    files = {os.path.relpath(p, data_dir).replace(os.sep, "/"): file_hash(p)
+             for p in served_files(data_dir)}
+    listing = "".join(f"{k}:{v}\n" for k, v in sorted(files.items()))
+    manifest = {
+        "version": 1,
+        "hash": hashlib.sha256(listing.encode("utf-8")).hexdigest()[:HASH_LENGTH],
+        "files": dict(sorted(files.items())),
+    }
+    changed = write_json(manifest_path, manifest, compact=True)
+    print(f"Asset manifest: {len(files)} files, hash {manifest['hash']} "
+          f"({'updated' if changed else 'unchanged'})")
+    return manifest
+
+
+if __name__ == "__main__":
+    with metrics.run("build_asset_manifest"):
+        build_manifest()
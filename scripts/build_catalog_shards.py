@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Split assets/data/sermons_catalog.json into small files the transcript pages
+can fetch on their own:
+
+    assets/data/catalog/{video_id}.json   one catalog entry, unchanged (transcript page)
+    assets/data/catalog/index.json        slim newest-first listing (transcripts list page)
+
+The full catalog is ~1.1 MB and growing; opening one transcript only needs its
+own entry (~1.5 KB), and the list page only needs what it renders and filters
+on. The catalog itself is still built by sermon-library's
+build_sermon_catalog.py and committed here; rerun this after it changes (the
+Build Catalog Shards workflow does that on push).
+"""
+
+import os
+import sys
+import json
+import glob
+
+import metrics
+from reference_format import write_json
+
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), "..", "assets", "data", "sermons_catalog.json")
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "..", "assets", "data", "catalog")
+INDEX_NAME = "index.json"
+
+
+def listing_entry(entry):
+    """Only what transcripts-page.js renders and filters on."""
+    notes = entry.get("notes") or {}
+    item = {
+        "video_id": entry["video_id"],
+        "title": entry.get("title", ""),
+        "date": entry.get("date", ""),
+        "description": entry.get("description", ""),
+    }
+    if notes.get("themes"):
+        item["themes"] = notes["themes"]
+    return item
+
+
+def build_shards(catalog_path=CATALOG_PATH, output_dir=OUTPUT_DIR):
+    with open(catalog_path, encoding="utf-8") as f:
+        catalog = json.load(f)
+    os.makedirs(output_dir, exist_ok=True)
+
+    written, keep = 0, {INDEX_NAME}
+    for entry in catalog:
+        video_id = entry.get("video_id")
+        if not video_id:
+            continue
+        name = f"{video_id}.json"
+        keep.add(name)
+        if write_json(os.path.join(output_dir, name), entry, compact=True):
+            written += 1
+
+    index = [listing_entry(e) for e in catalog if e.get("video_id")]
+    index_changed = write_json(os.path.join(output_dir, INDEX_NAME), index, compact=True)
+
+    removed = 0
+    for path in glob.glob(os.path.join(output_dir, "*.json")):
+        if os.path.basename(path) not in keep:
+            os.remove(path)
+            removed += 1
+
+    print(f"Catalog: {len(index)} sermons, {written} detail files written, "
+          f"{removed} stale removed, index {'updated' if index_changed else 'unchanged'}")
+    return len(index)
+
+
+if __name__ == "__main__":
+    with metrics.run("build_catalog_shards"):
+        if not build_shards():
+            sys.exit("Error: catalog is empty")
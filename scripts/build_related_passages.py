@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Precompute "preached together with": for every chapter, the chapters most
+often cited in the same sermons.
+
+Each sermon is the set of KJV chapters its references touch. Stacking those
+sets gives a sermon x chapter incidence matrix X, and C = X.T @ X counts, for
+every pair of chapters, the sermons citing both (the diagonal is each
+chapter's own sermon count). Pairs are weighted by normalized PMI,
+
+    npmi(i, j) = log(p(i, j) / (p(i) p(j))) / -log(p(i, j))
+
+so a pair scores by how much more often it shares a sermon than two chapters
+that popular would by chance (1 = always together, 0 = independent). NPMI
+alone ranks a pair that met in two sermons level with one that met in forty,
+so it's damped by shared / (shared + DAMPING). The top TOP_K neighbours
+sharing at least MIN_SHARED sermons are written to
+
+    related/{Book}.json   {"book": "Romans",
+                           "chapters": {"8": [["Ephesians", 2, shared sermons, score], ...]}}
+
+next to the rollups, one small file per book, so the viewer shows a chapter's
+neighbours from a single fetch.
+
+Rebuilds are incremental: .cache/related/ keeps each book file's per-sermon
+chapters (keyed by content hash) and the last count matrix, so a run re-reads
+only changed book files and updates C with the outer products of the sermons
+whose chapter sets changed, instead of recounting everything.
+
+    python scripts/build_related_passages.py          # incremental
+    python scripts/build_related_passages.py --full   # recount from scratch
+"""
+
+import os
+import sys
+import glob
+import json
+import hashlib
+import argparse
+from collections import defaultdict
+
+import numpy as np
+
+import metrics
+from reference_format import load_book, write_json
+from aggregate_bible_data import display_name
+from kjv_pack import open_kjv
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+OUTPUT_DIR = os.path.join(ROOT, os.environ.get("OUTPUT_DIR", "assets/data/bible"))
+STATE_DIR = os.path.join(ROOT, ".cache", "related")
+
+TOP_K = 12
+MIN_SHARED = 2
+DAMPING = 3
+# Past this share of changed sermons a full recount is as cheap as the update.
+INCREMENTAL_LIMIT = 0.25
+
+
+def chapter_space(pack):
+    """(book names, {(name, chapter): id}) over the whole KJV, in canonical order."""
+    books, ids = [], {}
+    for slug in pack.books():
+        name = pack.book_name(slug)
+        books.append(name)
+        for chapter in range(1, pack.chapter_count(slug) + 1):
+            ids[(name, chapter)] = len(ids)
+    return books, ids
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def book_sermons(path, ids):
+    """{video_id: sorted chapter ids} for one book file."""
+    name = display_name(os.path.basename(path)[:-len(".json")])
+    data = load_book(path)
+    sermons = defaultdict(set)
+    for key, refs in (data.get("chapters") or {}).items():
+        if not str(key).isdigit() or (name, int(key)) not in ids:
+            continue
+        chapter = ids[(name, int(key))]
+        for ref in refs:
+            if ref.get("video_id"):
+                sermons[ref["video_id"]].add(chapter)
+    return {vid: sorted(chs) for vid, chs in sermons.items()}
+
+
+def load_state(n_chapters):
+    try:
+        with open(os.path.join(STATE_DIR, "state.json"), encoding="utf-8") as f:
+            state = json.load(f)
+        counts = np.load(os.path.join(STATE_DIR, "counts.npy"))
+    except (OSError, ValueError):
+        return {"books": {}, "sermons": {}}, None
+    if state.get("chapters") != n_chapters or counts.shape != (n_chapters, n_chapters):
+        return {"books": {}, "sermons": {}}, None
+    return state, counts
+
+
+def save_state(state, counts):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    tmp = os.path.join(STATE_DIR, "counts.tmp.npy")
+    np.save(tmp, counts)
+    os.replace(tmp, os.path.join(STATE_DIR, "counts.npy"))
+    write_json(os.path.join(STATE_DIR, "state.json"), state, compact=True)
+
+
+def incidence(sets, n_chapters):
+    """Sermon x chapter 0/1 matrix for a list of chapter-id lists."""
+    x = np.zeros((len(sets), n_chapters), dtype=np.float64)
+    for row, chapters in enumerate(sets):
+        x[row, chapters] = 1.0
+    return x
+
+
+def cooccurrence(x):
+    # Float matmul goes through BLAS; the counts stay exact far beyond any
+    # realistic number of sermons.
+    return np.rint(x.T @ x).astype(np.int32)
+
+
+def related_scores(counts, n_sermons):
+    """Damped normalized PMI for every chapter pair; -inf where the pair doesn't qualify."""
+    c = counts.astype(np.float64)
+    singles = np.diag(c)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p_ij = c / n_sermons
+        pmi = np.log(p_ij / np.outer(singles / n_sermons, singles / n_sermons))
+        score = np.where(p_ij < 1.0, pmi / -np.log(p_ij), 1.0) * (c / (c + DAMPING))
+    score[(counts < MIN_SHARED) | np.eye(len(c), dtype=bool)] = -np.inf
+    return score
+
+
+def top_neighbours(score, counts):
+    """{chapter id: [(neighbour id, shared, score)]}, best first."""
+    k = min(TOP_K, score.shape[1] - 1)
+    part = np.argpartition(-score, k, axis=1)[:, :k]
+    out = {}
+    for i in np.flatnonzero(np.isfinite(score).any(axis=1)):
+        cand = [j for j in part[i] if np.isfinite(score[i, j])]
+        # Ties break on shared sermons, then canonical order, so reruns are byte-identical.
+        cand.sort(key=lambda j: (-round(float(score[i, j]), 3), -int(counts[i, j]), j))
+        out[int(i)] = [(int(j), int(counts[i, j]), round(float(score[i, j]), 3)) for j in cand]
+    return out
+
+
+def build(full=False, output_dir=OUTPUT_DIR):
+    books, ids = chapter_space(open_kjv())
+    n = len(ids)
+    names = [None] * n
+    for (name, chapter), i in ids.items():
+        names[i] = (name, chapter)
+
+    state, counts = (({"books": {}, "sermons": {}}, None) if full else load_state(n))
+
+    # Per-book sermon -> chapters, re-parsing only book files whose bytes changed.
+    paths = sorted(glob.glob(os.path.join(output_dir, "books", "*.json")))
+    if not paths:
+        print(f"No book files in {os.path.join(output_dir, 'books')}; nothing to do")
+        return False
+    book_state, reparsed = {}, 0
+    for path in paths:
+        base = os.path.basename(path)
+        digest = file_hash(path)
+        cached = state["books"].get(base)
+        if cached and cached["hash"] == digest:
+            book_state[base] = cached
+        else:
+            book_state[base] = {"hash": digest, "sermons": book_sermons(path, ids)}
+            reparsed += 1
+
+    sermons = defaultdict(set)
+    for entry in book_state.values():
+        for vid, chapters in entry["sermons"].items():
+            sermons[vid].update(chapters)
+    sermons = {vid: sorted(chs) for vid, chs in sermons.items()}
+
+    old = state["sermons"]
+    changed = [vid for vid in set(old) | set(sermons) if old.get(vid) != sermons.get(vid)]
+    if counts is not None and len(changed) <= INCREMENTAL_LIMIT * max(len(sermons), 1):
+        mode = f"updated for {len(changed)} changed sermons"
+        if changed:
+            counts = (counts
+                      + cooccurrence(incidence([sermons.get(v, []) for v in changed], n))
+                      - cooccurrence(incidence([old.get(v, []) for v in changed], n)))
+    else:
+        mode = f"counted from {len(sermons)} sermons"
+        counts = cooccurrence(incidence(list(sermons.values()), n))
+
+    neighbours = top_neighbours(related_scores(counts, max(len(sermons), 1)), counts)
+
+    related_dir = os.path.join(output_dir, "related")
+    os.makedirs(related_dir, exist_ok=True)
+    by_book = defaultdict(dict)
+    for i, row in neighbours.items():
+        name, chapter = names[i]
+        by_book[name][str(chapter)] = [[names[j][0], names[j][1], shared, score] for j, shared, score in row]
+    keep, written = set(), 0
+    for name in books:
+        if name not in by_book:
+            continue
+        filename = f"{name.replace(' ', '_')}.json"
+        keep.add(filename)
+        written += write_json(os.path.join(related_dir, filename),
+                              {"book": name, "chapters": by_book[name]}, compact=True)
+    for path in glob.glob(os.path.join(related_dir, "*.json")):
+        if os.path.basename(path) not in keep:
+            os.remove(path)
+
+    save_state({"chapters": n, "books": book_state, "sermons": sermons}, counts)
+    print(f"Related passages: co-citation {mode} ({reparsed}/{len(paths)} book files re-read); "
+          f"{len(neighbours)} chapters with neighbours across {len(keep)} books, {written} files rewritten")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute chapters preached together, per book")
+    parser.add_argument("--full", action="store_true", help="ignore the cached counts and recount every sermon")
+    args = parser.parse_args()
+    if not build(full=args.full):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    with metrics.run("build_related_passages"):
+        main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Build a static inverted index so the search page can answer exact-phrase and
+keyword queries from a few small files instead of a POST to the API.
+
+Two kinds of document are indexed:
+
+    verses     every KJV verse (Bible-kjv-master), doc id = position in
+               canonical order, so (book, chapter, verse) is derived from the
+               per-chapter verse counts in meta.json
+    contexts   every sermon reference in bible/books/*.json: its `context`
+               and `point_summary`, pointing at (video_id, start_time)
+
+Layout of assets/data/search/ (all minified JSON):
+
+    meta.json             version, doc counts, stopwords, shard prefixes,
+                          chunk size, books [[name, [verses per chapter]]]
+    shards/{prefix}.json  {term: [verse ids, context ids]}, ids delta-encoded
+    verses/{n}.json       verse texts for ids n*CHUNK .. n*CHUNK+CHUNK-1
+    contexts/{n}.json     [[video, start_time, book, chapter, verse, context, summary]]
+                          (verse is 0 when unknown, or a "1-5" string for ranges)
+    videos.json           [[video_id, title, date]]; `video` above indexes this
+
+Terms are lowercase [a-z0-9]+ runs minus stopwords (the client tokenizes the
+same way). Shards start at two-character prefixes and split one character
+deeper while they're over SHARD_TARGET bytes, so a query fetches a few KB per
+term; the client picks the longest listed prefix of each term. Phrase matches
+are confirmed client-side against the chunk text, which it needs for display
+anyway.
+
+    python scripts/build_search_index.py
+"""
+
+import os
+import re
+import glob
+import json
+import shutil
+from collections import defaultdict
+
+import metrics
+from reference_format import load_book, write_json
+from aggregate_bible_data import display_name
+from kjv_pack import open_kjv
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+BOOKS_DIR = os.path.join(ROOT, os.environ.get("OUTPUT_DIR", "assets/data/bible"), "books")
+CATALOG_PATH = os.path.join(ROOT, "assets", "data", "sermons_catalog.json")
+INDEX_DIR = os.path.join(ROOT, "assets", "data", "search")
+
+VERSION = 1
+CHUNK = 128
+SHARD_TARGET = 48 * 1024
+MIN_PREFIX, MAX_PREFIX = 2, 4
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be because been but by came come
+did do for from had has hath have he her him his how i if in into is it its
+let me my no not now o of on or our out said saith say shall she so than that
+the thee their them then there these they thou thus thy to unto up upon us was
+we were what when which who will with would ye yea you your
+""".split())
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def index_terms(text):
+    return {t for t in tokenize(text) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())}
+
+
+def delta_encode(ids):
+    out, prev = [], 0
+    for i in ids:
+        out.append(i - prev)
+        prev = i
+    return out
+
+
+def build_verses(pack, postings):
+    """Index every KJV verse; returns (books meta, texts)."""
+    books, texts = [], []
+    for slug in pack.books():
+        counts = []
+        for chapter in range(1, pack.chapter_count(slug) + 1):
+            verses = pack.verses(slug, chapter)
+            counts.append(len(verses))
+            for _, text in verses:
+                doc = len(texts)
+                texts.append(text)
+                for term in index_terms(text):
+                    postings[term][0].append(doc)
+        books.append([pack.book_name(slug), counts])
+    return books, texts
+
+
+def load_titles():
+    """video_id -> (title, date) from the catalog, when it has the sermon."""
+    try:
+        with open(CATALOG_PATH, encoding="utf-8") as f:
+            return {e["video_id"]: (e.get("title", ""), e.get("date", "")) for e in json.load(f) if e.get("video_id")}
+    except FileNotFoundError:
+        return {}
+
+
+def build_contexts(book_names, postings):
+    """Index the sermon reference rows; returns (context rows, videos)."""
+    book_index = {name: i for i, name in enumerate(book_names)}
+    titles = load_titles()
+    videos, video_index = [], {}
+    rows = []
+    for path in sorted(glob.glob(os.path.join(BOOKS_DIR, "*.json"))):
+        name = display_name(os.path.basename(path)[:-len(".json")])
+        if name not in book_index:
+            continue
+        data = load_book(path)
+        chapters = data.get("chapters") or {}
+        for key in sorted((k for k in chapters if str(k).isdigit()), key=int):
+            for ref in chapters[key]:
+                video_id = ref.get("video_id")
+                context = (ref.get("context") or "").strip()
+                summary = (ref.get("point_summary") or "").strip()
+                if not video_id or not (context or summary):
+                    continue
+                if video_id not in video_index:
+                    title, date = titles.get(video_id, (ref.get("sermon_title") or "", ""))
+                    video_index[video_id] = len(videos)
+                    videos.append([video_id, title, date])
+                doc = len(rows)
+                verse = ref.get("verse")
+                # Usually an int; ranges ("1-5") are kept as the API wrote them.
+                verse = int(verse) if str(verse).isdigit() else (verse or 0)
+                rows.append([video_index[video_id], int(ref.get("start_time") or 0), book_index[name],
+                             int(key), verse, context, summary])
+                for term in index_terms(context + " " + summary):
+                    postings[term][1].append(doc)
+        del data
+    return rows, videos
+
+
+def encoded_size(term, lists):
+    return len(term) + 8 + sum(len(str(d)) + 1 for ids in lists for d in ids)
+
+
+def plan_shards(terms, sizes, prefix=""):
+    """{shard prefix: [terms]}: start at MIN_PREFIX characters, split deeper while over SHARD_TARGET."""
+    groups = defaultdict(list)
+    depth = max(len(prefix) + 1, MIN_PREFIX)
+    residual = []
+    for term in terms:
+        if len(term) < depth:
+            residual.append(term)
+        else:
+            groups[term[:depth]].append(term)
+    shards = {}
+    for term in residual:
+        # A term no longer than the prefix (the prefix itself, or a one-digit
+        # term at the top level) gets a shard named after it, which is the
+        # longest prefix the client will look for.
+        shards.setdefault(term, []).append(term)
+    for key, group in groups.items():
+        if depth < MAX_PREFIX and sum(sizes[t] for t in group) > SHARD_TARGET:
+            shards.update(plan_shards(group, sizes, key))
+        else:
+            shards[key] = group
+    return shards
+
+
+def write_chunks(directory, docs):
+    os.makedirs(directory, exist_ok=True)
+    for n in range(0, len(docs), CHUNK):
+        write_json(os.path.join(directory, f"{n // CHUNK}.json"), docs[n:n + CHUNK], compact=True)
+
+
+def build_index(output_dir=INDEX_DIR):
+    postings = defaultdict(lambda: ([], []))
+    books, verse_texts = build_verses(open_kjv(), postings)
+    rows, videos = build_contexts([b[0] for b in books], postings)
+
+    encoded = {t: [delta_encode(v), delta_encode(c)] for t, (v, c) in postings.items()}
+    sizes = {t: encoded_size(t, lists) for t, lists in encoded.items()}
+    shards = plan_shards(sorted(encoded), sizes)
+
+    # Rebuild from scratch: shard prefixes move as the data grows.
+    tmp_dir = output_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_dir, "shards"))
+    for prefix, terms in shards.items():
+        write_json(os.path.join(tmp_dir, "shards", f"{prefix}.json"),
+                   {t: encoded[t] for t in terms}, compact=True)
+    write_chunks(os.path.join(tmp_dir, "verses"), verse_texts)
+    write_chunks(os.path.join(tmp_dir, "contexts"), rows)
+    write_json(os.path.join(tmp_dir, "videos.json"), videos, compact=True)
+    write_json(os.path.join(tmp_dir, "meta.json"), {
+        "version": VERSION,
+        "chunk": CHUNK,
+        "verses": len(verse_texts),
+        "contexts": len(rows),
+        "stopwords": sorted(STOPWORDS),
+        "shards": sorted(shards),
+        "books": books,
+    }, compact=True)
+    # Files are replaced one at a time, meta.json last and stale files only
+    # after it, so meta.json never lists a shard that isn't written yet or is
+    # already gone. A query racing the sync can still pair old shards with new
+    # chunks. Files whose bytes didn't change keep their git history quiet.
+    _sync_dir(tmp_dir, output_dir, last="meta.json")
+
+    largest = max(sum(sizes[t] for t in terms) for terms in shards.values())
+    print(f"Search index: {len(encoded)} terms in {len(shards)} shards (largest ~{largest // 1024} KB), "
+          f"{len(verse_texts)} verses, {len(rows)} sermon contexts from {len(videos)} sermons")
+
+
+def _sync_dir(src, dst, last=None):
+    """Make dst match src, rewriting only files whose bytes differ.
+
+    `last` (a path relative to src) is moved after every other file, and
+    files dst has but src doesn't are removed only after that.
+    """
+    wanted = sorted(os.path.normpath(os.path.relpath(os.path.join(d, n), src))
+                    for d, _, names in os.walk(src) for n in names)
+    if last in wanted:
+        wanted.remove(last)
+        wanted.append(last)
+    for rel in wanted:
+        with open(os.path.join(src, rel), "rb") as f:
+            payload = f.read()
+        target = os.path.join(dst, rel)
+        try:
+            with open(target, "rb") as f:
+                if f.read() == payload:
+                    continue
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(os.path.join(src, rel), target)
+    wanted = set(wanted)
+    for dirpath, _, filenames in os.walk(dst):
+        rel = os.path.relpath(dirpath, dst)
+        for name in filenames:
+            if os.path.normpath(os.path.join(rel, name)) not in wanted:
+                os.remove(os.path.join(dirpath, name))
+    shutil.rmtree(src)
+
+
+if __name__ == "__main__":
+    with metrics.run("build_search_index"):
+        build_index()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Citation trends over time, computed in vectorized passes over every
+reference row.
+
+All rows from bible/books/*.json are loaded into parallel NumPy columns
+(book, chapter, verse, sermon, start_time). The catalog supplies each
+sermon's date and length, so every row gets a month. The matrices below are
+then single np.bincount passes over packed (row, column) indices:
+
+    trends/summary.json     month axis; dated sermons, references, verse-level
+                            references and references per sermon for each month; a
+                            book x month reference matrix; rolling
+                            ROLLING_MONTHS-month totals; the books whose
+                            share of citations rose or fell most, last
+                            window against the one before; where in a
+                            sermon references fall (by tenth of its length)
+    trends/{Book}.json      chapter x quarter reference matrix for the book
+    trends/sermons.json     per-sermon density: references, distinct
+                            chapters and books, references per hour
+
+It also regenerates the Jekyll data files that used to be hand-made and had
+gone stale: _data/analytics/summary.json, timeline.json, time_grouping.json
+and testament_counts.json, in their existing shapes. Those are left alone
+(and the run fails) when a book bible_stats.json counts references for has
+no book file on disk, so a partial checkout can't replace good totals.
+
+The columns for each book file are cached in .cache/trends/ under the file's
+content hash. When a few sermons arrive, only the book files they touched
+are re-parsed; recomputing every matrix from the cached columns takes
+milliseconds.
+
+    python scripts/build_trends.py
+"""
+
+import os
+import sys
+import json
+import glob
+import hashlib
+from datetime import datetime
+from collections import defaultdict
+
+import numpy as np
+
+import metrics
+from reference_format import chapter_columns, write_json
+from aggregate_bible_data import display_name, missing_books
+from kjv_pack import open_kjv
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+OUTPUT_DIR = os.path.join(ROOT, os.environ.get("OUTPUT_DIR", "assets/data/bible"))
+ANALYTICS_DIR = os.path.join(ROOT, os.environ.get("ANALYTICS_OUTPUT_DIR", "_data/analytics"))
+CATALOG_PATH = os.path.join(ROOT, "assets", "data", "sermons_catalog.json")
+STATE_DIR = os.path.join(ROOT, ".cache", "trends")
+
+ROLLING_MONTHS = 12
+TRENDING_N = 10
+# A book needs this many references across the two windows to be called rising or falling.
+TRENDING_MIN_REFS = 10
+TOP_BOOKS = 10
+POSITION_BINS = 10
+OLD_TESTAMENT_BOOKS = 39
+
+
+def load_json(path, default):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def sermon_dates():
+    """{video_id: (YYYYMMDD or "", duration seconds)} from the catalog, then sermons.json."""
+    sermons = {}
+    for entry in load_json(CATALOG_PATH, []):
+        if entry.get("video_id"):
+            sermons[entry["video_id"]] = (str(entry.get("date") or ""), float(entry.get("duration") or 0))
+    for video_id, entry in load_json(os.path.join(ANALYTICS_DIR, "sermons.json"), {}).items():
+        date = "".join(c for c in str(entry.get("publish_date") or "") if c.isdigit())[:8]
+        if not sermons.get(video_id, ("",))[0] and len(date) == 8:
+            sermons[video_id] = (date, sermons.get(video_id, ("", 0.0))[1])
+    return sermons
+
+
+def month_label(m):
+    return f"{m // 12}-{m % 12 + 1:02d}"
+
+
+def quarter_label(q):
+    return f"{q // 4}Q{q % 4 + 1}"
+
+
+def first_verse(verse):
+    """Verse number of a row (the start of a "1-5" range), 0 when there is none."""
+    digits = str(verse or "").split("-")[0].strip()
+    return int(digits) if digits.isdigit() else 0
+
+
+def parse_book(path):
+    """(videos, columns) for one book file; columns["sermon"] indexes `videos`."""
+    with metrics.timer("json.read"), open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    videos, index = [], {}
+    chapter, verse, start, sermon = [], [], [], []
+    for key, (video_ids, verses, starts) in chapter_columns(data).items():
+        ch = int(key) if str(key).isdigit() else 0
+        for video_id, v, t in zip(video_ids, verses, starts):
+            if not video_id:
+                continue
+            if video_id not in index:
+                index[video_id] = len(videos)
+                videos.append(video_id)
+            sermon.append(index[video_id])
+            chapter.append(ch)
+            verse.append(first_verse(v))
+            start.append(t)
+    return videos, {
+        "chapter": np.array(chapter, dtype=np.int16),
+        "verse": np.array(verse, dtype=np.int16),
+        "start": np.array(start, dtype=np.float32),
+        "sermon": np.array(sermon, dtype=np.int32),
+    }
+
+
+def load_columns(paths):
+    """[(book name, videos, columns)] per book file, re-parsing only files whose bytes changed."""
+    state = load_json(os.path.join(STATE_DIR, "state.json"), {})
+    next_state, books, reparsed = {}, [], 0
+    os.makedirs(STATE_DIR, exist_ok=True)
+    for path in paths:
+        base = os.path.basename(path)
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        cache_path = os.path.join(STATE_DIR, base[:-len(".json")] + ".npz")
+        cached = state.get(base)
+        columns = None
+        if cached and cached["hash"] == digest:
+            try:
+                with np.load(cache_path) as npz:
+                    columns = {k: npz[k] for k in npz.files}
+                videos = cached["videos"]
+            except (OSError, ValueError):
+                columns = None
+        if columns is None:
+            videos, columns = parse_book(path)
+            np.savez(cache_path, **columns)
+            reparsed += 1
+        next_state[base] = {"hash": digest, "videos": videos}
+        books.append((display_name(base[:-len(".json")]), videos, columns))
+    for stale in set(state) - set(next_state):
+        try:
+            os.remove(os.path.join(STATE_DIR, stale[:-len(".json")] + ".npz"))
+        except OSError:
+            pass
+    write_json(os.path.join(STATE_DIR, "state.json"), next_state, compact=True)
+    return books, reparsed
+
+
+def rolling_sum(x, window):
+    """Trailing `window` sums along the last axis (shorter at the start)."""
+    c = np.cumsum(x, axis=-1)
+    out = c.copy()
+    out[..., window:] = c[..., window:] - c[..., :-window]
+    return out
+
+
+def bincount2d(rows, cols, shape):
+    return np.bincount(rows.astype(np.int64) * shape[1] + cols, minlength=shape[0] * shape[1]).reshape(shape)
+
+
+def build(output_dir=OUTPUT_DIR):
+    paths = sorted(glob.glob(os.path.join(output_dir, "books", "*.json")))
+    if not paths:
+        print(f"No book files in {os.path.join(output_dir, 'books')}; leaving trends untouched")
+        return False
+
+    pack = open_kjv()
+    names = [pack.book_name(slug) for slug in pack.books()]
+    book_index = {name: i for i, name in enumerate(names)}
+    chapter_counts = np.array([pack.chapter_count(slug) for slug in pack.books()], dtype=np.int64)
+    chapter_offsets = np.concatenate(([0], np.cumsum(chapter_counts)[:-1]))
+    n_chapters = int(chapter_counts.sum())
+
+    # Columnar rows: one entry per reference across every book file.
+    book_files, reparsed = load_columns(paths)
+    dates = sermon_dates()
+    videos = sorted(set(dates) | {v for _, vids, _ in book_files for v in vids})
+    video_index = {v: i for i, v in enumerate(videos)}
+    parts = defaultdict(list)
+    for name, vids, cols in book_files:
+        if name not in book_index:
+            continue
+        remap = np.array([video_index[v] for v in vids], dtype=np.int32)
+        parts["book"].append(np.full(len(cols["sermon"]), book_index[name], dtype=np.int16))
+        parts["sermon"].append(remap[cols["sermon"]])
+        for key in ("chapter", "verse", "start"):
+            parts[key].append(cols[key])
+    rows = {k: np.concatenate(v) for k, v in parts.items()}
+    book, chapter, verse, sermon, start = (rows["book"], rows["chapter"], rows["verse"],
+                                           rows["sermon"], rows["start"])
+    n_sermons, n_books = len(videos), len(names)
+
+    # Per-sermon lookups, then per-row months through them.
+    month_of = np.full(n_sermons, -1, dtype=np.int64)
+    duration = np.zeros(n_sermons, dtype=np.float64)
+    for i, video_id in enumerate(videos):
+        date, length = dates.get(video_id, ("", 0.0))
+        if len(date) >= 6 and date[:6].isdigit():
+            month_of[i] = int(date[:4]) * 12 + int(date[4:6]) - 1
+        duration[i] = length
+    dated = month_of >= 0
+    if not dated.any():
+        print("No dated sermons; leaving trends untouched")
+        return False
+    m0, m1 = int(month_of[dated].min()), int(month_of[dated].max())
+    n_months = m1 - m0 + 1
+    row_month = month_of[sermon]
+    known = row_month >= 0
+
+    # Book x month, sermons and references per month, rolling windows.
+    book_month = bincount2d(book[known], row_month[known] - m0, (n_books, n_months))
+    refs_month = book_month.sum(axis=0)
+    sermons_month = np.bincount(month_of[dated] - m0, minlength=n_months)
+    verse_month = np.bincount(row_month[known & (verse > 0)] - m0, minlength=n_months)
+    density = np.round(np.divide(refs_month, sermons_month, out=np.zeros(n_months), where=sermons_month > 0), 1)
+    window = ROLLING_MONTHS
+    roll_books = rolling_sum(book_month, window)
+    roll_refs = rolling_sum(refs_month, window)
+    roll_sermons = rolling_sum(sermons_month, window)
+
+    trending = {"window": window, "rising": [], "falling": []}
+    if n_months > window and roll_refs[-1] and roll_refs[-1 - window]:
+        recent = roll_books[:, -1] / roll_refs[-1]
+        prior = roll_books[:, -1 - window] / roll_refs[-1 - window]
+        change = recent - prior
+        eligible = (roll_books[:, -1] + roll_books[:, -1 - window]) >= TRENDING_MIN_REFS
+        order = np.argsort(-change, kind="stable")
+        entry = lambda i: [names[i], round(float(recent[i]) * 100, 2), round(float(prior[i]) * 100, 2)]
+        trending["rising"] = [entry(i) for i in order if eligible[i] and change[i] > 0][:TRENDING_N]
+        trending["falling"] = [entry(i) for i in order[::-1] if eligible[i] and change[i] < 0][:TRENDING_N]
+
+    # Where references fall within a sermon, by tenth of its length.
+    length = duration[sermon]
+    timed = length > 0
+    position = np.clip((start[timed] / length[timed] * POSITION_BINS).astype(np.int64), 0, POSITION_BINS - 1)
+    position_counts = np.bincount(position, minlength=POSITION_BINS)
+
+    # Chapter x quarter, per book.
+    valid_chapter = (chapter >= 1) & (chapter <= chapter_counts[book])
+    chapter_id = np.where(valid_chapter, chapter_offsets[book] + chapter - 1, -1)
+    q0, q1 = m0 // 3, m1 // 3
+    n_quarters = q1 - q0 + 1
+    in_quarter = valid_chapter & known
+    chapter_quarter = bincount2d(chapter_id[in_quarter], row_month[in_quarter] // 3 - q0, (n_chapters, n_quarters))
+
+    # Per-sermon density: distinct (sermon, chapter) and (sermon, book) pairs.
+    refs_sermon = np.bincount(sermon, minlength=n_sermons)
+    pairs = np.unique(sermon[valid_chapter].astype(np.int64) * n_chapters + chapter_id[valid_chapter])
+    chapters_sermon = np.bincount(pairs // n_chapters, minlength=n_sermons)
+    pairs = np.unique(sermon.astype(np.int64) * n_books + book)
+    books_sermon = np.bincount(pairs // n_books, minlength=n_sermons)
+    per_hour = np.divide(refs_sermon, duration / 3600, out=np.zeros(n_sermons), where=duration > 0)
+
+    trends_dir = os.path.join(output_dir, "trends")
+    os.makedirs(trends_dir, exist_ok=True)
+    cited = [i for i in range(n_books) if book_month[i].any()]
+    write_json(os.path.join(trends_dir, "summary.json"), {
+        "start": month_label(m0),
+        "months": n_months,
+        "sermons": sermons_month.tolist(),
+        "refs": refs_month.tolist(),
+        "verse_refs": verse_month.tolist(),
+        "refs_per_sermon": density.tolist(),
+        "books": {names[i]: book_month[i].tolist() for i in cited},
+        "rolling": {"window": window, "sermons": roll_sermons.tolist(), "refs": roll_refs.tolist()},
+        "trending": trending,
+        "position": [round(float(n) / max(int(position_counts.sum()), 1), 4) for n in position_counts],
+        "undated_refs": int((~known).sum()),
+    }, compact=True)
+
+    keep = {"summary.json", "sermons.json"}
+    for i in cited:
+        block = chapter_quarter[chapter_offsets[i]:chapter_offsets[i] + chapter_counts[i]]
+        chapters = {str(c + 1): block[c].tolist() for c in np.flatnonzero(block.any(axis=1))}
+        filename = f"{names[i].replace(' ', '_')}.json"
+        keep.add(filename)
+        write_json(os.path.join(trends_dir, filename), {
+            "book": names[i],
+            "start": quarter_label(q0),
+            "quarters": n_quarters,
+            "chapters": chapters,
+        }, compact=True)
+
+    # Newest first; undated sermons last.
+    order = sorted(range(n_sermons), key=lambda i: (dates.get(videos[i], ("",))[0], videos[i]), reverse=True)
+    write_json(os.path.join(trends_dir, "sermons.json"), {
+        "fields": ["video_id", "date", "refs", "chapters", "books", "refs_per_hour"],
+        "rows": [[videos[i], format_date(dates.get(videos[i], ("",))[0]), int(refs_sermon[i]),
+                  int(chapters_sermon[i]), int(books_sermon[i]),
+                  round(float(per_hour[i]), 1) if duration[i] > 0 else None]
+                 for i in order if refs_sermon[i] or dated[i]],
+    }, compact=True)
+    for path in glob.glob(os.path.join(trends_dir, "*.json")):
+        if os.path.basename(path) not in keep:
+            os.remove(path)
+
+    analytics = write_analytics(videos, dates, month_of, book, names, output_dir)
+    print(f"Trends: {len(book)} references from {int(dated.sum())} dated sermons, "
+          f"{month_label(m0)}..{month_label(m1)} ({reparsed}/{len(paths)} book files re-read); "
+          f"trends/ has {len(keep)} files")
+    return analytics
+
+
+def format_date(date):
+    return f"{date[:4]}-{date[4:6]}-{date[6:8]}" if len(date) == 8 else None
+
+
+def write_analytics(videos, dates, month_of, book, names, output_dir=OUTPUT_DIR):
+    """Regenerate the _data/analytics summaries from the same columns."""
+    missing = missing_books(output_dir)
+    if missing:
+        print(f"Book files missing for {', '.join(missing)} (listed in bible_stats.json); "
+              f"leaving {os.path.relpath(ANALYTICS_DIR, ROOT)} untouched")
+        return False
+    os.makedirs(ANALYTICS_DIR, exist_ok=True)
+    book_refs = np.bincount(book, minlength=len(names))
+    old = int(book_refs[:OLD_TESTAMENT_BOOKS].sum())
+    testaments = {"Old Testament": old, "New Testament": int(book_refs.sum()) - old}
+    top = sorted((i for i in range(len(names)) if book_refs[i]), key=lambda i: (-book_refs[i], i))[:TOP_BOOKS]
+    dated = sorted((dates[v][0], v) for v, m in zip(videos, month_of) if m >= 0)
+    summary_path = os.path.join(ANALYTICS_DIR, "summary.json")
+    previous = load_json(summary_path, {})
+    summary = {
+        "total_sermons": len(dates),
+        # Counted by the search backend, not derivable here; carried over.
+        "total_chunks": previous.get("total_chunks"),
+        "total_references": int(book_refs.sum()),
+        "top_books": {names[i]: int(book_refs[i]) for i in top},
+        "testament_distribution": testaments,
+        "data_through": format_date(dated[-1][0]) if dated else None,
+    }
+    # generated_at only moves when the numbers do, so reruns stay byte-identical.
+    unchanged = {k: v for k, v in previous.items() if k != "generated_at"} == summary
+    summary["generated_at"] = (previous.get("generated_at") if unchanged
+                               else datetime.now().isoformat(timespec="seconds"))
+    write_json(summary_path, summary)
+    write_json(os.path.join(ANALYTICS_DIR, "testament_counts.json"), testaments)
+
+    by_year, by_month, by_year_month = defaultdict(list), defaultdict(list), defaultdict(list)
+    for date, video_id in dated:
+        by_year[date[:4]].append(video_id)
+        by_month[str(int(date[4:6]))].append(video_id)
+        by_year_month[f"{date[:4]}-{date[4:6]}"].append(video_id)
+    write_json(os.path.join(ANALYTICS_DIR, "timeline.json"), {"years": dict(sorted(by_year.items()))})
+    write_json(os.path.join(ANALYTICS_DIR, "time_grouping.json"), {
+        "by_year": dict(sorted(by_year.items())),
+        "by_month": dict(sorted(by_month.items(), key=lambda kv: int(kv[0]))),
+        "by_year_month": dict(sorted(by_year_month.items())),
+    })
+    return True
+
+
+if __name__ == "__main__":
+    with metrics.run("build_trends"):
+        if not build():
+            sys.exit(1)
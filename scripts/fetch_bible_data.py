@@ -7,14 +7,49 @@ It creates:
 1. bible_stats.json - Overall statistics about Bible references
 2. bible_books.json - List of all Bible books with reference counts
 3. books/{book}.json - Detailed references for each book
+4. books/{book}/index.json + books/{book}/{chapter}.json - Optional per-chapter
+   shards (--shards) so the viewer can render a book's chapter grid and a
+   single chapter without downloading the whole multi-megabyte book file
+
+With --compact, book files and shards use the deduplicated, minified schema in
+reference_format.py instead of the API's pretty-printed rows.
+
+With --incremental, fetch_manifest.json records each endpoint's ETag /
+Last-Modified and a hash of its body. The next run sends conditional requests
+and skips parsing and rewriting anything the API reports (or hashes) as
+unchanged; files are only rewritten when their bytes actually differ.
+
+Book responses are streamed (--no-stream or FETCH_STREAMING=false buffers them
+whole instead): book_stream.py parses the body one reference row at a time as
+it downloads, the legacy book file is written through as the rows arrive, and
+each chapter's rows are spooled to a temp file from which the compact book
+file and the chapter shards are then assembled one chapter at a time. The
+fetch itself never holds a whole book, however large books grow, and
+assembling one book's files (in a worker thread) overlaps the downloads of
+the others. The aggregate pass that follows reads legacy book files a chapter
+at a time and compact ones (a fifth the size) whole; what it keeps grows with
+the number of distinct (chapter, sermon) pairs, not with book size.
 """
 
 import os
 import json
+import glob
+import shutil
+import time
+import hashlib
 import asyncio
+import argparse
+import tempfile
 import httpx
 from pathlib import Path
 
+import metrics
+from adaptive_fetch import AdaptiveFetcher
+from aggregate_bible_data import aggregate, api_book_names
+from book_stream import BookParser, PrettyWriter
+from reference_format import (COMPACT_SEPARATORS, AtomicFile, CompactTables, compact_header,
+                              encode_book, encode_rows, load_book, write_json)
+
 # Configuration
 API_BASE_URL = os.environ.get("API_URL", "https://sermon-search-api-8fok.onrender.com")
 OUTPUT_DIR = os.environ.get("OUTPUT_DIR", "assets/data/bible")
@@ -22,108 +57,428 @@ BOOKS_DIR = os.path.join(OUTPUT_DIR, "books")
 REQUEST_TIMEOUT = 60.0  # Seconds
 # The API runs on a free tier that cold-starts and rejects request bursts.
 # Firing all ~67 book requests at once made most of them fail, so the saved
-# data silently went stale/partial. Bound concurrency and retry transient
-# failures so a refresh reliably fetches every book.
+# data silently went stale/partial. AdaptiveFetcher starts at CONCURRENCY
+# in-flight requests and grows/shrinks the window (up to MAX_CONCURRENCY) from
+# observed latency and 429/5xx rates, retrying with jittered backoff.
 CONCURRENCY = int(os.environ.get("FETCH_CONCURRENCY", "5"))
+MAX_CONCURRENCY = int(os.environ.get("FETCH_MAX_CONCURRENCY", "16"))
 MAX_RETRIES = int(os.environ.get("FETCH_MAX_RETRIES", "4"))
-RETRY_BACKOFF = 3.0  # Seconds, multiplied by the attempt number (linear backoff)
+RETRY_BACKOFF = 2.0  # Seconds, base of the full-jitter exponential backoff
+WRITE_SHARDS = os.environ.get("WRITE_CHAPTER_SHARDS", "false").lower() == "true"
+COMPACT = os.environ.get("BIBLE_DATA_FORMAT", "legacy").lower() == "compact"
+INCREMENTAL = os.environ.get("FETCH_INCREMENTAL", "false").lower() == "true"
+STREAMING = os.environ.get("FETCH_STREAMING", "true").lower() == "true"
+# Bytes handed to the parser at a time; smaller network reads are pooled up to this.
+STREAM_CHUNK = 64 * 1024
+MANIFEST_PATH = os.path.join(OUTPUT_DIR, "fetch_manifest.json")
+
+# Returned by fetch_data when the endpoint hasn't changed since the last run.
+NOT_MODIFIED = object()
+NOT_FOUND = object()
+
+# endpoint -> {"etag", "last_modified", "sha256", "format"} from the last
+# successful save, and the entries fetched this run that aren't saved yet.
+MANIFEST = {}
+PENDING_MANIFEST = {}
 
 # Ensure output directories exist
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(BOOKS_DIR, exist_ok=True)
 
-async def fetch_data(client, endpoint):
-    """Fetch data from the API endpoint, retrying transient failures."""
+def output_format():
+    """Signature of the on-disk layout; a change invalidates recorded validators."""
+    return ("compact" if COMPACT else "legacy") + ("+shards" if WRITE_SHARDS else "")
+
+def load_manifest():
+    MANIFEST.clear()
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            MANIFEST.update(json.load(f).get("endpoints", {}))
+
+def save_manifest():
+    write_json(MANIFEST_PATH, {"endpoints": dict(sorted(MANIFEST.items()))})
+
+def record_saved(endpoint):
+    """Promote the validators fetched for `endpoint` once its output is on disk."""
+    entry = PENDING_MANIFEST.pop(endpoint, None)
+    if entry:
+        MANIFEST[endpoint] = entry
+
+def conditional_headers(endpoint, output_path):
+    """If-None-Match / If-Modified-Since for an endpoint whose output we still have.
+
+    Returns None when the previous run's record can't be trusted (not
+    incremental, format changed, output missing). An empty dict still means
+    "compare the body hash", for servers that send no validators.
+    """
+    entry = MANIFEST.get(endpoint)
+    if not INCREMENTAL or not entry or entry.get("format") != output_format():
+        return None
+    if not output_path or not os.path.exists(output_path):
+        return None
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+def make_fetcher(client):
+    return AdaptiveFetcher(client, initial=CONCURRENCY, max_window=MAX_CONCURRENCY,
+                           max_retries=MAX_RETRIES, base_backoff=RETRY_BACKOFF,
+                           timeout=REQUEST_TIMEOUT, on_request=metrics.record_http)
+
+async def fetch_data(fetcher, endpoint, output_path=None, stream=None):
+    """Fetch data from the API endpoint; the fetcher retries transient failures.
+
+    In incremental mode returns NOT_MODIFIED when the server answers 304 or
+    the body hashes the same as the saved copy's. With `stream` (a
+    BookStream) the body is parsed as it downloads and the stream itself is
+    returned, ready to commit().
+    """
     url = f"{API_BASE_URL}/{endpoint}"
     print(f"Fetching data from {url}")
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            response = await client.get(url, timeout=REQUEST_TIMEOUT)
-            response.raise_for_status()
-            return response.json()
-        except (httpx.RequestError, httpx.HTTPStatusError) as e:
-            detail = getattr(getattr(e, "response", None), "status_code", None) or str(e)
-            if attempt < MAX_RETRIES:
-                wait = RETRY_BACKOFF * attempt
-                print(f"Attempt {attempt}/{MAX_RETRIES} failed for {url} ({detail}); retrying in {wait:.0f}s")
-                await asyncio.sleep(wait)
-            else:
-                print(f"Giving up on {url} after {MAX_RETRIES} attempts ({detail})")
-                return None
-
-async def fetch_and_save_bible_stats():
-    """Fetch overall Bible reference statistics"""
-    async with httpx.AsyncClient() as client:
-        data = await fetch_data(client, "bible/stats")
-        if data:
-            output_path = os.path.join(OUTPUT_DIR, "bible_stats.json")
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            print(f"Saved Bible stats to {output_path}")
-            return True
-        return False
+    headers = conditional_headers(endpoint, output_path)
+    response = await fetcher.get(url, headers=headers, on_body=stream.consume if stream else None)
+    if response is None:
+        return None
+    if response.status_code == 304:
+        print(f"Not modified: {url}")
+        return NOT_MODIFIED
+    if response.status_code == 404:
+        return NOT_FOUND
+    if not response.is_success:
+        print(f"Failed to fetch {url} (HTTP {response.status_code})")
+        return None
+    digest = stream.digest if stream else hashlib.sha256(response.content).hexdigest()
+    PENDING_MANIFEST[endpoint] = {
+        "etag": response.headers.get("etag"),
+        "last_modified": response.headers.get("last-modified"),
+        "sha256": digest,
+        "format": output_format(),
+    }
+    if headers is not None and MANIFEST[endpoint].get("sha256") == digest:
+        record_saved(endpoint)
+        print(f"Unchanged: {url}")
+        return NOT_MODIFIED
+    if stream:
+        return stream
+    with metrics.timer("json.parse"):
+        return response.json()
 
-async def fetch_and_save_bible_books():
-    """Fetch list of all Bible books with reference counts"""
-    async with httpx.AsyncClient() as client:
-        data = await fetch_data(client, "bible/books")
-        if data:
-            output_path = os.path.join(OUTPUT_DIR, "bible_books.json")
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            print(f"Saved Bible books to {output_path}")
-            return data.get("books", [])
-        return []
-
-async def fetch_and_save_book_references(client, book):
-    """Fetch and save references for a specific book using a shared client."""
-    book_name = book["book"]
-    data = await fetch_data(client, f"bible/books/{book_name}")
-    if data:
-        output_path = os.path.join(BOOKS_DIR, f"{book_name}.json")
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        print(f"Saved {book_name} references to {output_path}")
-        return True
-    return False
+def is_chapter_key(key):
+    """True for real chapter keys; the API also groups unparsed refs under 'None'/'unknown'."""
+    return str(key).isdigit()
 
-async def fetch_all_book_references(books):
-    """Fetch references for all books with bounded concurrency."""
-    semaphore = asyncio.Semaphore(CONCURRENCY)
+def save_chapter_shards(book_name, data, chapters=None):
+    """Split a book payload into books/{book}/{chapter}.json plus a small index.json.
 
-    async with httpx.AsyncClient() as client:
-        async def worker(book):
-            async with semaphore:
-                return await fetch_and_save_book_references(client, book)
+    The index carries per-chapter reference counts so the chapter grid renders
+    without any reference rows; each shard holds one chapter's rows. Shards for
+    chapters that no longer have references are removed so the directory always
+    mirrors the latest book file.
+
+    `chapters` is an iterable of (chapter key, rows) and defaults to
+    data["chapters"]; a BookStream passes one that reads its spools a chapter
+    at a time.
+    """
+    shard_dir = os.path.join(BOOKS_DIR, book_name)
+    os.makedirs(shard_dir, exist_ok=True)
+    if chapters is None:
+        chapters = (data.get("chapters") or {}).items()
+
+    counts = {}
+    for chapter, refs in chapters:
+        if not is_chapter_key(chapter):
+            continue
+        counts[chapter] = len(refs)
+        shard_path = os.path.join(shard_dir, f"{chapter}.json")
+        if COMPACT:
+            shard = encode_book({**data, "chapters": {chapter: refs}}, chapter)
+        else:
+            shard = {"book": book_name, "chapter": int(chapter), "references": refs}
+        write_json(shard_path, shard, COMPACT)
+
+    index = {
+        "book": book_name,
+        "total_references": data.get("total_references", 0),
+        "chapters": {k: counts[k] for k in sorted(counts, key=int)},
+    }
+    write_json(os.path.join(shard_dir, "index.json"), index, COMPACT)
+
+    for path in glob.glob(os.path.join(shard_dir, "*.json")):
+        name = os.path.basename(path)[:-len(".json")]
+        if name != "index" and name not in counts:
+            os.remove(path)
+    print(f"Saved {len(counts)} chapter shards for {book_name} to {shard_dir}")
+
+def book_path(book_name):
+    return os.path.join(BOOKS_DIR, f"{book_name}.json")
+
+def save_book(book_name, data):
+    """Write books/{book}.json in the selected format, plus its shards when enabled.
+
+    Returns True when the book file's bytes changed.
+    """
+    output_path = book_path(book_name)
+    changed = write_json(output_path, encode_book(data) if COMPACT else data, COMPACT)
+    print(f"{'Saved' if changed else 'Unchanged'} {book_name} references at {output_path}")
+    if WRITE_SHARDS:
+        save_chapter_shards(book_name, data)
+    return changed
+
+class BookStream:
+    """Writes one streamed /bible/books/{book} response to its output files.
+
+    A BookParser handler: consume() feeds it the body chunk by chunk. In the
+    legacy format the rows go straight through PrettyWriter into the book
+    file's tmp copy. For the compact format and for shards, each chapter's
+    rows are also copied, as the body spelled them, into a per-chapter spool
+    (a JSON array) while the sermon/model tables fill in, and commit() builds
+    the outputs from the spools one chapter at a time. Nothing replaces the saved files until commit();
+    discard() drops the partial output.
+    """
+
+    def __init__(self, book_name):
+        self.book_name = book_name
+        self.out = None
+        self.spool = None
+        self.spool_dir = None
 
-        results = await asyncio.gather(*(worker(b) for b in books))
+    def reset(self):
+        self.discard()
+        self.sha = hashlib.sha256()
+        self.digest = None
+        self.parser = BookParser(self)
+        self.meta = {}
+        self.chapters = []          # [(chapter key, spool path, rows)]
+        self.tables = CompactTables()
+        self.row_books = set()
+        self.spool = None
+        self.out = None if COMPACT else AtomicFile(book_path(self.book_name))
+        self.writer = PrettyWriter(self.out) if self.out else None
+        if COMPACT or WRITE_SHARDS:
+            self.spool_dir = tempfile.mkdtemp(prefix=f"bible-{self.book_name}-")
+
+    async def consume(self, response):
+        """AdaptiveFetcher on_body hook; starts over if a retry calls it again."""
+        self.reset()
+        parse_time = 0.0
+        async for chunk in response.aiter_bytes(STREAM_CHUNK):
+            self.sha.update(chunk)
+            started = time.perf_counter()
+            self.parser.feed(chunk)
+            parse_time += time.perf_counter() - started
+        self.parser.close()
+        metrics.observe("json.parse", parse_time)
+        self.digest = self.sha.hexdigest()
+
+    # -- BookParser events --
+
+    def field(self, key, value):
+        self.meta[key] = value
+        if self.writer:
+            self.writer.field(key, value)
+
+    def open_group(self, key, kind):
+        if self.writer:
+            self.writer.open_group(key, kind)
+
+    def close_group(self, key, kind):
+        if self.writer:
+            self.writer.close_group(key, kind)
+
+    def open_chapter(self, key):
+        if self.writer:
+            self.writer.open_chapter(key)
+        if self.spool_dir:
+            path = os.path.join(self.spool_dir, f"{len(self.chapters)}.json")
+            self.spool = open(path, "w", encoding="utf-8")
+            self.spool.write("[")
+            self.chapters.append([key, path, 0])
+
+    def row(self, chapter, row, text):
+        if self.writer:
+            self.writer.row(chapter, row)
+        # The flat "references" list repeats the chapter rows; only the
+        # chapters feed the compact tables and the shards.
+        if chapter is None or not self.spool:
+            return
+        self.spool.write(("," if self.chapters[-1][2] else "") + text)
+        self.chapters[-1][2] += 1
+        self.tables.add(row)
+        self.row_books.add(row.get("book"))
+
+    def close_chapter(self, key):
+        if self.writer:
+            self.writer.close_chapter(key)
+        if self.spool:
+            self.spool.write("]")
+            self.spool.close()
+            self.spool = None
+
+    def end(self):
+        if self.writer:
+            self.writer.end()
+
+    # -- output --
+
+    def chapter_rows(self):
+        """(chapter key, rows) per chapter, read back from the spools one at a time."""
+        for key, path, _ in self.chapters:
+            with open(path, encoding="utf-8") as f:
+                yield key, json.load(f)
+
+    def write_compact(self):
+        """Same bytes as write_json(path, encode_book(data), compact=True)."""
+        ref_book = next(iter(self.row_books)) if len(self.row_books) == 1 else None
+        header = json.dumps(compact_header(self.meta, self.tables, ref_book),
+                            ensure_ascii=False, separators=COMPACT_SEPARATORS)
+        with AtomicFile(book_path(self.book_name)) as out:
+            out.write(header[:-1] + ',"chapters":{')
+            for n, (key, rows) in enumerate(self.chapter_rows()):
+                cols = encode_rows(rows, self.tables, ref_book)
+                out.write(("," if n else "") + json.dumps(key, ensure_ascii=False) + ":" +
+                          json.dumps(cols, ensure_ascii=False, separators=COMPACT_SEPARATORS))
+            out.write("}}")
+        return out.changed
+
+    def commit(self):
+        """Move the book file (and shards) into place; True when the book file changed."""
+        changed = self.write_compact() if COMPACT else self.out.close()
+        output_path = book_path(self.book_name)
+        print(f"{'Saved' if changed else 'Unchanged'} {self.book_name} references at {output_path} (streamed)")
+        if WRITE_SHARDS:
+            save_chapter_shards(self.book_name, self.meta, self.chapter_rows())
+        self.discard()
+        return changed
+
+    def discard(self):
+        if self.spool:
+            self.spool.close()
+            self.spool = None
+        if self.out:
+            self.out.discard()
+        if self.spool_dir:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+            self.spool_dir = None
+
+
+def reshard_saved_books(only=None):
+    """Rewrite the book files on disk in the selected format and rebuild their shards (no API calls).
+
+    `only` limits the rewrite to those book names (build.py passes the books
+    whose files changed).
+    """
+    count = 0
+    for path in sorted(glob.glob(os.path.join(BOOKS_DIR, "*.json"))):
+        book_name = os.path.basename(path)[:-len(".json")]
+        if only and book_name not in only:
+            continue
+        save_book(book_name, load_book(path))
+        count += 1
+    # Drop shard directories whose book file is gone.
+    for entry in os.listdir(BOOKS_DIR):
+        shard_dir = os.path.join(BOOKS_DIR, entry)
+        if os.path.isdir(shard_dir) and not os.path.exists(shard_dir + ".json"):
+            shutil.rmtree(shard_dir)
+    print(f"Resharded {count} book files")
+    return count
+
+async def fetch_and_save_book_references(fetcher, book_name, changed_books):
+    """Fetch and save references for a specific book using a shared fetcher."""
+    endpoint = f"bible/books/{book_name}"
+    stream = BookStream(book_name) if STREAMING else None
+    try:
+        data = await fetch_data(fetcher, endpoint, book_path(book_name), stream)
+        if data is NOT_MODIFIED:
+            return True
+        if data is NOT_FOUND:
+            # The API 404s books no sermon references yet; nothing to save.
+            print(f"No references for {book_name}")
+            return True
+        if not data:
+            return False
+        if data is stream:
+            # Off the event loop, so the other books keep downloading meanwhile.
+            changed = await asyncio.to_thread(stream.commit)
+        else:
+            changed = save_book(book_name, data)
+        if changed:
+            changed_books.append(book_name)
+        record_saved(endpoint)
+        return True
+    finally:
+        if stream:
+            stream.discard()
+
+async def fetch_all_book_references(fetcher, books):
+    """Fetch references for all books; the fetcher's adaptive window bounds concurrency."""
+    changed_books = []
+    results = await asyncio.gather(
+        *(fetch_and_save_book_references(fetcher, b, changed_books) for b in books))
 
     success_count = sum(1 for r in results if r)
     print(f"Successfully fetched references for {success_count} out of {len(books)} books")
     if success_count < len(books):
         print(f"WARNING: {len(books) - success_count} book(s) failed to fetch; "
               f"their saved data was left unchanged.")
+    if changed_books:
+        print(f"Changed books ({len(changed_books)}): {', '.join(sorted(changed_books))}")
+    else:
+        print("No book data changed")
     return success_count
 
 async def main():
     """Main function to coordinate fetching all Bible reference data"""
-    print("Starting Bible reference data fetching")
-    
-    # Fetch Bible stats
-    stats_success = await fetch_and_save_bible_stats()
-    if not stats_success:
-        print("Failed to fetch Bible stats, but continuing with other data")
-    
-    # Fetch Bible books
-    books = await fetch_and_save_bible_books()
-    if not books:
-        print("Failed to fetch Bible books list, cannot continue")
+    global WRITE_SHARDS, COMPACT, INCREMENTAL, STREAMING
+    parser = argparse.ArgumentParser(description="Fetch Bible reference data from the sermon API")
+    parser.add_argument("--shards", action="store_true", default=WRITE_SHARDS,
+                        help="Also write per-chapter shards + index (env WRITE_CHAPTER_SHARDS=true)")
+    parser.add_argument("--compact", action="store_true", default=COMPACT,
+                        help="Write the deduplicated, minified reference schema (env BIBLE_DATA_FORMAT=compact)")
+    parser.add_argument("--incremental", action="store_true", default=INCREMENTAL,
+                        help="Send conditional requests from fetch_manifest.json and skip unchanged endpoints "
+                             "(env FETCH_INCREMENTAL=true)")
+    parser.add_argument("--no-stream", action="store_true", default=not STREAMING,
+                        help="Buffer and parse each book response whole instead of streaming it "
+                             "(env FETCH_STREAMING=false)")
+    parser.add_argument("--reshard", action="store_true",
+                        help="Only re-encode the book files on disk and rebuild their shards, no API calls")
+    parser.add_argument("--book", action="append", metavar="NAME",
+                        help="With --reshard, only these books (repeatable)")
+    parser.add_argument("--skip-aggregate", action="store_true",
+                        help="Don't rebuild bible_stats.json, bible_books.json and rollups/ "
+                             "(build.py runs aggregate_bible_data.py as its own stage)")
+    args = parser.parse_args()
+    WRITE_SHARDS = args.shards
+    COMPACT = args.compact
+    INCREMENTAL = args.incremental
+    STREAMING = not args.no_stream
+
+    if args.reshard:
+        reshard_saved_books(set(args.book) if args.book else None)
+        if not args.skip_aggregate:
+            aggregate(OUTPUT_DIR, COMPACT)
         return
-    
-    # Fetch references for each book
-    await fetch_all_book_references(books)
-    
+
+    print("Starting Bible reference data fetching")
+    load_manifest()
+
+    # The book list is fixed (KJV book names + the API's aliases), so there's
+    # no separate bible/books call; bible_stats.json and bible_books.json are
+    # derived from the saved book files below and can't disagree with them.
+    books = api_book_names()
+    async with httpx.AsyncClient() as client:
+        fetcher = make_fetcher(client)
+        await fetch_all_book_references(fetcher, books)
+        save_manifest()
+        fetcher.print_summary()
+
+    if not args.skip_aggregate:
+        aggregate(OUTPUT_DIR, COMPACT)
     print("Bible reference data fetching completed")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    with metrics.run("fetch_bible_data"):
+        asyncio.run(main())
\ No newline at end of file
@@ -5,26 +5,51 @@
    /assets/data/bible-headings/{Book}.json
 
 2. Red-letter spans — per chapter (gospels + Acts + Revelation only), which
-   verses contain Jesus's spoken words and the exact speech substring vs
-   narrative intro. Stored at /assets/data/bible-red-letter/{Book}.json
+   verses contain Jesus's spoken words. The model quotes each speech
+   substring; validation resolves it to [start, end) character offsets in
+   the verse, so the file stores only offsets:
+       {"3": [[15, 11, 48], ...]}   (chapter -> [verse, start, end] triples)
+   Stored at /assets/data/bible-red-letter/{Book}.json
 
-Source data: /assets/data/Bible-kjv-master/{Book}.json
+Source data: /assets/data/Bible-kjv-master/{Book}.json, read through the
+packed copy kjv_pack.py keeps in .cache/kjv.pack (rebuilt when stale).
 
 Both overlays are pure presentation — they don't touch the sermon reference
 data. Idempotent: skips chapters that already have output unless --force.
+
+Every (book, chapter, mode) that needs work goes into one run-wide queue
+drained by --max-workers threads (or coroutines with --async), so short books
+never leave workers idle. Requests are paced by a token bucket (--rpm/--tpm)
+and each finished chapter is appended to a per-book journal
+({Book}.journal.jsonl next to the output), which is folded into {Book}.json
+once the book's last chapter completes. An interrupted run loses nothing:
+startup replays the journal on top of the existing file.
+
+Raw responses are cached in .cache/overlay_llm.sqlite (see llm_cache.py), so
+--force and validator changes replay cached output instead of re-querying;
+--revalidate-only reruns validation over the cache without any API calls.
 """
 import os
 import sys
 import json
 import glob
+import time
+import asyncio
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from tqdm import tqdm
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+
+import metrics
+from kjv_pack import open_kjv
+from llm_cache import LLMCache, cache_key
 
 KJV_DIR = os.path.join(os.path.dirname(__file__), "..", "assets", "data", "Bible-kjv-master")
-HEADINGS_DIR = os.path.join(os.path.dirname(__file__), "..", "assets", "data", "bible-headings")
-RED_LETTER_DIR = os.path.join(os.path.dirname(__file__), "..", "assets", "data", "bible-red-letter")
+# OVERLAY_OUTPUT_DIR redirects both overlays (e.g. for benchmark runs).
+OVERLAY_OUTPUT_DIR = os.environ.get("OVERLAY_OUTPUT_DIR", os.path.join(os.path.dirname(__file__), "..", "assets", "data"))
+HEADINGS_DIR = os.path.join(OVERLAY_OUTPUT_DIR, "bible-headings")
+RED_LETTER_DIR = os.path.join(OVERLAY_OUTPUT_DIR, "bible-red-letter")
 
 # Books where Jesus speaks. Limits the red-letter pass.
 RED_LETTER_BOOKS = {
@@ -34,6 +59,7 @@ RED_LETTER_BOOKS = {
 }
 
 DEFAULT_MODEL = "anthropic/claude-sonnet-4.6"
+LLM_BASE_URL = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 
 
 # ----------------------------------------------------------------------
@@ -48,25 +74,45 @@ HEADINGS_SYSTEM = (
     "never theological commentary or interpretation. Use title case."
 )
 
+HEADINGS_RULES = """Rules:
+- Be terse (typically 2-5 words). Title case.
+- Describe what the text does ("Paul Greets the Romans", "The Beatitudes", "The Birth of Isaac"), not what it teaches ("Justified by Faith Alone").
+- The first heading should be before verse 1 unless the chapter clearly continues a thought from the previous chapter.
+- Long narrative chapters may want 4-5 headings; short or didactic chapters may want only 2.
+- DO NOT include any verse text in the heading."""
+
+def verse_block(verses):
+    return "\n".join(f"{v['verse']}. {v['text']}" for v in verses)
+
+def chapters_block(book, chapters):
+    return "\n\n".join(f"KJV {book} chapter {chnum}:\n\n{verse_block(verses)}"
+                       for chnum, verses in chapters)
+
 def headings_user_message(book, chapter_num, verses):
-    verse_lines = "\n".join(f"{v['verse']}. {v['text']}" for v in verses)
     return f"""KJV {book} chapter {chapter_num}:
 
-{verse_lines}
+{verse_block(verses)}
 
 Propose 2-5 short section headings for this chapter. Each heading sits before a specific verse and announces the content of the verses that follow.
 
-Rules:
-- Be terse (typically 2-5 words). Title case.
-- Describe what the text does ("Paul Greets the Romans", "The Beatitudes", "The Birth of Isaac"), not what it teaches ("Justified by Faith Alone").
-- The first heading should be before verse 1 unless the chapter clearly continues a thought from the previous chapter.
-- Long narrative chapters may want 4-5 headings; short or didactic chapters may want only 2.
-- DO NOT include any verse text in the heading.
+{HEADINGS_RULES}
 
 Output ONLY valid JSON:
 {{"headings": [{{"before_verse": 1, "title": "..."}}, ...]}}
 """
 
+def headings_batch_message(book, chapters):
+    """Several consecutive chapters in one request; `chapters` is [(chnum, verses)]."""
+    return f"""{chapters_block(book, chapters)}
+
+For EACH chapter above, propose 2-5 short section headings. Each heading sits before a specific verse of that chapter and announces the content of the verses that follow. Treat each chapter on its own; verse numbers restart in every chapter.
+
+{HEADINGS_RULES}
+
+Output ONLY valid JSON with one entry per chapter, keyed by chapter number:
+{{"chapters": {{"{chapters[0][0]}": {{"headings": [{{"before_verse": 1, "title": "..."}}, ...]}}, ...}}}}
+"""
+
 
 # ----------------------------------------------------------------------
 # Red letter
@@ -78,27 +124,41 @@ RED_LETTER_SYSTEM = (
     "verse text, never paraphrase."
 )
 
+RED_LETTER_RULES = """Rules:
+- "Spoken by Jesus" means: direct quoted speech from Jesus. Include indirect references only if introduced ("Jesus said unto them, ..." → the part after the comma).
+- For each spoken segment, extract the exact substring from the verse text — do not modify, paraphrase, or modernize punctuation.
+- If a verse contains both narrative ("And Jesus answered, saying,") and speech, only the speech portion goes in "speech".
+- If a whole verse is Jesus's speech with no narrative, set "intro" to empty string.
+- If a verse has multiple separate speech segments (speech, narrative interrupts, more speech), list them all under "segments".
+- Skip verses with no Jesus-speech entirely."""
+
+RED_LETTER_EXAMPLE = """{"verses": [
+  {"verse": 3, "segments": [{"intro": "And Jesus answered him, saying,", "speech": "It is written, That man shall not live by bread alone, but by every word of God."}]},
+  ...
+]}"""
+
 def red_letter_user_message(book, chapter_num, verses):
-    verse_lines = "\n".join(f"{v['verse']}. {v['text']}" for v in verses)
     return f"""KJV {book} chapter {chapter_num}:
 
-{verse_lines}
+{verse_block(verses)}
 
 Identify every verse where Jesus Christ is speaking. For each such verse, return the verbatim spoken-word substring(s).
 
-Rules:
-- "Spoken by Jesus" means: direct quoted speech from Jesus. Include indirect references only if introduced ("Jesus said unto them, ..." → the part after the comma).
-- For each spoken segment, extract the exact substring from the verse text — do not modify, paraphrase, or modernize punctuation.
-- If a verse contains both narrative ("And Jesus answered, saying,") and speech, only the speech portion goes in "speech".
-- If a whole verse is Jesus's speech with no narrative, set "intro" to empty string.
-- If a verse has multiple separate speech segments (speech, narrative interrupts, more speech), list them all under "segments".
-- Skip verses with no Jesus-speech entirely.
+{RED_LETTER_RULES}
 
 Output ONLY valid JSON:
-{{"verses": [
-  {{"verse": 3, "segments": [{{"intro": "And Jesus answered him, saying,", "speech": "It is written, That man shall not live by bread alone, but by every word of God."}}]}},
-  ...
-]}}
+{RED_LETTER_EXAMPLE}
+"""
+
+def red_letter_batch_message(book, chapters):
+    return f"""{chapters_block(book, chapters)}
+
+For EACH chapter above, identify every verse where Jesus Christ is speaking. For each such verse, return the verbatim spoken-word substring(s). Verse numbers restart in every chapter; a chapter with no Jesus-speech gets an empty "verses" list.
+
+{RED_LETTER_RULES}
+
+Output ONLY valid JSON with one entry per chapter, keyed by chapter number:
+{{"chapters": {{"{chapters[0][0]}": {RED_LETTER_EXAMPLE}, ...}}}}
 """
 
 
@@ -138,15 +198,26 @@ def extract_json(text):
     return None
 
 
-def call_llm(client, model, system, user, max_tokens=1500):
-    resp = client.chat.completions.create(
+TEMPERATURE = 0.1
+
+
+def chat_request(model, system, user, max_tokens):
+    return dict(
         model=model,
         messages=[{"role": "system", "content": system},
                   {"role": "user", "content": user}],
-        temperature=0.1,
+        temperature=TEMPERATURE,
         max_tokens=max_tokens,
     )
-    raw = resp.choices[0].message.content or ""
+
+
+def response_text(resp):
+    """(raw text, total tokens used or None) from a chat completion."""
+    usage = getattr(resp, "usage", None)
+    return resp.choices[0].message.content or "", getattr(usage, "total_tokens", None)
+
+
+def parse_llm_output(raw):
     js = extract_json(raw)
     if not js:
         return None
@@ -156,12 +227,90 @@ def call_llm(client, model, system, user, max_tokens=1500):
         return None
 
 
+def create_completion(client, model, system, user, max_tokens):
+    """chat.completions.create, timed into the run metrics."""
+    started = time.monotonic()
+    resp = client.chat.completions.create(**chat_request(model, system, user, max_tokens))
+    metrics.record_llm(time.monotonic() - started, model, getattr(resp, "usage", None))
+    return resp
+
+
+async def create_completion_async(client, model, system, user, max_tokens):
+    started = time.monotonic()
+    resp = await client.chat.completions.create(**chat_request(model, system, user, max_tokens))
+    metrics.record_llm(time.monotonic() - started, model, getattr(resp, "usage", None))
+    return resp
+
+
+def call_llm(client, model, system, user, max_tokens=1500):
+    resp = create_completion(client, model, system, user, max_tokens)
+    return parse_llm_output(response_text(resp)[0])
+
+
+def estimate_tokens(system, user, max_tokens):
+    """Rough prompt size (~4 chars/token) plus the completion ceiling."""
+    return (len(system) + len(user)) // 4 + max_tokens
+
+
+class TokenBucket:
+    """Refills at `per_minute`, holds at most one minute's worth.
+
+    `reserve()` takes capacity immediately (the level may go negative) and
+    returns how long the caller must wait before using it, so concurrent
+    callers queue up in order instead of all waking at once. A rate of 0
+    disables the bucket.
+    """
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        if not self.rate:
+            return 0.0
+        with self.lock:
+            self._refill()
+            self.level -= amount
+            return max(0.0, -self.level / self.rate)
+
+    def refund(self, amount):
+        if not self.rate:
+            return
+        with self.lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """Request and token budgets shared by every worker in the run."""
+
+    def __init__(self, rpm=0, tpm=0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    def reserve(self, estimated_tokens):
+        return max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+
+    def settle(self, estimated_tokens, used_tokens):
+        # The estimate counts the full max_tokens; give back what wasn't used.
+        if used_tokens is not None and used_tokens < estimated_tokens:
+            self.tokens.refund(estimated_tokens - used_tokens)
+
+
 def load_kjv_book(book_slug):
     """KJV repo uses CamelCase slugs (1Corinthians, SongofSolomon)."""
-    path = os.path.join(KJV_DIR, f"{book_slug}.json")
-    if not os.path.exists(path):
+    kjv = open_kjv()
+    if not kjv.has_book(book_slug):
         return None
-    return json.load(open(path))
+    return kjv.book_dict(book_slug)
 
 
 def all_book_slugs():
@@ -174,11 +323,14 @@ def all_book_slugs():
     )
 
 
-def save_json(path, data):
+def save_json(path, data, compact=False):
     os.makedirs(os.path.dirname(path), exist_ok=True)
     tmp = path + ".tmp"
     with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+        if compact:
+            json.dump(data, f, separators=(",", ":"), ensure_ascii=False)
+        else:
+            json.dump(data, f, indent=2, ensure_ascii=False)
     os.replace(tmp, path)
 
 
@@ -186,34 +338,86 @@ def save_json(path, data):
 # Validation
 # ----------------------------------------------------------------------
 
+# Typographic punctuation the model sometimes substitutes for the KJV's ASCII.
+# One character for one, so offsets survive the folding.
+FOLD = str.maketrans({"\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"'})
+
+
+def normalize_with_offsets(text):
+    """(normalized text, offset of each normalized char in `text`).
+
+    Whitespace runs collapse to one space, the ends are trimmed and curly
+    quotes fold to straight ones; offsets[i] is where normalized[i] came from.
+    """
+    chars, offsets = [], []
+    for i, c in enumerate(text.translate(FOLD)):
+        if c.isspace():
+            if chars and chars[-1] != " ":
+                chars.append(" ")
+                offsets.append(i)
+            continue
+        chars.append(c)
+        offsets.append(i)
+    if chars and chars[-1] == " ":
+        chars.pop()
+        offsets.pop()
+    return "".join(chars), offsets
+
+
+def speech_span(speech, verse_text):
+    """[start, end) character offsets of `speech` in the verse, or None.
+
+    An exact match wins; otherwise both sides are normalized and the match
+    is mapped back through the offset map, so the span still covers the
+    verse's own characters rather than the model's spelling of them.
+    """
+    start = verse_text.find(speech)
+    if start != -1:
+        return start, start + len(speech)
+    target, _ = normalize_with_offsets(speech)
+    norm, offsets = normalize_with_offsets(verse_text)
+    start = norm.find(target) if target else -1
+    if start == -1:
+        return None
+    return offsets[start], offsets[start + len(target) - 1] + 1
+
+
+def merge_spans(spans):
+    """Sort [start, end) pairs and merge any that overlap or touch."""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
 def validate_red_letter(result, verses_by_num):
-    """Drop segments whose `speech` substring isn't actually in the verse."""
+    """Resolve each segment's `speech` to character offsets in its verse.
+
+    Returns {"verses": [[verse, start, end], ...]} sorted by verse and
+    offset, one entry per merged span; segments whose speech can't be found
+    in the verse are dropped.
+    """
     if not isinstance(result, dict) or "verses" not in result:
         return None
-    cleaned = []
+    spans = {}
     for v in result.get("verses", []):
+        if not isinstance(v, dict):
+            continue
         vnum = v.get("verse")
-        verse_text = verses_by_num.get(str(vnum), {}).get("text", "")
-        segs = v.get("segments") or []
-        kept = []
-        for seg in segs:
-            speech = (seg.get("speech") or "").strip()
-            if speech and speech in verse_text:
-                kept.append({
-                    "intro": (seg.get("intro") or "").strip(),
-                    "speech": speech,
-                })
-            else:
-                # Fuzzy fallback: maybe model normalized whitespace
-                speech_norm = " ".join(speech.split())
-                text_norm = " ".join(verse_text.split())
-                if speech_norm and speech_norm in text_norm:
-                    # Find the actual substring in the original
-                    # Simple: just use the normalized form
-                    kept.append({"intro": (seg.get("intro") or "").strip(), "speech": speech_norm})
-        if kept:
-            cleaned.append({"verse": vnum, "segments": kept})
-    return {"verses": cleaned} if cleaned else {"verses": []}
+        if str(vnum) not in verses_by_num:
+            continue
+        verse_text = verses_by_num[str(vnum)].get("text", "")
+        for seg in v.get("segments") or []:
+            speech = (seg.get("speech") or "").strip() if isinstance(seg, dict) else ""
+            span = speech_span(speech, verse_text) if speech else None
+            if span:
+                spans.setdefault(int(vnum), []).append(span)
+    return {"verses": [[vnum, start, end]
+                       for vnum in sorted(spans)
+                       for start, end in merge_spans(spans[vnum])]}
 
 
 def validate_headings(result, max_verse):
@@ -234,140 +438,515 @@ def validate_headings(result, max_verse):
 
 
 # ----------------------------------------------------------------------
-# Per-book runners
+# Jobs
 # ----------------------------------------------------------------------
 
-def process_book_headings(book_slug, client, model, force, max_workers):
-    kjv = load_kjv_book(book_slug)
-    if not kjv: return 0, 0
-    book_name = kjv.get("book", book_slug)
-    out_path = os.path.join(HEADINGS_DIR, f"{book_slug}.json")
-    existing = {}
-    if os.path.exists(out_path) and not force:
-        try: existing = json.load(open(out_path))
-        except: existing = {}
-
-    chapters = kjv.get("chapters", [])
-    todo = []
-    for ch in chapters:
-        chnum = str(ch.get("chapter"))
-        if chnum in existing and existing[chnum]: continue
-        todo.append(ch)
-    if not todo:
-        return 0, len(chapters)
-
-    def run(ch):
-        chnum = str(ch.get("chapter"))
-        verses = ch.get("verses", [])
-        if not verses: return chnum, None
-        user = headings_user_message(book_name, chnum, verses)
-        result = call_llm(client, model, HEADINGS_SYSTEM, user, max_tokens=600)
-        if not result: return chnum, None
-        max_v = max(int(v["verse"]) for v in verses if str(v.get("verse","")).isdigit())
-        cleaned = validate_headings(result, max_v)
-        return chnum, cleaned
-
-    new_count = 0
-    with ThreadPoolExecutor(max_workers=max_workers) as ex:
-        futures = {ex.submit(run, c): c for c in todo}
-        with tqdm(total=len(futures), desc=f"  {book_name}", leave=False) as bar:
-            for fut in as_completed(futures):
-                chnum, cleaned = fut.result()
-                if cleaned:
-                    existing[chnum] = cleaned["headings"]
-                    new_count += 1
-                bar.update(1)
-                if new_count and new_count % 5 == 0:
-                    save_json(out_path, existing)
-    save_json(out_path, existing)
-    return new_count, len(chapters) - new_count
-
-
-def process_book_red_letter(book_slug, client, model, force, max_workers):
-    if book_slug not in RED_LETTER_BOOKS:
-        return 0, 0
-    kjv = load_kjv_book(book_slug)
-    if not kjv: return 0, 0
-    book_name = kjv.get("book", book_slug)
-    out_path = os.path.join(RED_LETTER_DIR, f"{book_slug}.json")
-    existing = {}
-    if os.path.exists(out_path) and not force:
-        try: existing = json.load(open(out_path))
-        except: existing = {}
-
-    chapters = kjv.get("chapters", [])
+def headings_job(book_name, chnum, verses):
+    user = headings_user_message(book_name, chnum, verses)
+    return HEADINGS_SYSTEM, user, 600
+
+
+def headings_result(result, verses):
+    """Chapter value to store, or None to leave the chapter for the next run."""
+    if not result: return None
+    # kjv_pack guarantees verses are numbered 1..n, so the last verse is the count.
+    cleaned = validate_headings(result, len(verses))
+    return cleaned["headings"] if cleaned else None
+
+
+def red_letter_job(book_name, chnum, verses):
+    user = red_letter_user_message(book_name, chnum, verses)
+    # 4000 tokens is enough for long Jesus-heavy chapters (e.g. Matt 5,
+    # the Sermon on the Mount, hit ~8K chars output). Original 2000
+    # silently truncated mid-JSON and produced zero red-letter spans.
+    return RED_LETTER_SYSTEM, user, 4000
+
+
+def red_letter_result(result, verses):
+    if not result: return []
+    verses_by_num = {str(v["verse"]): v for v in verses}
+    cleaned = validate_red_letter(result, verses_by_num)
+    return (cleaned or {"verses": []})["verses"]
+
+
+MODES = {
+    "headings": {
+        "dir": HEADINGS_DIR,
+        "books": None,
+        # Headings are redone when a previous run stored an empty list.
+        "done": lambda existing, chnum: bool(existing.get(chnum)),
+        "job": headings_job,
+        "batch": headings_batch_message,
+        "key": "headings",
+        "result": headings_result,
+        "empty": None,
+        "compact": False,
+    },
+    "red-letter": {
+        "dir": RED_LETTER_DIR,
+        "books": RED_LETTER_BOOKS,
+        "done": lambda existing, chnum: chnum in existing,  # presence (even empty list) means done
+        "job": red_letter_job,
+        "batch": red_letter_batch_message,
+        "key": "verses",
+        "result": red_letter_result,
+        "empty": [],
+        # Offset triples pretty-printed are one number per line.
+        "compact": True,
+    },
+}
+
+# Batches stop growing at whichever limit comes first: --batch-tokens of
+# prompt, this many chapters, or this much completion budget (the sum of the
+# chapters' own max_tokens, so red-letter batches stay small).
+BATCH_MAX_CHAPTERS = 12
+BATCH_MAX_OUTPUT = 8000
+
+
+class BookOutput:
+    """One overlay file being filled in.
+
+    Each completed chapter is appended to the book's journal right away (one
+    JSON line, flushed and fsynced), so a crash costs at most the request in
+    flight. compact() rewrites {Book}.json once, atomically, and drops the
+    journal; it runs when the book's last pending chapter lands and again for
+    every book at the end of the run.
+    """
+
+    def __init__(self, mode, book_slug, book_name, total_chapters, force):
+        self.mode = mode
+        self.book_slug = book_slug
+        self.book_name = book_name
+        self.total_chapters = total_chapters
+        self.path = os.path.join(MODES[mode]["dir"], f"{book_slug}.json")
+        self.journal_path = os.path.join(MODES[mode]["dir"], f"{book_slug}.journal.jsonl")
+        self.journal = None
+        self.data = {}
+        self.pending = 0
+        self.new_count = 0
+        self.dirty = False
+        if force:
+            # Starting over; anything an interrupted run journaled is in the LLM cache.
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+        self.replay_journal()
+
+    def replay_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        replayed = 0
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn final line from a crash mid-write
+                self.data[entry["chapter"]] = entry["value"]
+                replayed += 1
+        if replayed:
+            self.dirty = True
+            tqdm.write(f"  {self.mode}:{self.book_slug}: resumed {replayed} journaled chapters")
+
+    def set(self, chnum, value):
+        self.data[chnum] = value
+        self.new_count += 1
+        self.dirty = True
+        if self.journal is None:
+            os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+            self.journal = open(self.journal_path, "a", encoding="utf-8")
+        self.journal.write(json.dumps({"chapter": chnum, "value": value}, ensure_ascii=False) + "\n")
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+    def record(self, chnum, value):
+        self.pending -= 1
+        if value is not None:
+            self.set(chnum, value)
+        if self.pending == 0:
+            self.compact()
+
+    def compact(self):
+        """Fold the journal into {Book}.json and remove it."""
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if self.dirty:
+            save_json(self.path, self.data, MODES[self.mode]["compact"])
+            self.dirty = False
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+
+class Job:
+    """One chapter of one mode, sent as its own request."""
+
+    def __init__(self, output, chnum, verses):
+        self.output = output
+        self.chnum = chnum
+        self.verses = verses
+        spec = MODES[output.mode]
+        self.system, self.user, self.max_tokens = spec["job"](output.book_name, chnum, verses)
+        self.estimated_tokens = estimate_tokens(self.system, self.user, self.max_tokens)
+        self.label = f"{output.mode}:{output.book_slug}:{chnum}"
+
+    def cache_key(self, model):
+        return cache_key(model, self.system, self.user, self.max_tokens, TEMPERATURE)
+
+    def finish(self, result):
+        return MODES[self.output.mode]["result"](result, self.verses)
+
+    def resolve(self, result, raw):
+        """([(job, value, raw to cache or None)], [jobs to retry])"""
+        return [(self, self.finish(result), raw if result is not None else None)], []
+
+    def failed(self, e):
+        # A failed request leaves the chapter unset so the next run picks it up.
+        tqdm.write(f"  {self.label} failed: {e}")
+        return [(self, None, None)], []
+
+
+class Batch:
+    """Consecutive pending chapters of one book/mode packed into a single request.
+
+    Each chapter's slice of the answer is validated on its own; chapters that
+    are missing, malformed or fail validation are retried as single Jobs.
+    """
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        first = jobs[0]
+        self.output = first.output
+        spec = MODES[self.output.mode]
+        self.system = first.system
+        self.user = spec["batch"](self.output.book_name, [(j.chnum, j.verses) for j in jobs])
+        self.max_tokens = min(BATCH_MAX_OUTPUT, sum(j.max_tokens for j in jobs))
+        self.estimated_tokens = estimate_tokens(self.system, self.user, self.max_tokens)
+        self.label = f"{self.output.mode}:{self.output.book_slug}:{first.chnum}-{jobs[-1].chnum}"
+
+    def resolve(self, result, raw):
+        key = MODES[self.output.mode]["key"]
+        chapters = result.get("chapters") if isinstance(result, dict) else None
+        if not isinstance(chapters, dict):
+            chapters = {}
+        done, retry = [], []
+        for job in self.jobs:
+            sub = chapters.get(job.chnum)
+            value = job.finish(sub) if isinstance(sub, dict) and isinstance(sub.get(key), list) else None
+            if value is None:
+                retry.append(job)
+            else:
+                # Cached under the chapter's single-request key so later runs
+                # (batched or not, and --revalidate-only) can replay it.
+                done.append((job, value, json.dumps(sub, ensure_ascii=False)))
+        return done, retry
+
+    def failed(self, e):
+        tqdm.write(f"  {self.label} failed: {e}; retrying as single chapters")
+        return [], list(self.jobs)
+
+
+def pack_batches(jobs, budget):
+    """Group consecutive jobs of the same book/mode into Batches of up to `budget` prompt tokens."""
+    items, group = [], []
+    prompt_tokens = output_tokens = 0
+
+    def flush():
+        if len(group) == 1:
+            items.append(group[0])
+        elif group:
+            items.append(Batch(list(group)))
+
+    for job in jobs:
+        tokens = len(job.user) // 4
+        fits = (group and job.output is group[0].output
+                and len(group) < BATCH_MAX_CHAPTERS
+                and prompt_tokens + tokens <= budget
+                and output_tokens + job.max_tokens <= BATCH_MAX_OUTPUT)
+        if not fits:
+            flush()
+            group, prompt_tokens, output_tokens = [], 0, 0
+        group.append(job)
+        prompt_tokens += tokens
+        output_tokens += job.max_tokens
+    flush()
+    return items
+
+
+def plan_jobs(books, modes, force, redo=False):
+    """Build the run-wide job list and the per-book outputs it fills in.
+
+    `redo` queues every chapter while keeping existing output (for --revalidate-only).
+    """
+    jobs, outputs = [], []
+    for book_slug in books:
+        wanted = [m for m in modes if MODES[m]["books"] is None or book_slug in MODES[m]["books"]]
+        if not wanted:
+            continue
+        kjv = load_kjv_book(book_slug)
+        if not kjv: continue
+        book_name = kjv.get("book", book_slug)
+        chapters = kjv.get("chapters", [])
+        for mode in wanted:
+            spec = MODES[mode]
+            output = BookOutput(mode, book_slug, book_name, len(chapters), force)
+            outputs.append(output)
+            for ch in chapters:
+                chnum = str(ch.get("chapter"))
+                if not redo and spec["done"](output.data, chnum): continue
+                verses = ch.get("verses", [])
+                if not verses:
+                    # Nothing to ask the model; store the mode's empty value (if any) directly.
+                    if spec["empty"] is not None:
+                        output.set(chnum, spec["empty"])
+                    continue
+                output.pending += 1
+                jobs.append(Job(output, chnum, verses))
+            if not output.pending:
+                output.compact()
+    return jobs, outputs
+
+
+def migrate_red_letter(books):
+    """Rewrite red-letter files still in the old segments format as offsets.
+
+    Old chapters are lists of {"verse", "segments": [{"intro", "speech"}]};
+    each speech is resolved against the KJV text with the same validator new
+    output goes through. Chapters already in the offsets format are left
+    alone, so rerunning is a no-op. No API calls.
+    """
+    for book_slug in books:
+        if book_slug not in RED_LETTER_BOOKS:
+            continue
+        kjv = load_kjv_book(book_slug)
+        if not kjv:
+            continue
+        output = BookOutput("red-letter", book_slug, kjv.get("book", book_slug), len(kjv["chapters"]), False)
+        verses = {str(ch["chapter"]): {str(v["verse"]): v for v in ch["verses"]} for ch in kjv["chapters"]}
+        converted = segments = spans = 0
+        for chnum, value in list(output.data.items()):
+            if not any(isinstance(entry, dict) for entry in value):
+                continue
+            segments += sum(len(entry.get("segments") or []) for entry in value if isinstance(entry, dict))
+            cleaned = validate_red_letter({"verses": value}, verses.get(chnum, {}))
+            output.data[chnum] = cleaned["verses"]
+            output.dirty = True
+            converted += 1
+            spans += len(cleaned["verses"])
+        output.compact()
+        if converted:
+            print(f"  {book_slug}: {converted} chapters, {segments} segments -> {spans} spans")
+
+
+# ----------------------------------------------------------------------
+# Runners
+# ----------------------------------------------------------------------
+
+def replay_cached(jobs, model, cache):
+    """Record every job whose response is cached; return the ones that still need a request."""
     todo = []
-    for ch in chapters:
-        chnum = str(ch.get("chapter"))
-        if chnum in existing: continue  # presence (even empty list) means done
-        todo.append(ch)
-    if not todo:
-        return 0, len(chapters)
-
-    def run(ch):
-        chnum = str(ch.get("chapter"))
-        verses = ch.get("verses", [])
-        if not verses: return chnum, {"verses": []}
-        verses_by_num = {str(v["verse"]): v for v in verses}
-        user = red_letter_user_message(book_name, chnum, verses)
-        # 4000 tokens is enough for long Jesus-heavy chapters (e.g. Matt 5,
-        # the Sermon on the Mount, hit ~8K chars output). Original 2000
-        # silently truncated mid-JSON and produced zero red-letter spans.
-        result = call_llm(client, model, RED_LETTER_SYSTEM, user, max_tokens=4000)
-        if not result: return chnum, {"verses": []}
-        cleaned = validate_red_letter(result, verses_by_num)
-        return chnum, cleaned or {"verses": []}
-
-    new_count = 0
-    with ThreadPoolExecutor(max_workers=max_workers) as ex:
-        futures = {ex.submit(run, c): c for c in todo}
-        with tqdm(total=len(futures), desc=f"  {book_name}", leave=False) as bar:
-            for fut in as_completed(futures):
-                chnum, cleaned = fut.result()
-                existing[chnum] = cleaned["verses"]
-                new_count += 1
-                bar.update(1)
-                if new_count and new_count % 5 == 0:
-                    save_json(out_path, existing)
-    save_json(out_path, existing)
-    return new_count, len(chapters) - new_count
+    for job in jobs:
+        raw = cache.get(job.cache_key(model))
+        if raw is None:
+            todo.append(job)
+        else:
+            job.output.record(job.chnum, job.finish(parse_llm_output(raw)))
+    return todo
+
+
+def revalidate(jobs, model, cache):
+    """Re-run parsing + validation over cached raw output; never calls the API."""
+    missing = replay_cached(jobs, model, cache)
+    for job in missing:
+        job.output.record(job.chnum, None)
+    print(f"Revalidated {len(jobs) - len(missing)} cached chapters ({len(missing)} not in cache, left as is).\n")
+
+
+def finish_response(item, model, limiter, cache, resp):
+    raw, used = response_text(resp)
+    limiter.settle(item.estimated_tokens, used)
+    done, retry = item.resolve(parse_llm_output(raw), raw)
+    # Unparseable output isn't cached, so the next run asks again.
+    if cache:
+        for job, _, job_raw in done:
+            if job_raw is not None:
+                cache.put(job.cache_key(model), model, job_raw, used if job is item else None, job.label)
+    return done, retry
+
+
+def run_item(item, client, model, limiter, cache=None):
+    time.sleep(limiter.reserve(item.estimated_tokens))
+    resp = create_completion(client, model, item.system, item.user, item.max_tokens)
+    return finish_response(item, model, limiter, cache, resp)
+
+
+async def run_item_async(item, client, model, limiter, cache=None):
+    await asyncio.sleep(limiter.reserve(item.estimated_tokens))
+    resp = await create_completion_async(client, model, item.system, item.user, item.max_tokens)
+    return finish_response(item, model, limiter, cache, resp)
+
+
+def record_done(done, bar):
+    for job, value, _ in done:
+        job.output.record(job.chnum, value)
+    bar.update(len(done))
+
+
+def run_threaded(items, total, client, model, limiter, max_workers, cache=None):
+    with ThreadPoolExecutor(max_workers=max_workers) as ex, \
+            tqdm(total=total, desc="  chapters") as bar:
+        pending = {ex.submit(run_item, item, client, model, limiter, cache): item for item in items}
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                item = pending.pop(fut)
+                try:
+                    done, retry = fut.result()
+                except Exception as e:
+                    metrics.count("llm.errors")
+                    done, retry = item.failed(e)
+                record_done(done, bar)
+                for job in retry:
+                    pending[ex.submit(run_item, job, client, model, limiter, cache)] = job
+
+
+async def run_async(items, total, client, model, limiter, max_workers, cache=None):
+    queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+
+    with tqdm(total=total, desc="  chapters") as bar:
+        async def worker():
+            while True:
+                item = await queue.get()
+                try:
+                    try:
+                        done, retry = await run_item_async(item, client, model, limiter, cache)
+                    except Exception as e:
+                        metrics.count("llm.errors")
+                        done, retry = item.failed(e)
+                    record_done(done, bar)
+                    for job in retry:
+                        queue.put_nowait(job)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(max_workers)]
+        joined = asyncio.create_task(queue.join())
+        # Workers only return by raising (record_done failing to write, say);
+        # stop on the first one rather than wait on a queue nobody drains.
+        await asyncio.wait([joined, *workers], return_when=asyncio.FIRST_COMPLETED)
+        for task in [joined, *workers]:
+            task.cancel()
+        for w in workers:
+            if w.done() and not w.cancelled() and w.exception():
+                raise w.exception()
+
+
+def print_totals(outputs, modes):
+    for mode in modes:
+        print(f"--- {mode.replace('-', ' ').upper()} ---")
+        total_new = total_kept = 0
+        for output in outputs:
+            if output.mode != mode: continue
+            nnew, nkept = output.new_count, output.total_chapters - output.new_count
+            if nnew: print(f"  {output.book_slug}: +{nnew} new, {nkept} kept")
+            total_new += nnew; total_kept += nkept
+        print(f"Total: {total_new} new chapters, {total_kept} kept.\n")
 
 
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--mode", choices=("headings", "red-letter", "both"), default="both")
-    p.add_argument("--book", help="Process only this book (e.g. Matthew)")
+    p.add_argument("--book", action="append", help="Process only this book (e.g. Matthew); repeatable")
     p.add_argument("--model", default=os.environ.get("OVERLAY_MODEL", DEFAULT_MODEL))
     p.add_argument("--max-workers", type=int, default=6)
+    p.add_argument("--rpm", type=int, default=int(os.environ.get("OVERLAY_RPM", "0")),
+                   help="Max requests per minute across all workers (0 = unlimited)")
+    p.add_argument("--tpm", type=int, default=int(os.environ.get("OVERLAY_TPM", "0")),
+                   help="Max estimated tokens per minute across all workers (0 = unlimited)")
+    p.add_argument("--async", dest="use_async", action="store_true",
+                   help="Use the asyncio client with --max-workers coroutines instead of threads")
     p.add_argument("--force", action="store_true", help="Re-generate even if output exists")
+    p.add_argument("--batch-tokens", type=int, default=int(os.environ.get("OVERLAY_BATCH_TOKENS", "0")),
+                   help="Pack consecutive short chapters into one request up to this many prompt tokens (0 = off)")
+    p.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache")
+    p.add_argument("--revalidate-only", action="store_true",
+                   help="Re-run validation over cached responses for every chapter; no API calls")
+    p.add_argument("--prune-model", metavar="MODEL",
+                   help="Delete cached responses for MODEL and exit")
+    p.add_argument("--prune-days", type=float, metavar="N",
+                   help="Delete cached responses older than N days and exit")
+    p.add_argument("--cache-stats", action="store_true", help="Print cache contents by model and exit")
+    p.add_argument("--migrate-red-letter", action="store_true",
+                   help="Convert red-letter files from speech segments to character offsets and exit")
     args = p.parse_args()
 
+    if args.migrate_red_letter:
+        migrate_red_letter(args.book or all_book_slugs())
+        return
+
+    cache = None if args.no_cache else LLMCache()
+    if args.prune_model or args.prune_days is not None or args.cache_stats:
+        if cache is None:
+            sys.exit("Error: cache maintenance needs the cache (drop --no-cache)")
+        if args.prune_model or args.prune_days is not None:
+            removed = cache.prune(args.prune_model, args.prune_days)
+            print(f"Pruned {removed} cached responses.")
+        for model, count, tokens in cache.stats():
+            print(f"  {model}: {count} responses, {tokens} tokens")
+        return
+
+    modes = ["headings", "red-letter"] if args.mode == "both" else [args.mode]
+    books = args.book or all_book_slugs()
+
+    if args.revalidate_only:
+        if cache is None:
+            sys.exit("Error: --revalidate-only needs the cache (drop --no-cache)")
+        jobs, outputs = plan_jobs(books, modes, False, redo=True)
+        revalidate(jobs, args.model, cache)
+        print_totals(outputs, modes)
+        return
+
     key = os.environ.get("OPENROUTER_API_KEY")
     if not key:
         sys.exit("Error: OPENROUTER_API_KEY required")
-    client = OpenAI(api_key=key, base_url="https://openrouter.ai/api/v1")
 
-    books = [args.book] if args.book else all_book_slugs()
-    print(f"Model: {args.model}\nWorkers: {args.max_workers}\nBooks: {len(books)}\n")
+    jobs, outputs = plan_jobs(books, modes, args.force)
+    if cache:
+        jobs = replay_cached(jobs, args.model, cache)
+    items = pack_batches(jobs, args.batch_tokens) if args.batch_tokens > 0 else jobs
+    batches = sum(1 for item in items if isinstance(item, Batch))
+    print(f"Model: {args.model}\nWorkers: {args.max_workers}\nBooks: {len(books)}\n"
+          f"Modes: {', '.join(modes)}\nChapters to generate: {len(jobs)}\n"
+          f"Requests: {len(items)} ({batches} multi-chapter batches)\n")
 
-    if args.mode in ("headings", "both"):
-        print("--- HEADINGS ---")
-        total_new = total_kept = 0
-        for b in books:
-            nnew, nkept = process_book_headings(b, client, args.model, args.force, args.max_workers)
-            if nnew: print(f"  {b}: +{nnew} new, {nkept} kept")
-            total_new += nnew; total_kept += nkept
-        print(f"Total: {total_new} new chapters, {total_kept} kept.\n")
+    limiter = RateLimiter(args.rpm, args.tpm)
+    try:
+        if items:
+            if args.use_async:
+                client = AsyncOpenAI(api_key=key, base_url=LLM_BASE_URL)
+                asyncio.run(run_async(items, len(jobs), client, args.model, limiter, args.max_workers, cache))
+            else:
+                client = OpenAI(api_key=key, base_url=LLM_BASE_URL)
+                run_threaded(items, len(jobs), client, args.model, limiter, args.max_workers, cache)
+    finally:
+        # Fold whatever finished into the book files, including on Ctrl-C.
+        for output in outputs:
+            output.compact()
 
-    if args.mode in ("red-letter", "both"):
-        print("--- RED LETTER ---")
-        total_new = total_kept = 0
-        for b in books:
-            nnew, nkept = process_book_red_letter(b, client, args.model, args.force, args.max_workers)
-            if nnew: print(f"  {b}: +{nnew} new, {nkept} kept")
-            total_new += nnew; total_kept += nkept
-        print(f"Total: {total_new} new chapters, {total_kept} kept.")
+    if cache:
+        metrics.count("llm.cache_hits", cache.hits)
+        metrics.count("llm.cache_misses", cache.misses)
+        print(f"Cache: {cache.hits} hits, {cache.misses} misses\n")
+    print_totals(outputs, modes)
 
 
 if __name__ == "__main__":
-    main()
+    with metrics.run("generate_bible_overlays"):
+        main()
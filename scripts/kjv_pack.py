@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Pack the KJV (assets/data/Bible-kjv-master/*.json) into one binary file with
+an mmap-backed reader, so Python tooling gets verse text and chapter/verse
+counts without re-parsing 66 JSON files (~5 MB) on every run.
+
+Layout of .cache/kjv.pack (all integers little-endian):
+
+    magic b"KJVP" | u16 version | u16 reserved | u32 meta_len | u32 n_verses
+    meta            UTF-8 JSON: {"source": signature, "books": [{"slug", "name", "chapters": [verse counts]}]}
+    padding         to a 4-byte boundary
+    offsets         u32 * (n_verses + 1), byte offsets into the blob
+    blob            every verse's text, UTF-8, in canonical book/chapter/verse order
+
+Chapters and verses in the source are numbered 1..n without gaps, so a verse's
+position is its book's first verse + the chapter's first verse + (verse - 1);
+only the per-chapter verse counts need storing.
+
+Scripts open it with open_kjv(), which rebuilds a missing or stale pack
+(the meta's "source" is a hash of the source files) unless
+KJV_PACK_READONLY is set, as build.py does for the stages reading it.
+
+    python scripts/kjv_pack.py                 # (re)build the pack
+    python scripts/kjv_pack.py John 3 16       # look up a verse
+    python scripts/kjv_pack.py John 3 16 18    # ... or a range
+"""
+
+import os
+import sys
+import glob
+import json
+import mmap
+import struct
+import hashlib
+import tempfile
+
+KJV_DIR = os.path.join(os.path.dirname(__file__), "..", "assets", "data", "Bible-kjv-master")
+PACK_PATH = os.environ.get(
+    "KJV_PACK", os.path.normpath(os.path.join(os.path.dirname(__file__), "..", ".cache", "kjv.pack")))
+
+# Set by build.py for every stage: only its kjv-pack stage writes the pack, and
+# the stages reading it must not race to rebuild it.
+READONLY = os.environ.get("KJV_PACK_READONLY", "").lower() in ("1", "true", "yes")
+
+MAGIC = b"KJVP"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+
+
+def source_files(src_dir=KJV_DIR):
+    files = glob.glob(os.path.join(src_dir, "*.json"))
+    return sorted(f for f in files if os.path.basename(f) != "Books.json")
+
+
+def source_signature(src_dir=KJV_DIR):
+    """Content hash of the source files (Books.json too: it sets the order).
+
+    Not mtimes: a fresh checkout touches every file, which would make a pack
+    restored from cache look stale.
+    """
+    h = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(src_dir, "*.json"))):
+        h.update(os.path.basename(path).encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
+
+
+def canonical_order(src_dir=KJV_DIR):
+    """Book names in Bible order from the repo's Books.json index."""
+    path = os.path.join(src_dir, "Books.json")
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_pack(src_dir=KJV_DIR, out_path=PACK_PATH):
+    """Parse every book once and write the packed file atomically. Returns out_path."""
+    by_name = {}
+    for path in source_files(src_dir):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        slug = os.path.basename(path)[:-len(".json")]
+        by_name[data.get("book", slug)] = (slug, data)
+
+    order = [n for n in canonical_order(src_dir) if n in by_name]
+    order += sorted(n for n in by_name if n not in order)
+
+    books, blob, offsets = [], bytearray(), [0]
+    for name in order:
+        slug, data = by_name[name]
+        counts = []
+        for n, ch in enumerate(data.get("chapters", []), 1):
+            if str(ch.get("chapter")) != str(n):
+                raise ValueError(f"{slug}: chapter {ch.get('chapter')} out of sequence")
+            verses = ch.get("verses", [])
+            for m, v in enumerate(verses, 1):
+                if str(v.get("verse")) != str(m):
+                    raise ValueError(f"{slug} {n}: verse {v.get('verse')} out of sequence")
+                blob += v.get("text", "").encode("utf-8")
+                offsets.append(len(blob))
+            counts.append(len(verses))
+        books.append({"slug": slug, "name": name, "chapters": counts})
+
+    meta = json.dumps({"source": source_signature(src_dir), "books": books},
+                      ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    n_verses = len(offsets) - 1
+    head = HEADER.pack(MAGIC, VERSION, 0, len(meta), n_verses) + meta
+    head += b"\0" * (-len(head) % 4)
+
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    os.makedirs(out_dir, exist_ok=True)
+    # A private tmp file, so concurrent builders never write into each other's.
+    fd, tmp = tempfile.mkstemp(dir=out_dir, prefix=".kjv-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(head)
+            f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+            f.write(blob)
+        os.replace(tmp, out_path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return out_path
+
+
+class KJVPack:
+    """Read-only view over a packed KJV file.
+
+    `book` arguments accept either the file slug ("1Corinthians") or the
+    display name ("1 Corinthians"); chapter and verse numbers are 1-based
+    ints (or digit strings).
+    """
+
+    def __init__(self, path=PACK_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, meta_len, self.n_verses = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a v{VERSION} KJV pack")
+        meta = json.loads(self._mm[HEADER.size:HEADER.size + meta_len])
+        self.source = meta.get("source")
+        self._offsets_at = HEADER.size + meta_len
+        self._offsets_at += -self._offsets_at % 4
+        self._blob_at = self._offsets_at + 4 * (self.n_verses + 1)
+
+        self._books = meta["books"]
+        self._by_key = {}
+        self._chapter_starts = []
+        first = 0
+        for i, book in enumerate(self._books):
+            self._by_key[book["slug"]] = i
+            self._by_key[book["name"]] = i
+            starts = []
+            for count in book["chapters"]:
+                starts.append(first)
+                first += count
+            self._chapter_starts.append(starts)
+
+    def close(self):
+        self._mm.close()
+
+    # -- lookup helpers ------------------------------------------------
+
+    def _book(self, book):
+        try:
+            return self._by_key[book]
+        except KeyError:
+            raise KeyError(f"Unknown book: {book}") from None
+
+    def _chapter(self, book, chapter):
+        """(first verse index, verse count) for a chapter."""
+        b = self._book(book)
+        c = int(chapter)
+        counts = self._books[b]["chapters"]
+        if not 1 <= c <= len(counts):
+            raise KeyError(f"{book} has no chapter {chapter}")
+        return self._chapter_starts[b][c - 1], counts[c - 1]
+
+    def _offsets(self, first, count):
+        return struct.unpack_from(f"<{count + 1}I", self._mm, self._offsets_at + 4 * first)
+
+    def _text(self, start, end):
+        return self._mm[self._blob_at + start:self._blob_at + end].decode("utf-8")
+
+    # -- public API ----------------------------------------------------
+
+    def books(self):
+        """Book slugs in canonical order."""
+        return [b["slug"] for b in self._books]
+
+    def has_book(self, book):
+        return book in self._by_key
+
+    def book_name(self, book):
+        return self._books[self._book(book)]["name"]
+
+    def chapter_count(self, book):
+        return len(self._books[self._book(book)]["chapters"])
+
+    def verse_count(self, book, chapter):
+        return self._chapter(book, chapter)[1]
+
+    def verse(self, book, chapter, verse):
+        first, count = self._chapter(book, chapter)
+        v = int(verse)
+        if not 1 <= v <= count:
+            raise KeyError(f"{book} {chapter} has no verse {verse}")
+        start, end = self._offsets(first + v - 1, 1)
+        return self._text(start, end)
+
+    def verses(self, book, chapter, start=1, end=None):
+        """[(verse number, text)] for verses start..end (inclusive) of a chapter."""
+        first, count = self._chapter(book, chapter)
+        start = max(1, int(start))
+        end = count if end is None else min(count, int(end))
+        if start > end:
+            return []
+        offs = self._offsets(first + start - 1, end - start + 1)
+        # One slice + decode for the whole range, then split on the offsets.
+        raw = self._mm[self._blob_at + offs[0]:self._blob_at + offs[-1]]
+        base = offs[0]
+        return [(start + i, raw[offs[i] - base:offs[i + 1] - base].decode("utf-8"))
+                for i in range(len(offs) - 1)]
+
+    def chapter(self, book, chapter):
+        return self.verses(book, chapter)
+
+    def passage(self, book, chapter, start, end):
+        """Verses start..end joined with spaces."""
+        return " ".join(text for _, text in self.verses(book, chapter, start, end))
+
+    def book_dict(self, book):
+        """The book in the source JSON shape (what load_kjv_book used to return)."""
+        b = self._book(book)
+        return {
+            "book": self._books[b]["name"],
+            "chapters": [
+                {"chapter": str(c),
+                 "verses": [{"verse": str(n), "text": t} for n, t in self.verses(book, c)]}
+                for c in range(1, len(self._books[b]["chapters"]) + 1)
+            ],
+        }
+
+
+_PACK = None
+
+
+def open_kjv(path=PACK_PATH, src_dir=KJV_DIR):
+    """Shared KJVPack for this process, (re)building the pack when it's missing or stale.
+
+    With KJV_PACK_READONLY set, a missing or stale pack is an error instead.
+    """
+    global _PACK
+    if _PACK is not None:
+        return _PACK
+    pack = None
+    if os.path.exists(path):
+        try:
+            pack = KJVPack(path)
+        except ValueError:
+            pack = None
+        if pack is not None and os.path.isdir(src_dir) and pack.source != source_signature(src_dir):
+            pack.close()
+            pack = None
+    if pack is None:
+        if READONLY:
+            raise RuntimeError(f"{path} is missing or out of date with {os.path.normpath(src_dir)}; "
+                               f"run scripts/kjv_pack.py (build.py's kjv-pack stage) first")
+        build_pack(src_dir, path)
+        pack = KJVPack(path)
+    _PACK = pack
+    return pack
+
+
+def main():
+    args = sys.argv[1:]
+    if not args:
+        path = build_pack()
+        pack = KJVPack(path)
+        print(f"Packed {len(pack.books())} books, {pack.n_verses} verses into {path} "
+              f"({os.path.getsize(path) / 1e6:.1f} MB)")
+        return
+    pack = open_kjv()
+    book, chapter = args[0], args[1] if len(args) > 1 else None
+    if chapter is None:
+        print(f"{pack.book_name(book)}: {pack.chapter_count(book)} chapters")
+        return
+    start = args[2] if len(args) > 2 else 1
+    end = args[3] if len(args) > 3 else (start if len(args) > 2 else None)
+    for n, text in pack.verses(book, chapter, start, end):
+        print(f"{n}. {text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+On-disk cache of raw LLM responses for generate_bible_overlays.py.
+
+Rows are keyed by a hash of everything that determines the completion
+(model, system prompt, user prompt, max_tokens, temperature), so --force or a
+validator change replays cached text instead of paying for it again, and a
+prompt edit only misses for the chapters whose prompt actually changed. The
+raw text is stored (not the parsed/validated result), which is what lets
+--revalidate-only rerun extract_json + validate_* with zero API calls.
+
+Lives in .cache/ (gitignored) as a single SQLite file; safe to delete.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_PATH = os.environ.get(
+    "OVERLAY_CACHE",
+    os.path.join(os.path.dirname(__file__), "..", ".cache", "overlay_llm.sqlite"),
+)
+
+
+def cache_key(model, system, user, max_tokens, temperature):
+    payload = json.dumps([model, system, user, max_tokens, temperature], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path=DEFAULT_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        # Worker threads share the connection; the lock serializes access.
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with self.lock:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    label TEXT,
+                    raw TEXT NOT NULL,
+                    tokens INTEGER,
+                    created REAL NOT NULL
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS responses_model ON responses (model)")
+            self.conn.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT raw FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, model, raw, tokens=None, label=None):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, label, raw, tokens, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, label, raw, tokens, time.time()))
+            self.conn.commit()
+
+    def prune(self, model=None, older_than_days=None):
+        """Delete rows for `model` and/or older than N days. Returns rows removed."""
+        clauses, params = [], []
+        if model:
+            clauses.append("model = ?")
+            params.append(model)
+        if older_than_days is not None:
+            clauses.append("created < ?")
+            params.append(time.time() - older_than_days * 86400)
+        if not clauses:
+            return 0
+        with self.lock:
+            cur = self.conn.execute(f"DELETE FROM responses WHERE {' AND '.join(clauses)}", params)
+            self.conn.commit()
+        self.vacuum()
+        return cur.rowcount
+
+    def vacuum(self):
+        with self.lock:
+            self.conn.execute("VACUUM")
+
+    def stats(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT model, COUNT(*), COALESCE(SUM(tokens), 0) FROM responses GROUP BY model ORDER BY model"
+            ).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Run metrics for the data scripts: counters, timers and latency histograms,
+written as one JSON file per script run so a slow or flaky nightly refresh
+shows up as numbers rather than a hunch.
+
+A script wraps its entry point in `metrics.run()`; everything else records
+into the module-level collector (a locked dict update per event):
+
+    with metrics.run("fetch_bible_data"):
+        asyncio.run(main())
+
+    with metrics.timer("json.parse"):          # timer + histogram
+        data = response.json()
+    metrics.count("json.write.bytes", n)       # counter
+    metrics.observe("llm", latency, key=model) # a timing measured elsewhere
+
+Already instrumented: every AdaptiveFetcher request (pass
+`on_request=metrics.record_http`: latency per endpoint, status codes,
+retries, bytes), LLM calls in generate_bible_overlays.py (latency, prompt
+and completion tokens), and reference_format's JSON reads and writes.
+
+On exit the run writes {METRICS_DIR}/{script}.json (default
+_data/pipeline_metrics/; METRICS_NAME overrides the file name, which build.py
+sets to the stage name since two stages run fetch_bible_data.py):
+
+    {"script", "started", "duration", "status", "argv",
+     "counters": {"http.requests": 67, "http.status.304": 60, ...},
+     "timers": {"http": {"count", "total", "min", "max", "p50", "p95", "p99",
+                          "histogram": {"0.1": 12, "0.25": 40, ..., "inf": 0}},
+                ...},
+     "keys": {"http": {"/bible/books/Romans": {"count", "total", "max", "bytes"}}},
+     "profile": [[function, calls, total seconds, cumulative seconds], ...]}
+
+METRICS_PROFILE=1 also runs the script under cProfile: the hottest functions
+by cumulative time go into "profile" and the full stats are dumped to
+.cache/profiles/{script}.prof (`python -m pstats` or snakeviz reads it).
+build.py --profile sets it for every stage.
+"""
+
+import os
+import sys
+import time
+import pstats
+import bisect
+import cProfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(ROOT, "_data", "pipeline_metrics"))
+PROFILE_DIR = os.path.join(ROOT, ".cache", "profiles")
+PROFILE = os.environ.get("METRICS_PROFILE", "").lower() in ("1", "true", "yes")
+PROFILE_TOP_N = 25
+
+# Histogram upper bounds in seconds; the last bucket catches everything slower.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Collector:
+    """Thread-safe counters and timings for one run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.samples = {}
+        self.keys = {}
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds, key=None, nbytes=None):
+        with self.lock:
+            self.samples.setdefault(name, []).append(seconds)
+            if key is None:
+                return
+            entry = self.keys.setdefault(name, {}).setdefault(key, {"count": 0, "total": 0.0, "max": 0.0})
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            if nbytes is not None:
+                entry["bytes"] = entry.get("bytes", 0) + nbytes
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(sorted(self.counters.items()))
+            samples = {k: list(v) for k, v in self.samples.items()}
+            keys = {name: {k: dict(v) for k, v in entries.items()} for name, entries in self.keys.items()}
+        timers = {}
+        for name, values in sorted(samples.items()):
+            histogram = [0] * (len(BUCKETS) + 1)
+            for v in values:
+                histogram[bisect.bisect_left(BUCKETS, v)] += 1
+            timers[name] = {
+                "count": len(values),
+                "total": round(sum(values), 4),
+                "min": round(min(values), 4),
+                "max": round(max(values), 4),
+                "p50": round(percentile(values, 50), 4),
+                "p95": round(percentile(values, 95), 4),
+                "p99": round(percentile(values, 99), 4),
+                "histogram": {str(b): n for b, n in zip(BUCKETS + ("inf",), histogram)},
+            }
+        for entries in keys.values():
+            for entry in entries.values():
+                entry["total"] = round(entry["total"], 4)
+                entry["max"] = round(entry["max"], 4)
+        return counters, timers, {name: dict(sorted(v.items())) for name, v in sorted(keys.items())}
+
+
+_collector = Collector()
+
+
+def count(name, n=1):
+    _collector.count(name, n)
+
+
+def observe(name, seconds, key=None, nbytes=None):
+    _collector.observe(name, seconds, key, nbytes)
+
+
+@contextmanager
+def timer(name, key=None):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _collector.observe(name, time.perf_counter() - started, key)
+
+
+def record_http(record):
+    """AdaptiveFetcher on_request hook: one call per attempt."""
+    count("http.requests")
+    count(f"http.status.{record['status'] or record['error'] or 'none'}")
+    count("http.bytes", record["bytes"])
+    if record["attempt"] > 1:
+        count("http.retries")
+    path = urlsplit(record["url"]).path
+    observe("http", record["latency"], key=path, nbytes=record["bytes"])
+    observe("http.body", record["body"], key=path)
+
+
+def record_llm(latency, model, usage=None):
+    """One chat completion: latency plus the token counts the API reported."""
+    count("llm.calls")
+    observe("llm", latency, key=model)
+    if usage is not None:
+        count("llm.prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+        count("llm.completion_tokens", getattr(usage, "completion_tokens", 0) or 0)
+
+
+def _profile_summary(profiler, script):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{script}.prof")
+    profiler.dump_stats(path)
+    stats = pstats.Stats(profiler)
+    rows = sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:PROFILE_TOP_N]
+    return path, [[f"{os.path.relpath(f, ROOT) if f.startswith(ROOT) else f}:{line}({fn})",
+                   calls, round(tt, 4), round(ct, 4)]
+                  for (f, line, fn), (_, calls, tt, ct, _) in rows]
+
+
+def write(script, started, duration, status, profile=None):
+    from reference_format import write_json
+
+    counters, timers, keys = _collector.snapshot()
+    report = {
+        "script": script,
+        "started": started,
+        "duration": round(duration, 3),
+        "status": status,
+        "argv": sys.argv[1:],
+        "counters": counters,
+        "timers": timers,
+        "keys": keys,
+    }
+    if profile:
+        report["profile_file"] = os.path.relpath(profile[0], ROOT)
+        report["profile"] = profile[1]
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    write_json(os.path.join(METRICS_DIR, f"{script}.json"), report)
+    return report
+
+
+@contextmanager
+def run(script):
+    """Time the enclosed entry point and write its metrics file, however it exits."""
+    script = os.environ.get("METRICS_NAME") or script
+    started = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    t0 = time.perf_counter()
+    profiler = cProfile.Profile() if PROFILE else None
+    status = "ok"
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            status = f"exit {e.code}" if isinstance(e.code, int) else "exit 1"
+        raise
+    except BaseException as e:
+        status = f"error: {type(e).__name__}"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        duration = time.perf_counter() - t0
+        try:
+            write(script, started, duration, status, _profile_summary(profiler, script) if profiler else None)
+        except OSError as e:
+            print(f"Could not write run metrics for {script}: {e}")
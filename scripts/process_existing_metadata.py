@@ -2,91 +2,236 @@
 """
 Process existing metadata from the API sermons endpoint.
 This script extracts and formats metadata that already exists in the Pinecone database.
+
+Sermons are paged through with `limit`/`offset`, a few pages in flight at a
+time. The newest publish date seen so far is kept in sermons_sync.json as a
+high-water mark: it is sent as `since`, and when the API lists newest first,
+paging stops as soon as a page reaches sermons older than the mark. The
+file's last_sync only moves when anything else in it does, so a quiet day
+doesn't rewrite it. Results are merged into sermons.json by video_id, so
+fields the file already has survive, and the file is only ever replaced
+atomically. A failed fetch leaves the existing data alone.
+
+    python scripts/process_existing_metadata.py          # incremental
+    python scripts/process_existing_metadata.py --full   # page through everything
 """
 
 import os
+import sys
 import json
 import httpx
 import asyncio
+import argparse
 from pathlib import Path
-from datetime import datetime
-from typing import Dict, Any, List
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+
+import metrics
+from adaptive_fetch import AdaptiveFetcher
+from reference_format import write_json
 
 # Configuration
 API_URL = os.environ.get("API_URL", "https://sermon-search-api-8fok.onrender.com")
-OUTPUT_DIR = Path("_data/analytics")
+OUTPUT_DIR = Path(os.environ.get("ANALYTICS_OUTPUT_DIR", "_data/analytics"))
 SERMONS_FILE = OUTPUT_DIR / "sermons.json"
+SYNC_FILE = OUTPUT_DIR / "sermons_sync.json"
+PAGE_SIZE = int(os.environ.get("SERMONS_PAGE_SIZE", "100"))
+# Pages requested per round; the fetcher's adaptive window still bounds what
+# is actually in flight.
+PAGE_CONCURRENCY = int(os.environ.get("SERMONS_PAGE_CONCURRENCY", "4"))
+
+DEFAULT_CHANNEL = "Fellowship Church"
+
+
+def date_key(value) -> str:
+    """Comparable YYYYMMDD string from an int (20250512) or ISO date, or ''."""
+    digits = "".join(ch for ch in str(value or "") if ch.isdigit())
+    return digits[:8]
+
+
+def load_json(path: Path, default):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Ignoring unreadable {path}: {e}")
+        return default
 
-async def fetch_sermon_metadata_from_api():
+
+def sermon_fields(sermon: Dict[str, Any]) -> Dict[str, Any]:
+    """The metadata fields the API actually returned (no placeholders)."""
+    return {k: sermon[k] for k in ("title", "publish_date", "channel", "url")
+            if sermon.get(k) not in (None, "")}
+
+
+async def fetch_page(fetcher: AdaptiveFetcher, offset: int, since: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+    """One page of sermons, or None when the request failed."""
+    params = {"limit": PAGE_SIZE, "offset": offset}
+    if since:
+        params["since"] = since
+    response = await fetcher.get(str(httpx.URL(f"{API_URL}/sermons", params=params)))
+    if response is None or response.status_code >= 400:
+        status = response.status_code if response is not None else "no response"
+        print(f"Sermons page at offset {offset} failed ({status})")
+        return None
+    try:
+        with metrics.timer("json.parse"):
+            data = response.json()
+    except ValueError as e:
+        print(f"Sermons page at offset {offset} is not JSON: {e}")
+        return None
+    return data.get("sermons") or []
+
+
+async def fetch_sermon_metadata_from_api(high_water_mark: Optional[str] = None):
     """
     Fetch sermon metadata from the existing API.
+
+    Returns (sermons by video_id, complete). `complete` is False when any page
+    failed, in which case the caller should merge what arrived but not move
+    the high-water mark past it.
     """
-    try:
-        print(f"Fetching sermon metadata from {API_URL}/sermons")
-        
-        async with httpx.AsyncClient() as client:
-            # Fetch the list of all sermons
-            response = await client.get(f"{API_URL}/sermons", timeout=30)
-            response.raise_for_status()
-            sermons_data = response.json()
-            
-            if not sermons_data.get("sermons"):
-                print("No sermons found in API response")
-                return {}
-                
-            sermon_list = sermons_data.get("sermons", [])
-            print(f"Found {len(sermon_list)} sermons in API response")
-            
-            # Process each sermon to get full metadata
-            sermon_details = {}
-            
-            for sermon in sermon_list:
-                video_id = sermon.get("video_id")
-                if not video_id:
-                    continue
-                    
-                # Extract existing metadata
-                sermon_details[video_id] = {
-                    "video_id": video_id,
-                    "title": sermon.get("title", f"Sermon {video_id}"),
-                    "publish_date": sermon.get("publish_date", ""),
-                    "channel": sermon.get("channel", "Fellowship Church"),
-                    "url": sermon.get("url", f"https://www.youtube.com/watch?v={video_id}")
-                }
-                
-                # You could fetch more details if needed
-                # For example, if the API has an endpoint for individual sermon details
-                # This depends on what data is already in your Pinecone database
-                
-            return sermon_details
-            
-    except Exception as e:
-        print(f"Error fetching sermon metadata from API: {e}")
-        return {}
+    print(f"Fetching sermon metadata from {API_URL}/sermons "
+          f"({'since ' + high_water_mark if high_water_mark else 'full sync'})")
+    sermons: Dict[str, Dict[str, Any]] = {}
+    complete = True
+    newest_first = True
+    last_date = None
+
+    async with httpx.AsyncClient() as client:
+        # The fetcher retries through Render cold starts (502s, slow first
+        # responses) with backoff and adapts how many pages are in flight.
+        fetcher = AdaptiveFetcher(client, timeout=30, on_request=metrics.record_http)
+        offset, wave = 0, 1  # first round learns whether the API paginates at all
+        while True:
+            offsets = [offset + i * PAGE_SIZE for i in range(wave)]
+            pages = await asyncio.gather(*(fetch_page(fetcher, o, high_water_mark) for o in offsets))
+
+            done = False
+            reached_mark = False
+            for page in pages:
+                if page is None:
+                    complete = False
+                    done = True
+                    break
+                new_ids = 0
+                for sermon in page:
+                    video_id = sermon.get("video_id")
+                    if not video_id:
+                        continue
+                    if video_id not in sermons:
+                        new_ids += 1
+                    sermons[video_id] = sermon
+                    key = date_key(sermon.get("publish_date"))
+                    if key:
+                        if last_date is not None and key > last_date:
+                            newest_first = False
+                        last_date = key
+                        if high_water_mark and key < high_water_mark:
+                            reached_mark = True
+                if len(page) > PAGE_SIZE:
+                    # The API ignored limit/offset and sent everything.
+                    done = True
+                if len(page) < PAGE_SIZE or new_ids == 0:
+                    done = True
+                if done:
+                    break
+            # Past the mark on a newest-first listing: everything further is known.
+            if done or (reached_mark and newest_first):
+                break
+            offset += wave * PAGE_SIZE
+            wave = PAGE_CONCURRENCY
+        fetcher.print_summary()
+
+    if high_water_mark:
+        sermons = {vid: s for vid, s in sermons.items()
+                   if date_key(s.get("publish_date")) >= high_water_mark
+                   or not date_key(s.get("publish_date"))}
+    print(f"Found {len(sermons)} {'new or updated ' if high_water_mark else ''}sermons "
+          f"in API response{'' if complete else ' (incomplete)'}")
+    return sermons, complete
+
+
+def merge_sermons(existing: Dict[str, Dict[str, Any]], fetched: Dict[str, Dict[str, Any]]):
+    """Merge fetched sermons into `existing` by video_id. Returns (added, updated)."""
+    added = updated = 0
+    for video_id, sermon in fetched.items():
+        fields = sermon_fields(sermon)
+        current = existing.get(video_id)
+        if current is None:
+            existing[video_id] = {
+                "video_id": video_id,
+                "title": fields.get("title", f"Sermon {video_id}"),
+                "publish_date": fields.get("publish_date", ""),
+                "channel": fields.get("channel", DEFAULT_CHANNEL),
+                "url": fields.get("url", f"https://www.youtube.com/watch?v={video_id}"),
+            }
+            added += 1
+            continue
+        # Only overwrite with values the API actually sent; anything the file
+        # already has (including fields added by other tools) is kept.
+        changed = {k: v for k, v in fields.items() if current.get(k) != v}
+        if changed:
+            current.update(changed)
+            updated += 1
+    return added, updated
+
 
-async def process_sermon_metadata():
+async def process_sermon_metadata(full: bool = False):
     """
     Process sermon metadata from the API and save it for analytics.
     """
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    existing = load_json(SERMONS_FILE, {})
+    sync = load_json(SYNC_FILE, {})
+    # Without existing data there's nothing to be incremental against.
+    high_water_mark = None if full or not existing else sync.get("high_water_mark")
+
     try:
-        # Ensure output directory exists
-        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-        
-        # Fetch metadata from API
-        sermon_details = await fetch_sermon_metadata_from_api()
-        
-        if not sermon_details:
-            print("No sermon metadata found. Using empty dictionary.")
-            sermon_details = {}
-        
-        # Save sermon metadata
-        with open(SERMONS_FILE, 'w') as f:
-            json.dump(sermon_details, f, indent=2)
-            
-        print(f"Saved metadata for {len(sermon_details)} sermons to {SERMONS_FILE}")
-        
+        fetched, complete = await fetch_sermon_metadata_from_api(high_water_mark)
     except Exception as e:
-        print(f"Error processing sermon metadata: {e}")
+        print(f"Error fetching sermon metadata from API: {e}")
+        return False
+
+    if not fetched and not complete:
+        print(f"No sermon metadata fetched; keeping {len(existing)} sermons in {SERMONS_FILE}")
+        return False
+
+    added, updated = merge_sermons(existing, fetched)
+    if existing:
+        write_json(str(SERMONS_FILE), existing)
+    print(f"Saved metadata for {len(existing)} sermons to {SERMONS_FILE} "
+          f"({added} added, {updated} updated)")
+
+    dates = [date_key(s.get("publish_date")) for s in existing.values()]
+    newest = max((d for d in dates if d), default=None)
+    state = {
+        # A partial run only advances the mark as far as the data it replaced
+        # was already complete, so the next run re-covers the gap.
+        "high_water_mark": newest if complete else (high_water_mark or None),
+        "last_sync": sync.get("last_sync"),
+        "mode": "full" if high_water_mark is None else "incremental",
+        "complete": complete,
+        "sermons": len(existing),
+    }
+    # The file is committed with _data/analytics: last_sync only moves when
+    # the rest does, so a quiet day leaves it byte-identical.
+    if state != sync or not state["last_sync"]:
+        state["last_sync"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    write_json(str(SYNC_FILE), state)
+    return complete
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync sermon metadata from the API into _data/analytics")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the high-water mark and page through every sermon")
+    args = parser.parse_args()
+    if not asyncio.run(process_sermon_metadata(full=args.full)):
+        sys.exit(1)
+
 
 if __name__ == "__main__":
-    asyncio.run(process_sermon_metadata())
\ No newline at end of file
+    with metrics.run("process_existing_metadata"):
+        main()
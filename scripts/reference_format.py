@@ -0,0 +1,368 @@
+"""
+Compact encoding for the Bible reference files under assets/data/bible/books.
+
+The API returns every reference row with its sermon title, YouTube URL,
+summary model and book repeated, and lists every row twice (once grouped under
+`chapters`, once flat under `references`). The compact form stores each sermon
+and model once in a lookup table and keeps each chapter's rows as parallel
+column arrays:
+
+    {
+      "schema": "fdm-refs", "version": 1,
+      "book": "Acts", "total_references": 2226,
+      "ref_book": "Acts",     # the rows' own `book` value ("1 Peter" for 1_Peter.json)
+      "sermons": [["07naoQP9rPI", "\"The Church Of The Laodiceans\" ..."], ...],
+      "models": ["anthropic/claude-sonnet-4.6"],
+      "chapters": {
+        "12": {
+          "s": [0, ...],        # index into `sermons`
+          "v": [null, ...],     # verse (int, null, or a range string like "1-4")
+          "t": [0, ...],        # start_time in centiseconds
+          "d": [7020, ...],     # end_time - start_time in centiseconds
+          "i": [1, ...],        # is_implicit as 0/1
+          "r": [...], "c": [...], "p": [...],   # reference_text, context, point_summary
+          "m": [0, ...],        # index into `models`, -1 when absent
+          "u": [null, ...],     # only present when a row's url isn't the default watch URL
+          "b": [...]            # only present when rows disagree on `book`
+        }
+      }
+    }
+
+Per-chapter shards use the same schema with a single chapter plus a top-level
+`chapter`. `decode_book` turns either form back into the API's legacy shape
+(`references` is rebuilt in chapter order) and passes legacy payloads through
+untouched, so readers never need to know which one is on disk. The JavaScript
+decoder in reference-viewer.js mirrors this file; bump SCHEMA_VERSION in both
+when the layout changes.
+"""
+
+import os
+import json
+import time
+import filecmp
+
+import metrics
+from book_stream import BookParser
+
+# Compact files are minified and lead with their schema; legacy files are pretty-printed.
+COMPACT_PREFIX = b'{"schema":'
+READ_CHUNK = 64 * 1024
+SCHEMA_NAME = "fdm-refs"
+SCHEMA_VERSION = 1
+
+COMPACT_SEPARATORS = (",", ":")
+
+
+def default_url(video_id, start_time):
+    return f"https://www.youtube.com/watch?v={video_id}&t={int(start_time or 0)}"
+
+
+def to_centis(seconds):
+    return int(round((seconds or 0) * 100))
+
+
+def is_compact(data):
+    return isinstance(data, dict) and data.get("schema") == SCHEMA_NAME
+
+
+class CompactTables:
+    """The compact schema's sermon and model lookup tables, filled in row order."""
+
+    def __init__(self):
+        self.sermons, self.sermon_index = [], {}
+        self.models, self.model_index = [], {}
+
+    def add(self, ref):
+        """Register a row's sermon and model; returns (sermon index, model index or -1)."""
+        video_id = ref.get("video_id") or ""
+        if video_id not in self.sermon_index:
+            self.sermon_index[video_id] = len(self.sermons)
+            self.sermons.append([video_id, ref.get("sermon_title") or ""])
+        model = ref.get("point_summary_model")
+        if model and model not in self.model_index:
+            self.model_index[model] = len(self.models)
+            self.models.append(model)
+        return self.sermon_index[video_id], (self.model_index[model] if model else -1)
+
+
+def encode_rows(refs, tables, ref_book):
+    """Column arrays for one chapter's rows; sermons and models index into `tables`."""
+    cols = {k: [] for k in ("s", "v", "t", "d", "i", "r", "c", "p", "m", "u", "b")}
+    for ref in refs:
+        sermon_idx, model_idx = tables.add(ref)
+        video_id = ref.get("video_id") or ""
+        start = ref.get("start_time") or 0
+        end = ref.get("end_time")
+        cols["s"].append(sermon_idx)
+        cols["v"].append(ref.get("verse"))
+        start_centis = to_centis(start)
+        cols["t"].append(start_centis)
+        cols["d"].append(to_centis(end - start) if end is not None else None)
+        cols["i"].append(1 if ref.get("is_implicit") else 0)
+        cols["r"].append(ref.get("reference_text") or "")
+        cols["c"].append(ref.get("context") or "")
+        cols["p"].append(ref.get("point_summary") or "")
+        cols["m"].append(model_idx)
+        url = ref.get("url")
+        # Compare against what the decoder will rebuild from the rounded start.
+        cols["u"].append(url if url and url != default_url(video_id, start_centis / 100) else None)
+        cols["b"].append(ref.get("book"))
+    if not any(cols["u"]):
+        del cols["u"]
+    if ref_book is not None or not refs:
+        del cols["b"]
+    return cols
+
+
+def compact_header(data, tables, ref_book):
+    """Everything in an encoded book except `chapters`, in the schema's key order."""
+    return {
+        "schema": SCHEMA_NAME,
+        "version": SCHEMA_VERSION,
+        "book": data.get("book"),
+        "total_references": data.get("total_references", 0),
+        "ref_book": ref_book,
+        "sermons": tables.sermons,
+        "models": tables.models,
+    }
+
+
+def encode_book(data, chapter=None):
+    """Encode a legacy book payload (or a single chapter of it) into the compact schema."""
+    chapters = data.get("chapters") or {}
+    if chapter is not None:
+        chapters = {str(chapter): chapters.get(str(chapter), [])}
+
+    row_books = {ref.get("book") for refs in chapters.values() for ref in refs}
+    ref_book = row_books.pop() if len(row_books) == 1 else None
+    tables = CompactTables()
+    out_chapters = {key: encode_rows(refs, tables, ref_book) for key, refs in chapters.items()}
+
+    encoded = compact_header(data, tables, ref_book)
+    encoded["chapters"] = out_chapters
+    if chapter is not None:
+        encoded["chapter"] = int(chapter)
+    return encoded
+
+
+def decode_chapter(encoded, key):
+    """Rebuild the legacy reference rows for one chapter of a compact payload."""
+    cols = encoded["chapters"][key]
+    sermons = encoded.get("sermons") or []
+    models = encoded.get("models") or []
+    ref_book = encoded.get("ref_book")
+    chapter = int(key) if str(key).isdigit() else None
+    urls = cols.get("u")
+    books = cols.get("b")
+    rows = []
+    for n, sermon_idx in enumerate(cols["s"]):
+        video_id, title = sermons[sermon_idx]
+        start = cols["t"][n] / 100
+        duration = cols["d"][n]
+        model_idx = cols["m"][n]
+        rows.append({
+            "book": books[n] if books else ref_book,
+            "chapter": chapter,
+            "verse": cols["v"][n],
+            "reference_text": cols["r"][n],
+            "context": cols["c"][n],
+            "is_implicit": bool(cols["i"][n]),
+            "video_id": video_id,
+            "start_time": start,
+            "end_time": (cols["t"][n] + duration) / 100 if duration is not None else None,
+            "point_summary": cols["p"][n],
+            "point_summary_model": models[model_idx] if model_idx >= 0 else None,
+            "sermon_title": title,
+            "url": (urls and urls[n]) or default_url(video_id, start),
+        })
+    return rows
+
+
+def decode_book(data):
+    """Return the legacy book shape for either a compact or a legacy payload."""
+    if not is_compact(data):
+        return data
+    version = data.get("version")
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported {SCHEMA_NAME} schema version: {version}")
+    chapters = {key: decode_chapter(data, key) for key in data.get("chapters", {})}
+    decoded = {
+        "book": data.get("book"),
+        "total_references": data.get("total_references", 0),
+        "chapters": chapters,
+        "references": [ref for refs in chapters.values() for ref in refs],
+    }
+    if "chapter" in data:
+        decoded["chapter"] = data["chapter"]
+    return decoded
+
+
+def chapter_columns(data):
+    """{chapter key: (video ids, verses, start times in seconds)} for either format.
+
+    Reads the compact schema's column arrays directly instead of rebuilding
+    row dicts, for callers that only need these three fields of every row.
+    """
+    if not is_compact(data):
+        return {key: ([r.get("video_id") for r in refs], [r.get("verse") for r in refs],
+                      [r.get("start_time") or 0 for r in refs])
+                for key, refs in (data.get("chapters") or {}).items()}
+    sermons = data.get("sermons") or []
+    return {key: ([sermons[i][0] for i in cols["s"]], cols["v"], [t / 100 for t in cols["t"]])
+            for key, cols in (data.get("chapters") or {}).items()}
+
+
+class _ColumnCollector:
+    """BookParser handler gathering chapter_columns()' fields one chapter at a time."""
+
+    def __init__(self):
+        self.ready = []
+        self.columns = None
+
+    def open_chapter(self, key):
+        self.columns = ([], [], [])
+
+    def row(self, chapter, row, text):
+        # The flat "references" list repeats the chapter rows.
+        if chapter is not None:
+            self.columns[0].append(row.get("video_id"))
+            self.columns[1].append(row.get("verse"))
+            self.columns[2].append(row.get("start_time") or 0)
+
+    def close_chapter(self, key):
+        self.ready.append((key, self.columns))
+        self.columns = None
+
+    def field(self, key, value):
+        pass
+
+    def open_group(self, key, kind):
+        pass
+
+    def close_group(self, key, kind):
+        pass
+
+    def end(self):
+        pass
+
+
+def iter_chapter_columns(path):
+    """chapter_columns() of a book file on disk, as (key, columns) pairs.
+
+    Legacy files are streamed through BookParser, so only one chapter's rows
+    are ever decoded at once; compact files are small and read whole.
+    """
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        chunk = f.read(READ_CHUNK)
+        if chunk.lstrip().startswith(COMPACT_PREFIX):
+            data = json.loads(chunk + f.read())
+            metrics.observe("json.read", time.perf_counter() - started)
+            yield from chapter_columns(data).items()
+            return
+        collector = _ColumnCollector()
+        parser = BookParser(collector)
+        elapsed = 0.0
+        while chunk:
+            parser.feed(chunk)
+            elapsed += time.perf_counter() - started
+            yield from collector.ready
+            collector.ready.clear()
+            chunk = f.read(READ_CHUNK)
+            started = time.perf_counter()
+        parser.close()
+        metrics.observe("json.read", elapsed + time.perf_counter() - started)
+        yield from collector.ready
+
+
+def load_book(path):
+    """Read a book (or shard) file from disk in the legacy shape, whichever format it uses."""
+    with metrics.timer("json.read"), open(path, encoding="utf-8") as f:
+        return decode_book(json.load(f))
+
+
+def dump_json(data, f, compact=False):
+    """json.dump with the repo's pretty style, or minified for the compact format."""
+    if compact:
+        json.dump(data, f, ensure_ascii=False, separators=COMPACT_SEPARATORS)
+    else:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+class AtomicFile:
+    """Text file written to `path`.tmp and moved over `path` on close, unless identical.
+
+    For output too large to build as one string (write_json's job otherwise):
+
+        with AtomicFile(path) as out:
+            out.write(...)
+        out.changed   # False when the old file already held these bytes
+
+    An exception inside the block discards the tmp file; so does discard().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp = path + ".tmp"
+        self.changed = False
+        self.f = open(self.tmp, "w", encoding="utf-8")
+
+    def write(self, text):
+        self.f.write(text)
+
+    def discard(self):
+        if not self.f.closed:
+            self.f.close()
+        if os.path.exists(self.tmp):
+            os.remove(self.tmp)
+
+    def close(self):
+        with metrics.timer("json.write"):
+            self.f.close()
+            size = os.path.getsize(self.tmp)
+            if os.path.exists(self.path) and filecmp.cmp(self.tmp, self.path, shallow=False):
+                os.remove(self.tmp)
+                metrics.count("json.write.unchanged")
+                return False
+            os.replace(self.tmp, self.path)
+        metrics.count("json.write.files")
+        metrics.count("json.write.bytes", size)
+        self.changed = True
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def write_json(path, data, compact=False):
+    """Atomically write `data` as JSON unless the file already holds identical bytes.
+
+    Returns True when the file was (re)written. Skipping byte-identical output
+    keeps mtimes stable and the daily `git diff --staged` limited to real changes.
+    """
+    with metrics.timer("json.write"):
+        if compact:
+            text = json.dumps(data, ensure_ascii=False, separators=COMPACT_SEPARATORS)
+        else:
+            text = json.dumps(data, ensure_ascii=False, indent=2)
+        payload = text.encode("utf-8")
+        try:
+            with open(path, "rb") as f:
+                if f.read() == payload:
+                    metrics.count("json.write.unchanged")
+                    return False
+        except FileNotFoundError:
+            pass
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+    metrics.count("json.write.files")
+    metrics.count("json.write.bytes", len(payload))
+    return True
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Snapshot every transcript listed in sermons_catalog.json into static files:
+
+    assets/data/transcripts/{video_id}.json   the API's /transcript/{id} payload, minified
+    assets/data/transcripts/_sync.json        per-id ETag, body hash and catalog-entry hash
+    .cache/transcripts/checked.json           when each missing id was last asked for
+
+The transcript page, the reference viewer's sermon cards and the chat's
+sources panel read these first (assets/js/sermon-data.js) and only fall back
+to the Render API when a snapshot is missing, so opening a transcript is a
+static file fetch instead of a wait on a cold start.
+
+Only new video ids, ids whose catalog entry changed, and (with --revalidate)
+conditional re-checks of everything are requested; the adaptive fetcher
+bounds how many are in flight. Ids the API 404s are remembered and retried
+after MISSING_RETRY_DAYS. _sync.json is committed, so it holds no timestamps:
+a day with no new transcripts leaves it byte-identical, and the retry clock
+lives in .cache/ (kept between workflow runs; losing it just retries the
+missing ids once more). _sync.json starts with an underscore so Jekyll
+doesn't publish it.
+
+    python scripts/sync_transcripts.py
+    python scripts/sync_transcripts.py --revalidate   # conditional GET for every snapshot
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import asyncio
+import hashlib
+import argparse
+
+import httpx
+
+import metrics
+from adaptive_fetch import AdaptiveFetcher
+from reference_format import write_json
+
+API_URL = os.environ.get("API_URL", "https://sermon-search-api-8fok.onrender.com")
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), "..", "assets", "data", "sermons_catalog.json")
+OUTPUT_DIR = os.environ.get(
+    "TRANSCRIPTS_DIR", os.path.join(os.path.dirname(__file__), "..", "assets", "data", "transcripts"))
+SYNC_NAME = "_sync.json"
+CHECKS_PATH = os.environ.get("TRANSCRIPT_CHECKS", os.path.join(
+    os.path.dirname(__file__), "..", ".cache", "transcripts", "checked.json"))
+CONCURRENCY = int(os.environ.get("TRANSCRIPT_CONCURRENCY", "4"))
+MAX_CONCURRENCY = int(os.environ.get("TRANSCRIPT_MAX_CONCURRENCY", "8"))
+MISSING_RETRY_DAYS = float(os.environ.get("TRANSCRIPT_MISSING_RETRY_DAYS", "3"))
+TIME_KEYS = ("start_time", "end_time", "start", "end")
+
+
+def entry_hash(entry):
+    return hashlib.sha256(json.dumps(entry, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def compact_transcript(data):
+    """Same shape as the API payload; segment times rounded to centiseconds."""
+    for segment in data.get("segments") or []:
+        for key in TIME_KEYS:
+            if isinstance(segment.get(key), float):
+                segment[key] = round(segment[key], 2)
+    return data
+
+
+def snapshot_path(video_id):
+    return os.path.join(OUTPUT_DIR, f"{video_id}.json")
+
+
+def load_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def load_sync():
+    """(_sync.json records, {missing video_id: last checked})."""
+    sync = load_json(os.path.join(OUTPUT_DIR, SYNC_NAME))
+    checks = load_json(CHECKS_PATH)
+    # Older _sync.json files kept the check time in each record.
+    for video_id, record in sync.items():
+        checked = record.pop("checked", None)
+        if record.get("missing") and checked:
+            checks.setdefault(video_id, checked)
+    return sync, checks
+
+
+def plan(catalog, sync, checks, revalidate):
+    """Video ids to request: new, catalog entry changed, missing retry due, or all with --revalidate."""
+    now = time.time()
+    todo = []
+    for entry in catalog:
+        video_id = entry["video_id"]
+        record = sync.get(video_id)
+        if record is None:
+            todo.append(video_id)
+        elif record.get("missing"):
+            if now - checks.get(video_id, 0) >= MISSING_RETRY_DAYS * 86400:
+                todo.append(video_id)
+        elif (revalidate or record.get("entry") != entry_hash(entry)
+              or not os.path.exists(snapshot_path(video_id))):
+            todo.append(video_id)
+    return todo
+
+
+async def sync_one(fetcher, video_id, entry, sync, checks):
+    """Returns 'saved', 'unchanged', 'missing' or 'failed'."""
+    record = sync.get(video_id) or {}
+    headers = {}
+    if record.get("etag") and os.path.exists(snapshot_path(video_id)):
+        headers["If-None-Match"] = record["etag"]
+    response = await fetcher.get(f"{API_URL}/transcript/{video_id}", headers=headers)
+    if response is None:
+        return "failed"
+    if response.status_code == 304:
+        record["entry"] = entry_hash(entry)
+        sync[video_id] = record
+        return "unchanged"
+    if response.status_code == 404:
+        sync[video_id] = {"missing": True}
+        checks[video_id] = int(time.time())
+        return "missing"
+    if response.status_code >= 400:
+        print(f"Transcript {video_id}: HTTP {response.status_code}")
+        return "failed"
+    try:
+        with metrics.timer("json.parse"):
+            data = compact_transcript(response.json())
+    except ValueError as e:
+        print(f"Transcript {video_id}: bad JSON ({e})")
+        return "failed"
+    if not data.get("segments"):
+        # Same as a 404 for our purposes: nothing worth snapshotting yet.
+        sync[video_id] = {"missing": True}
+        checks[video_id] = int(time.time())
+        return "missing"
+    changed = write_json(snapshot_path(video_id), data, compact=True)
+    sync[video_id] = {
+        "etag": response.headers.get("etag"),
+        "entry": entry_hash(entry),
+        "hash": hashlib.sha256(response.content).hexdigest()[:16],
+    }
+    return "saved" if changed else "unchanged"
+
+
+async def sync_transcripts(revalidate=False):
+    with open(CATALOG_PATH, encoding="utf-8") as f:
+        catalog = [e for e in json.load(f) if e.get("video_id")]
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    sync, checks = load_sync()
+    entries = {e["video_id"]: e for e in catalog}
+    todo = plan(catalog, sync, checks, revalidate)
+    print(f"Transcripts: {len(catalog)} in catalog, {len(todo)} to request")
+
+    results = {}
+    if todo:
+        async with httpx.AsyncClient() as client:
+            fetcher = AdaptiveFetcher(client, initial=CONCURRENCY, max_window=MAX_CONCURRENCY, timeout=60,
+                                      on_request=metrics.record_http)
+            statuses = await asyncio.gather(*(sync_one(fetcher, v, entries[v], sync, checks) for v in todo))
+            fetcher.print_summary()
+        for status in statuses:
+            results[status] = results.get(status, 0) + 1
+            metrics.count(f"transcripts.{status}")
+
+    # Drop snapshots (and sync records) for sermons no longer in the catalog.
+    removed = 0
+    for path in glob.glob(os.path.join(OUTPUT_DIR, "*.json")):
+        video_id = os.path.basename(path)[:-len(".json")]
+        if video_id != SYNC_NAME[:-len(".json")] and video_id not in entries:
+            os.remove(path)
+            removed += 1
+    sync = {k: v for k, v in sync.items() if k in entries}
+    write_json(os.path.join(OUTPUT_DIR, SYNC_NAME), dict(sorted(sync.items())), compact=True)
+    os.makedirs(os.path.dirname(CHECKS_PATH), exist_ok=True)
+    write_json(CHECKS_PATH, {k: v for k, v in sorted(checks.items()) if sync.get(k, {}).get("missing")},
+               compact=True)
+
+    print("Transcripts: " + ", ".join(f"{n} {s}" for s, n in sorted(results.items()))
+          + (", " if results else "") + f"{removed} removed")
+    return results.get("failed", 0) == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot sermon transcripts into assets/data/transcripts/")
+    parser.add_argument("--revalidate", action="store_true",
+                        help="Send a conditional request for every snapshot, not just new/changed ids")
+    args = parser.parse_args()
+    if not asyncio.run(sync_transcripts(args.revalidate)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    with metrics.run("sync_transcripts"):
+        main()
@@ -0,0 +1,149 @@
+/* Service worker: cache-first static data, invalidated by content hash.
+   scripts/build_asset_manifest.py writes /assets/data-manifest.json mapping
+   every file under /assets/data/ to a hash of its contents. A data request is
+   answered from Cache Storage when we hold the file at its current hash, and
+   only goes to the network when the hash changed (or it was never fetched).
+   The manifest itself is rechecked in the background, so returning readers
+   get books, chapters, KJV text and overlays with no network round trip, and
+   a daily data refresh re-downloads exactly the files it changed.
+   Pages, scripts and styles are left to the browser; only data is cached. */
+
+'use strict';
+
+var DATA_CACHE = 'fdm-data-v1';
+var MANIFEST_URL = '/assets/data-manifest.json';
+var DATA_PREFIX = '/assets/data/';
+// How often (at most) a running worker rechecks the manifest.
+var MANIFEST_TTL_MS = 10 * 60 * 1000;
+
+var manifest = null;          // {hash, files: {relative path: hash}}
+var manifestCheckedAt = 0;
+var manifestPromise = null;
+
+function cacheKey(path, hash) {
+  return path + '?h=' + hash;
+}
+
+function storeManifest(next) {
+  return caches.open(DATA_CACHE).then(function (cache) {
+    return cache.put(MANIFEST_URL, new Response(JSON.stringify(next), {
+      headers: { 'Content-Type': 'application/json' }
+    }));
+  });
+}
+
+// Drop cached files whose hash no longer matches (or that left the manifest).
+function purgeStale(next) {
+  return caches.open(DATA_CACHE).then(function (cache) {
+    return cache.keys().then(function (requests) {
+      return Promise.all(requests.map(function (req) {
+        var url = new URL(req.url);
+        if (url.pathname === MANIFEST_URL) return null;
+        var rel = url.pathname.slice(DATA_PREFIX.length);
+        var hash = url.searchParams.get('h');
+        if (hash && next.files[rel] === hash) return null;
+        return cache.delete(req);
+      }));
+    });
+  });
+}
+
+function refreshManifest() {
+  manifestCheckedAt = Date.now();
+  return fetch(MANIFEST_URL, { cache: 'no-cache' })
+    .then(function (r) {
+      if (!r.ok) throw new Error('manifest HTTP ' + r.status);
+      return r.json();
+    })
+    .then(function (next) {
+      if (manifest && manifest.hash === next.hash) return manifest;
+      manifest = next;
+      return Promise.all([storeManifest(next), purgeStale(next)]).then(function () { return next; });
+    })
+    .catch(function () { return manifest; });
+}
+
+// The manifest we have (memory, then Cache Storage), refreshed in the
+// background when it's older than the TTL. Only the very first visit waits
+// on the network for it.
+function getManifest() {
+  if (manifest) {
+    if (Date.now() - manifestCheckedAt > MANIFEST_TTL_MS) refreshManifest();
+    return Promise.resolve(manifest);
+  }
+  if (!manifestPromise) {
+    manifestPromise = caches.open(DATA_CACHE)
+      .then(function (cache) { return cache.match(MANIFEST_URL); })
+      .then(function (hit) {
+        if (!hit) return refreshManifest();
+        return hit.json().then(function (stored) {
+          manifest = stored;
+          refreshManifest();
+          return manifest;
+        });
+      })
+      .then(function (m) {
+        manifestPromise = null;
+        return m;
+      });
+  }
+  return manifestPromise;
+}
+
+function handleData(request) {
+  var path = new URL(request.url).pathname;
+  return Promise.all([getManifest(), caches.open(DATA_CACHE)]).then(function (results) {
+    var current = results[0];
+    var cache = results[1];
+    var hash = current && current.files[path.slice(DATA_PREFIX.length)];
+
+    if (!hash) {
+      // Not in the manifest (new since the last build, or no manifest yet):
+      // network, with whatever we last had as the offline fallback.
+      return fetch(request).then(function (resp) {
+        if (resp.ok) cache.put(path, resp.clone());
+        return resp;
+      }, function (err) {
+        return cache.match(path).then(function (hit) {
+          if (hit) return hit;
+          throw err;
+        });
+      });
+    }
+
+    var key = cacheKey(path, hash);
+    return cache.match(key).then(function (hit) {
+      if (hit) return hit;
+      // Revalidate past the HTTP cache so a stale copy isn't stored under the new hash.
+      return fetch(path, { cache: 'no-cache' }).then(function (resp) {
+        if (resp.ok) cache.put(key, resp.clone());
+        return resp;
+      });
+    });
+  });
+}
+
+self.addEventListener('install', function (event) {
+  // Nothing to precache: data is fetched on first use. Take over right away.
+  event.waitUntil(self.skipWaiting());
+});
+
+self.addEventListener('activate', function (event) {
+  event.waitUntil(
+    caches.keys()
+      .then(function (names) {
+        return Promise.all(names.filter(function (n) {
+          return n.indexOf('fdm-data-') === 0 && n !== DATA_CACHE;
+        }).map(function (n) { return caches.delete(n); }));
+      })
+      .then(function () { return self.clients.claim(); })
+  );
+});
+
+self.addEventListener('fetch', function (event) {
+  var request = event.request;
+  if (request.method !== 'GET') return;
+  var url = new URL(request.url);
+  if (url.origin !== self.location.origin || url.pathname.indexOf(DATA_PREFIX) !== 0) return;
+  event.respondWith(handleData(request));
+});